@@ -0,0 +1,201 @@
+import asyncio
+import io
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Optional, Tuple
+
+from django.conf import settings
+
+# Chunks of a streaming response read ahead of a slow client.
+STREAM_BUFFER_SIZE = 8
+
+
+class WsgiToAsgi:
+    """
+    Serves a WSGI application to an ASGI server.
+
+    Django 2.2 has neither an ASGI handler nor async views, so the WSGI
+    application runs in a pool of threads, and the event loop does the
+    waiting on clients. The request body is read before a thread is taken,
+    and an ordinary response is sent without holding a thread while a slow
+    client receives it. A streaming response is read and closed by the
+    thread that ran the view, its chunks may use the database connection
+    of the thread, so the thread stays busy until the response is sent.
+
+    Args:
+        wsgi_application (callable): The WSGI application to serve.
+        max_workers (int): Number of threads running the application,
+            ASGI_WORKER_THREADS by default.
+    """
+
+    def __init__(self, wsgi_application: Callable,
+                 max_workers: Optional[int] = None) -> None:
+        self.wsgi_application = wsgi_application
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers or settings.ASGI_WORKER_THREADS,
+            thread_name_prefix='asgi',
+        )
+
+    async def __call__(self, scope: dict, receive: Callable,
+                       send: Callable) -> None:
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self.http(scope, receive, send)
+        else:
+            raise ValueError(f'Unsupported ASGI scope type {scope["type"]}')
+
+    async def lifespan(self, receive: Callable, send: Callable) -> None:
+        """Answers the startup and shutdown events of the server."""
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    @staticmethod
+    async def read_body(receive: Callable) -> Optional[bytes]:
+        """Returns the request body or None if the client disconnected."""
+        chunks = []
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return None
+            chunks.append(message.get('body', b''))
+            if not message.get('more_body', False):
+                return b''.join(chunks)
+
+    @staticmethod
+    def build_environ(scope: dict, body: bytes) -> dict:
+        """Translates the ASGI connection scope into a WSGI environment."""
+        server_name, server_port = scope.get('server') or ('localhost', 80)
+        script_name = scope.get('root_path', '')
+        path = scope['path']
+        if script_name and path.startswith(script_name):
+            path = path[len(script_name):]
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': script_name.encode().decode('latin-1'),
+            'PATH_INFO': path.encode().decode('latin-1'),
+            'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+            'SERVER_NAME': server_name,
+            'SERVER_PORT': str(server_port),
+            'SERVER_PROTOCOL': f'HTTP/{scope.get("http_version", "1.1")}',
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False,
+        }
+        if scope.get('client'):
+            environ['REMOTE_ADDR'] = scope['client'][0]
+            environ['REMOTE_PORT'] = str(scope['client'][1])
+        for name, value in scope.get('headers', []):
+            name = name.decode('latin-1').upper().replace('-', '_')
+            value = value.decode('latin-1')
+            if name in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+                key = name
+            else:
+                key = f'HTTP_{name}'
+            if key in environ:
+                value = f'{environ[key]},{value}'
+            environ[key] = value
+        return environ
+
+    async def http(self, scope: dict, receive: Callable,
+                   send: Callable) -> None:
+        """Serves one HTTP request."""
+        body = await self.read_body(receive)
+        if body is None:
+            return
+        environ = self.build_environ(scope, body)
+        loop = asyncio.get_running_loop()
+
+        response = {}
+
+        def start_response(status: str, headers: Iterable[Tuple[str, str]],
+                           exc_info=None) -> Callable:
+            if exc_info and response.get('sent'):
+                raise exc_info[1].with_traceback(exc_info[2])
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = [
+                (name.lower().encode('latin-1'), value.encode('latin-1'))
+                for name, value in headers
+            ]
+            return lambda data: None
+
+        queue = asyncio.Queue(maxsize=STREAM_BUFFER_SIZE)
+        stopped = threading.Event()
+
+        def put(kind: str, value=None) -> None:
+            asyncio.run_coroutine_threadsafe(
+                queue.put((kind, value)), loop).result()
+
+        def run_application() -> None:
+            """
+            Calls the application in a worker thread and passes the response
+            to the event loop through the queue. An ordinary response is
+            read and closed at once, a streaming one chunk by chunk until it
+            is read or the client is gone.
+            """
+            try:
+                result = self.wsgi_application(environ, start_response)
+                try:
+                    if not getattr(result, 'streaming', False):
+                        put('body', b''.join(result))
+                        return
+                    put('start')
+                    for chunk in result:
+                        if stopped.is_set():
+                            break
+                        if chunk:
+                            put('chunk', chunk)
+                finally:
+                    if hasattr(result, 'close'):
+                        result.close()
+            except BaseException as error:
+                put('error', error)
+            finally:
+                put('done')
+
+        worker = loop.run_in_executor(self.executor, run_application)
+        done = streaming = False
+        try:
+            while True:
+                kind, value = await queue.get()
+                if kind == 'done':
+                    done = True
+                    break
+                if kind == 'error':
+                    raise value
+                if kind == 'chunk':
+                    await send({
+                        'type': 'http.response.body',
+                        'body': value,
+                        'more_body': True,
+                    })
+                    continue
+                await send({
+                    'type': 'http.response.start',
+                    'status': response['status'],
+                    'headers': response['headers'],
+                })
+                response['sent'] = True
+                streaming = kind == 'start'
+                if not streaming:
+                    await send({'type': 'http.response.body', 'body': value})
+            if streaming:
+                await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            # The thread stops reading the response and closes it.
+            stopped.set()
+            while not done:
+                kind, _ = await queue.get()
+                done = kind == 'done'
+            await worker
@@ -0,0 +1,327 @@
+import math
+import re
+import statistics
+import time
+import tracemalloc
+from contextlib import ExitStack
+from importlib import import_module
+from typing import Dict, Iterator, List, NamedTuple, Optional, Sequence
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import QuerySet
+from django.http import HttpResponse
+from django.test import Client
+from django.urls import reverse
+
+from posts import feeds
+from posts.api import API_PAGE_SIZE
+from posts.models import Group, Post, User
+from posts.paginator import COMMENT_ORDERING, FEED_ORDERING, KeysetPaginator
+from posts.views import COMMENTS_PAGE_SIZE, MAX_SAMPLE_SIZE
+
+# Modules of the URLs the benchmark covers, every named URL of them must
+# have a scenario or be listed in SKIPPED_VIEWS.
+URL_MODULES = ('posts.urls', 'users.urls', 'about.urls')
+# Views changing the data or the session of the client are not measured.
+SKIPPED_VIEWS = {
+    'posts:add_comment': 'adds a comment',
+    'posts:profile_follow': 'adds a subscription',
+    'posts:profile_unfollow': 'removes a subscription',
+    'users:logout': 'ends the session of the client',
+}
+USER_KINDS = ('anonymous', 'user')
+PERCENTILES = (50, 95, 99)
+DEFAULT_SEARCH_QUERY = 'кот'
+
+
+class Scenario(NamedTuple):
+    """
+    A request made by the benchmark.
+
+    Attributes:
+        name (str): Unique name of the scenario, the key of its results.
+        view (str): Name of the URL of the view.
+        path (str): Path of the request with the query string.
+        user_kind (str): Whether the request is made by an anonymous
+            client or a logged-in one, see USER_KINDS.
+    """
+
+    name: str
+    view: str
+    path: str
+    user_kind: str
+
+
+def percentile(values: Sequence[float], percent: float) -> float:
+    """Returns the percentile of the values by the nearest-rank method."""
+    ordered = sorted(values)
+    rank = math.ceil(percent / 100 * len(ordered))
+    return ordered[max(rank, 1) - 1]
+
+
+def get_view_names() -> List[str]:
+    """Returns the namespaced names of the URLs of URL_MODULES."""
+    names = []
+    for module_name in URL_MODULES:
+        module = import_module(module_name)
+        names.extend(
+            f'{module.app_name}:{pattern.name}'
+            for pattern in module.urlpatterns
+        )
+    return names
+
+
+def numbered_pages(queryset: QuerySet, per_page: int) -> Dict[str, dict]:
+    """Returns the parameters of the first, middle and last numbered page."""
+    pages = max(math.ceil(queryset.count() / per_page), 1)
+    positions = {'first': {}}
+    for position, number in (('middle', (pages + 1) // 2), ('last', pages)):
+        if number > 1 and {'page': number} not in positions.values():
+            positions[position] = {'page': number}
+    return positions
+
+
+def keyset_pages(queryset: QuerySet, per_page: int,
+                 ordering: Sequence[str]) -> Dict[str, dict]:
+    """
+    Returns the parameters of the first, middle and last page addressed by
+    ?after= tokens. The objects the tokens point at are read with OFFSET
+    once, the measured requests do not use it.
+    """
+    count = queryset.count()
+    paginator = KeysetPaginator(queryset, per_page, ordering)
+    ordered = queryset.order_by(*ordering)
+    positions = {'first': {}}
+    # Index of the object the page starts after, a page starting before
+    # the end of the previous position is left out.
+    previous = per_page - 2
+    for position, index in (('middle', count // 2 - 1),
+                            ('last', count - per_page - 1)):
+        if index > previous:
+            positions[position] = {
+                'after': paginator.encode_cursor(ordered[index])}
+            previous = index
+    return positions
+
+
+class Dataset:
+    """
+    The objects of the seeded database the scenarios request: the biggest
+    group, the most prolific author, the most commented post and the user
+    with the most subscriptions, who is the logged-in client.
+
+    Raises:
+        ValueError: The database has no posts or subscriptions.
+    """
+
+    def __init__(self, reader: Optional[User] = None) -> None:
+        self.post = Post.objects.order_by('-comments_count', '-id').first()
+        if self.post is None:
+            raise ValueError('The database has no posts')
+        self.reader = reader or User.objects.filter(
+            stats__following_count__gt=0
+        ).order_by('-stats__following_count', 'id').first()
+        if self.reader is None:
+            raise ValueError('The database has no subscriptions')
+        self.author = User.objects.order_by(
+            '-stats__posts_count', 'id').first()
+        self.group = Group.objects.order_by('-posts_count', 'id').first()
+        self.own_post = (
+            self.reader.posts.order_by('-pub_date', '-id').first()
+            or self.post
+        )
+        words = re.findall(r'\w{3,}', self.post.text)
+        self.search_query = words[0] if words else DEFAULT_SEARCH_QUERY
+
+    def pages(self) -> Iterator[tuple]:
+        """Yields the view names, their arguments and pages to request."""
+        post_id = {'post_id': self.post.id}
+        index = feeds.get_index_posts()
+        follow = feeds.get_follow_posts(self.reader)
+        comments = feeds.get_post_comments(self.post)
+        yield 'posts:index', {}, numbered_pages(index, MAX_SAMPLE_SIZE)
+        yield 'posts:profile', {'username': self.author.username}, (
+            numbered_pages(feeds.get_profile_posts(self.author),
+                           MAX_SAMPLE_SIZE))
+        yield 'posts:follow_index', {}, numbered_pages(
+            follow, MAX_SAMPLE_SIZE)
+        yield 'posts:post_detail', post_id, keyset_pages(
+            comments, COMMENTS_PAGE_SIZE, COMMENT_ORDERING)
+        yield 'posts:post_comments', post_id, keyset_pages(
+            comments, COMMENTS_PAGE_SIZE, COMMENT_ORDERING)
+        yield 'posts:post_edit', {'post_id': self.own_post.id}, {'first': {}}
+        yield 'posts:post_create', {}, {'first': {}}
+        yield 'posts:search', {}, {'first': {'q': self.search_query}}
+        yield 'posts:api_index', {}, keyset_pages(
+            index, API_PAGE_SIZE, FEED_ORDERING)
+        yield 'posts:api_profile', {'username': self.author.username}, (
+            keyset_pages(feeds.get_profile_posts(self.author),
+                         API_PAGE_SIZE, FEED_ORDERING))
+        yield 'posts:api_follow_index', {}, keyset_pages(
+            follow, API_PAGE_SIZE, FEED_ORDERING)
+        yield 'posts:api_post_comments', post_id, keyset_pages(
+            comments, API_PAGE_SIZE, COMMENT_ORDERING)
+        if self.group is not None:
+            group_posts = feeds.get_group_posts(self.group)
+            yield 'posts:group_list', {'slug': self.group.slug}, (
+                numbered_pages(group_posts, MAX_SAMPLE_SIZE))
+            yield 'posts:api_group_list', {'slug': self.group.slug}, (
+                keyset_pages(group_posts, API_PAGE_SIZE, FEED_ORDERING))
+        for name in ('users:signup', 'users:login', 'about:author',
+                     'about:tech'):
+            yield name, {}, {'first': {}}
+
+    def scenarios(self) -> List[Scenario]:
+        """
+        Returns the scenarios of every page for both kinds of users.
+
+        Raises:
+            ValueError: A view of URL_MODULES has no scenario.
+        """
+        scenarios = []
+        covered = set(SKIPPED_VIEWS)
+        for view, kwargs, positions in self.pages():
+            covered.add(view)
+            for position, params in positions.items():
+                path = reverse(view, kwargs=kwargs)
+                if params:
+                    path = f'{path}?{urlencode(params)}'
+                scenarios.extend(
+                    Scenario(f'{view} {position} {user_kind}', view, path,
+                             user_kind)
+                    for user_kind in USER_KINDS
+                )
+        missing = set(get_view_names()) - covered
+        if missing:
+            raise ValueError(
+                f'No benchmark scenario for {", ".join(sorted(missing))}')
+        return scenarios
+
+
+def get_allowed_host() -> str:
+    """Returns a host name the site accepts requests to."""
+    for host in settings.ALLOWED_HOSTS:
+        if not host.startswith(('.', '*')):
+            return host
+    return 'localhost'
+
+
+def make_clients(reader: User) -> Dict[str, Client]:
+    """Returns the test clients of USER_KINDS, the user one is logged in."""
+    clients = {
+        user_kind: Client(HTTP_HOST=get_allowed_host())
+        for user_kind in USER_KINDS
+    }
+    clients['user'].force_login(reader)
+    return clients
+
+
+class QueryCounter:
+    """Counts the SQL queries, see connection.execute_wrapper()."""
+
+    def __init__(self) -> None:
+        self.queries = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries += 1
+        return execute(sql, params, many, context)
+
+
+def fetch(client: Client, path: str) -> HttpResponse:
+    """Requests the path and reads the whole body of the response."""
+    response = client.get(path)
+    if response.streaming:
+        b''.join(response.streaming_content)
+    response.close()
+    return response
+
+
+def measure(client: Client, scenario: Scenario, repeat: int, warmup: int,
+            cold_cache: bool = False) -> dict:
+    """
+    Requests the page of the scenario repeat times after warmup requests
+    and returns the percentiles of the latency in milliseconds, the number
+    of queries of a request and the peak of the memory it allocates.
+
+    The memory is traced during one more request, tracing slows down
+    the code and would distort the latency.
+
+    Args:
+        client (Client): The client of the user kind of the scenario.
+        scenario (Scenario): The request to measure.
+        repeat (int): Number of measured requests.
+        warmup (int): Number of requests made before, they fill the caches.
+        cold_cache (bool): Whether the cache is cleared before every
+            request.
+    """
+    for _ in range(warmup):
+        fetch(client, scenario.path)
+    timings = []
+    queries = []
+    for _ in range(repeat):
+        if cold_cache:
+            cache.clear()
+        counter = QueryCounter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(counter))
+            started = time.perf_counter()
+            response = fetch(client, scenario.path)
+            timings.append((time.perf_counter() - started) * 1000)
+        queries.append(counter.queries)
+
+    if cold_cache:
+        cache.clear()
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    start_memory = tracemalloc.get_traced_memory()[0]
+    fetch(client, scenario.path)
+    peak_memory = tracemalloc.get_traced_memory()[1] - start_memory
+    if not tracing:
+        tracemalloc.stop()
+
+    result = {'view': scenario.view, 'status': response.status_code}
+    for percent in PERCENTILES:
+        result[f'p{percent}_ms'] = round(percentile(timings, percent), 3)
+    result['mean_ms'] = round(statistics.mean(timings), 3)
+    result['queries'] = max(queries)
+    result['memory_kib'] = round(peak_memory / 1024, 1)
+    return result
+
+
+def compare(baseline: Dict[str, dict], current: Dict[str, dict],
+            threshold: float, min_delta: float) -> List[str]:
+    """
+    Returns the descriptions of the scenarios that got slower or make more
+    queries than in the baseline results.
+
+    Args:
+        baseline (dict): Results of the previous run by scenario name.
+        current (dict): Results of this run by scenario name.
+        threshold (float): Allowed growth of p95 in per cent.
+        min_delta (float): Growth of p95 in milliseconds ignored as noise
+            whatever the per cent.
+    """
+    regressions = []
+    for name, result in current.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        delta = result['p95_ms'] - before['p95_ms']
+        if (delta > min_delta
+                and delta > before['p95_ms'] * threshold / 100):
+            regressions.append(
+                f'{name}: p95 {before["p95_ms"]:.1f} -> '
+                f'{result["p95_ms"]:.1f} ms'
+            )
+        if result['queries'] > before['queries']:
+            regressions.append(
+                f'{name}: queries {before["queries"]} -> '
+                f'{result["queries"]}'
+            )
+    return regressions
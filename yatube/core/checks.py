@@ -0,0 +1,18 @@
+from django.core.checks import Warning, register
+
+from .query_cache import is_shared_cache
+
+
+@register()
+def check_shared_cache(app_configs, **kwargs):
+    """Warns that the caches invalidated by writes need a shared cache."""
+    if is_shared_cache():
+        return []
+    return [Warning(
+        'The default cache is kept in the memory of every process.',
+        hint=('The writes of one process do not outdate the feeds, objects '
+              'and querysets cached by the others, and querysets marked '
+              'with cache() are read from the database. Use a cache shared '
+              'by the processes, e.g. memcached or redis.'),
+        id='core.W001',
+    )]
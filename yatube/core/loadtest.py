@@ -0,0 +1,522 @@
+import http.client
+import itertools
+import multiprocessing
+import random
+import re
+import socket
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from importlib import import_module
+from socketserver import ThreadingMixIn
+from typing import (Callable, Dict, Iterable, Iterator, List, NamedTuple,
+                    Optional, Tuple)
+from urllib.parse import urlencode
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer
+
+from django.conf import settings
+from django.contrib.auth import (BACKEND_SESSION_KEY, HASH_SESSION_KEY,
+                                 SESSION_KEY)
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.signals import got_request_exception
+from django.db import OperationalError, connections
+from django.middleware.csrf import CSRF_ALLOWED_CHARS, CSRF_SECRET_LENGTH
+from django.urls import Resolver404, resolve, reverse
+from django.utils.crypto import get_random_string
+
+from posts.models import Group, Post, User
+
+from .benchmarks import PERCENTILES, percentile
+
+# Actions of the generated workload and their default shares. Reads of
+# the feeds compete with the writes for the lock of the SQLite database.
+DEFAULT_MIX = {
+    'index': 30,
+    'post_detail': 20,
+    'profile': 10,
+    'group_list': 8,
+    'follow_index': 10,
+    'search': 5,
+    'add_comment': 8,
+    'post_create': 4,
+    'profile_follow': 3,
+    'profile_unfollow': 2,
+}
+# Actions made only by logged-in users.
+AUTHENTICATED_ACTIONS = frozenset((
+    'follow_index', 'add_comment', 'post_create', 'profile_follow',
+    'profile_unfollow',
+))
+# Views whose POST requests of an access log are replayed with a generated
+# form, the other POST requests are skipped.
+REPLAYED_FORMS = ('posts:add_comment', 'posts:post_create')
+# Request line of the common and combined log formats.
+LOG_REQUEST = re.compile(r'"(?P<method>[A-Z]+) (?P<path>\S+) HTTP/[\d.]+"')
+# Header the local server adds to the responses to requests failed because
+# the database was locked.
+LOCK_HEADER = 'X-Database-Locked'
+LOCK_ENVIRON_KEY = 'loadtest.database_locked'
+# Number of posts, users and groups the requests are spread over.
+TARGETS_SAMPLE_SIZE = 1000
+SATURATION_THROUGHPUT_SHARE = 0.9
+
+
+class Request(NamedTuple):
+    """
+    A request of the workload.
+
+    Attributes:
+        action (str): Name of the action in the report.
+        method (str): HTTP method.
+        path (str): Path with the query string.
+        form (dict): Fields of a POST form or None.
+        authenticated (bool): Whether it is sent with a session cookie.
+    """
+
+    action: str
+    method: str
+    path: str
+    form: Optional[dict]
+    authenticated: bool
+
+
+class Result(NamedTuple):
+    """
+    The outcome of a request.
+
+    Attributes:
+        action (str): Name of the action of the request.
+        status (int): HTTP status, 0 if no response was received.
+        latency (float): Time from the moment the request was scheduled
+            to the end of the response in seconds, the time spent waiting
+            for a free client is included.
+        finished (float): perf_counter() at the end of the response.
+        locked (bool): Whether the server reported a database lock.
+    """
+
+    action: str
+    status: int
+    latency: float
+    finished: float
+    locked: bool
+
+
+def parse_mix(value: str) -> Dict[str, float]:
+    """
+    Parses the shares of the actions given as 'index=30,add_comment=5'.
+
+    Raises:
+        ValueError: An action is unknown or a share is not a positive number.
+    """
+    mix = {}
+    for item in value.split(','):
+        action, _, share = item.partition('=')
+        action = action.strip()
+        if action not in DEFAULT_MIX:
+            raise ValueError(f'Unknown action {action!r}')
+        try:
+            mix[action] = float(share)
+        except ValueError:
+            raise ValueError(f'Invalid share {share!r} of {action}')
+        if mix[action] <= 0:
+            raise ValueError(f'Invalid share {share!r} of {action}')
+    return mix
+
+
+def parse_access_log(lines: Iterable[str]) -> Iterator[Tuple[str, str]]:
+    """Yields the methods and paths of the requests of the access log."""
+    for line in lines:
+        match = LOG_REQUEST.search(line)
+        if match:
+            yield match['method'], match['path']
+
+
+def is_lock_error(error: Optional[BaseException]) -> bool:
+    """Returns whether the error is a timeout waiting for a SQLite lock."""
+    return isinstance(error, OperationalError) and 'locked' in str(error)
+
+
+class Session(NamedTuple):
+    """Cookies of a logged-in user of the workload."""
+
+    session_key: str
+    csrf_token: str
+
+
+def create_sessions(users: Iterable[User]) -> List[Session]:
+    """
+    Logs the users in by storing their sessions, as Client.force_login()
+    does, so that the passwords are not needed and not hashed.
+    """
+    engine = import_module(settings.SESSION_ENGINE)
+    sessions = []
+    for user in users:
+        store = engine.SessionStore()
+        store[SESSION_KEY] = user._meta.pk.value_to_string(user)
+        store[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        store[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        store.save()
+        sessions.append(Session(
+            store.session_key,
+            get_random_string(CSRF_SECRET_LENGTH, CSRF_ALLOWED_CHARS),
+        ))
+    return sessions
+
+
+def delete_sessions(sessions: Iterable[Session]) -> None:
+    """Logs the users of the workload out."""
+    engine = import_module(settings.SESSION_ENGINE)
+    for session in sessions:
+        engine.SessionStore(session.session_key).delete()
+
+
+class Workload:
+    """
+    Generates the requests of the load test over a sample of the posts,
+    authors and groups of the database.
+
+    Args:
+        rng (Random): Source of the random choices.
+        authenticated_share (float): Share of the reads made by logged-in
+            users.
+    """
+
+    def __init__(self, rng: random.Random,
+                 authenticated_share: float) -> None:
+        self.rng = rng
+        self.authenticated_share = authenticated_share
+        self.post_ids = list(Post.objects.order_by('?').values_list(
+            'id', flat=True)[:TARGETS_SAMPLE_SIZE])
+        self.usernames = list(User.objects.order_by('?').values_list(
+            'username', flat=True)[:TARGETS_SAMPLE_SIZE])
+        self.group_slugs = list(Group.objects.values_list(
+            'slug', flat=True)[:TARGETS_SAMPLE_SIZE])
+        self.group_ids = list(Group.objects.values_list(
+            'id', flat=True)[:TARGETS_SAMPLE_SIZE])
+        if not self.post_ids:
+            raise ValueError('The database has no posts')
+        texts = Post.objects.filter(id__in=self.post_ids[:100]).values_list(
+            'text', flat=True)
+        self.words = [
+            word for text in texts for word in re.findall(r'\w{3,}', text)
+        ] or ['кот']
+
+    def text(self) -> str:
+        """Returns the text of a new post or comment."""
+        return ' '.join(self.rng.choices(self.words, k=8))
+
+    def make(self, action: str) -> Request:
+        """Returns a request of the action to a random object."""
+        rng = self.rng
+        authenticated = (
+            action in AUTHENTICATED_ACTIONS
+            or rng.random() < self.authenticated_share
+        )
+        form = None
+        if action in ('post_detail', 'add_comment'):
+            kwargs = {'post_id': rng.choice(self.post_ids)}
+        elif action in ('profile', 'profile_follow', 'profile_unfollow'):
+            kwargs = {'username': rng.choice(self.usernames)}
+        elif action == 'group_list' and self.group_slugs:
+            kwargs = {'slug': rng.choice(self.group_slugs)}
+        elif action == 'group_list':
+            action, kwargs = 'index', {}
+        else:
+            kwargs = {}
+        path = reverse(f'posts:{action}', kwargs=kwargs)
+        if action == 'search':
+            path = f'{path}?{urlencode({"q": rng.choice(self.words)})}'
+        elif action == 'add_comment':
+            form = {'text': self.text()}
+        elif action == 'post_create':
+            form = {'text': self.text()}
+            if self.group_ids and rng.random() < 0.5:
+                form['group'] = rng.choice(self.group_ids)
+        method = 'GET' if form is None else 'POST'
+        return Request(action, method, path, form, authenticated)
+
+    def generate(self, mix: Dict[str, float]) -> Iterator[Request]:
+        """Yields random requests of the actions in the shares of the mix."""
+        actions = list(mix)
+        weights = list(mix.values())
+        while True:
+            yield self.make(self.rng.choices(actions, weights)[0])
+
+    def replay(self, log: Iterable[Tuple[str, str]]) -> Iterator[Request]:
+        """
+        Yields the requests of the access log over and over. Forms of
+        REPLAYED_FORMS are filled with generated text, the other requests
+        except GET and HEAD are skipped.
+
+        Raises:
+            ValueError: The log has no request that can be replayed.
+        """
+        requests = []
+        for method, path in log:
+            try:
+                match = resolve(path.partition('?')[0])
+            except Resolver404:
+                match = None
+            action = match.view_name if match else 'unresolved'
+            if method in ('GET', 'HEAD'):
+                requests.append(Request(
+                    action, method, path, None,
+                    self.rng.random() < self.authenticated_share,
+                ))
+            elif method == 'POST' and action in REPLAYED_FORMS:
+                requests.append(Request(
+                    action, method, path, {'text': self.text()}, True))
+        if not requests:
+            raise ValueError('The log has no requests to replay')
+        return itertools.cycle(requests)
+
+
+class HttpSender:
+    """
+    Sends the requests of the workload to the server, a new connection for
+    every request.
+
+    Args:
+        host (str): Address the server listens on.
+        port (int): Port the server listens on.
+        host_header (str): Value of the Host header, a host the site
+            accepts.
+        sessions (list): Sessions the authenticated requests are made in.
+        timeout (float): Time to wait for a response in seconds.
+    """
+
+    def __init__(self, host: str, port: int, host_header: str,
+                 sessions: List[Session], timeout: float) -> None:
+        self.host = host
+        self.port = port
+        self.host_header = host_header
+        self.sessions = sessions
+        self.timeout = timeout
+
+    def headers(self, request: Request) -> Dict[str, str]:
+        """Returns the headers of the request."""
+        headers = {'Host': self.host_header}
+        if request.authenticated and self.sessions:
+            session = random.choice(self.sessions)
+            headers['Cookie'] = (
+                f'{settings.SESSION_COOKIE_NAME}={session.session_key}; '
+                f'{settings.CSRF_COOKIE_NAME}={session.csrf_token}'
+            )
+            headers['X-CSRFToken'] = session.csrf_token
+        if request.form is not None:
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        return headers
+
+    def __call__(self, request: Request, scheduled: float) -> Result:
+        """Sends the request planned at the moment and reads the response."""
+        body = urlencode(request.form) if request.form is not None else None
+        connection = http.client.HTTPConnection(
+            self.host, self.port, timeout=self.timeout)
+        status = 0
+        locked = False
+        try:
+            connection.request(
+                request.method, request.path, body, self.headers(request))
+            response = connection.getresponse()
+            response.read()
+            status = response.status
+            locked = response.getheader(LOCK_HEADER) is not None
+        except (OSError, http.client.HTTPException):
+            pass
+        finally:
+            connection.close()
+        finished = time.perf_counter()
+        return Result(request.action, status, finished - scheduled,
+                      finished, locked)
+
+
+def run_stage(send: Callable[[Request, float], Result],
+              requests: Iterator[Request], rate: float, duration: float,
+              concurrency: int) -> Tuple[List[Result], float]:
+    """
+    Sends the requests at the constant rate for the duration and returns
+    their results and the moment the stage started.
+
+    The requests are scheduled in advance and are not delayed by slow
+    responses, a request waiting for a free client is late and the wait
+    counts in its latency. Otherwise a saturated server would lower
+    the rate and hide its own latency.
+    """
+    count = max(int(rate * duration), 1)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = []
+        for index in range(count):
+            scheduled = started + index / rate
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            futures.append(pool.submit(send, next(requests), scheduled))
+        return [future.result() for future in futures], started
+
+
+def summarize(results: List[Result], started: float, rate: float) -> dict:
+    """Returns the throughput, latency and error rates of the stage."""
+    elapsed = max(result.finished for result in results) - started
+    latencies = [result.latency * 1000 for result in results]
+    errors = sum(
+        1 for result in results if not result.status or result.status >= 500)
+    summary = {
+        'rate': rate,
+        'requests': len(results),
+        'throughput': round(len(results) / elapsed, 1),
+        'error_rate': round(errors / len(results), 4),
+        'lock_rate': round(
+            sum(result.locked for result in results) / len(results), 4),
+        'mean_ms': round(statistics.mean(latencies), 1),
+    }
+    for percent in PERCENTILES:
+        summary[f'p{percent}_ms'] = round(percentile(latencies, percent), 1)
+    by_action = {}
+    for result in results:
+        by_action.setdefault(result.action, []).append(result)
+    summary['actions'] = {
+        action: {
+            'requests': len(action_results),
+            'p95_ms': round(percentile(
+                [result.latency * 1000 for result in action_results], 95), 1),
+            'errors': sum(
+                1 for result in action_results
+                if not result.status or result.status >= 500),
+        }
+        for action, action_results in sorted(by_action.items())
+    }
+    return summary
+
+
+def is_saturated(summary: dict, max_error_rate: float,
+                 latency_slo: float) -> bool:
+    """
+    Returns whether the server could not keep up with the rate of the stage:
+    the throughput fell behind, there were too many errors or the p99
+    latency exceeded the objective in milliseconds.
+    """
+    return (
+        summary['throughput'] < summary['rate'] * SATURATION_THROUGHPUT_SHARE
+        or summary['error_rate'] > max_error_rate
+        or summary['p99_ms'] > latency_slo
+    )
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    """A request handler that does not log every request to stderr."""
+
+    def log_message(self, format, *args):
+        pass
+
+
+class WorkerServer(ThreadingMixIn, WSGIServer):
+    """
+    A WSGI server of a worker process accepting connections on a socket
+    shared with the other workers. At most threads requests are handled
+    at once, the others wait in the backlog of the socket.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, listener: socket.socket, threads: int,
+                 application: Callable) -> None:
+        super().__init__(listener.getsockname(), QuietRequestHandler,
+                         bind_and_activate=False)
+        self.socket.close()
+        self.socket = listener
+        self.server_name = 'localhost'
+        self.server_port = listener.getsockname()[1]
+        self.setup_environ()
+        self.set_app(application)
+        self.slots = threading.BoundedSemaphore(threads)
+
+    def process_request(self, request, client_address):
+        self.slots.acquire()
+        try:
+            super().process_request(request, client_address)
+        except BaseException:
+            self.slots.release()
+            raise
+
+    def process_request_thread(self, request, client_address):
+        try:
+            super().process_request_thread(request, client_address)
+        finally:
+            self.slots.release()
+
+
+class LockReportingApplication:
+    """
+    The Django WSGI application adding LOCK_HEADER to the responses to
+    requests failed because the database was locked.
+    """
+
+    def __init__(self) -> None:
+        self.handler = WSGIHandler()
+        got_request_exception.connect(self.mark_locked, weak=False)
+
+    def mark_locked(self, sender, request=None, **kwargs) -> None:
+        if request is not None and is_lock_error(sys.exc_info()[1]):
+            request.META[LOCK_ENVIRON_KEY] = True
+
+    def __call__(self, environ: dict, start_response: Callable):
+        def start(status, headers, exc_info=None):
+            if environ.get(LOCK_ENVIRON_KEY):
+                headers = [*headers, (LOCK_HEADER, '1')]
+            return start_response(status, headers, exc_info)
+
+        return self.handler(environ, start)
+
+
+def serve_worker(listener: socket.socket, threads: int) -> None:
+    """Serves the site in a worker process until it is terminated."""
+    WorkerServer(listener, threads, LockReportingApplication()).serve_forever()
+
+
+class LocalServer:
+    """
+    Serves the site with worker processes forked from the current one, like
+    a pre-forking WSGI server, on a free port of the loopback interface.
+
+    Args:
+        workers (int): Number of worker processes.
+        threads (int): Number of threads handling requests in a worker.
+    """
+
+    host = '127.0.0.1'
+
+    def __init__(self, workers: int, threads: int) -> None:
+        self.workers = workers
+        self.threads = threads
+        self.processes: List[multiprocessing.Process] = []
+        self.port = 0
+
+    def __enter__(self) -> 'LocalServer':
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        listener.bind((self.host, 0))
+        listener.listen(socket.SOMAXCONN)
+        # Every worker waits for connections, the ones that lose the race
+        # for a connection must not block in accept().
+        listener.setblocking(False)
+        self.port = listener.getsockname()[1]
+        # The forked workers must open their own database connections.
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        for _ in range(self.workers):
+            process = context.Process(
+                target=serve_worker, args=(listener, self.threads),
+                daemon=True)
+            process.start()
+            self.processes.append(process)
+        listener.close()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            process.join()
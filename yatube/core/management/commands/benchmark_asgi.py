@@ -0,0 +1,178 @@
+import asyncio
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+
+from core.asgi import WsgiToAsgi
+
+
+class Command(BaseCommand):
+    """
+    Compares the throughput of the site served through WSGI and ASGI to
+    many slow clients at once, without a network server.
+
+    A WSGI worker thread is busy while the client sends the request and
+    receives the response. Under ASGI the client is waited for by the event
+    loop and a thread is taken only while the view runs.
+    """
+
+    help = ('Сравнивает пропускную способность WSGI и ASGI при большом '
+            'количестве медленных клиентов')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/', help='Адрес страницы')
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=400,
+            help='Общее количество запросов',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=100,
+            help='Количество одновременных клиентов',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=20,
+            help='Количество потоков, выполняющих представления',
+        )
+        parser.add_argument(
+            '--client-delay',
+            type=float,
+            default=50,
+            help='Время передачи запроса и ответа клиенту, мс',
+        )
+        parser.add_argument(
+            '--reader',
+            help='Имя пользователя, от которого делаются запросы, по '
+                 'умолчанию запросы анонимные',
+        )
+
+    def get_session_cookie(self, username: str) -> str:
+        """Logs the user in and returns the Cookie header of the session."""
+        user = get_user_model().objects.filter(username=username).first()
+        if user is None:
+            raise CommandError(f'Пользователь {username} не найден')
+        client = Client()
+        client.force_login(user)
+        name = settings.SESSION_COOKIE_NAME
+        return f'{name}={client.cookies[name].value}'
+
+    def scope(self, path: str, cookie: Optional[str] = None) -> dict:
+        """
+        Returns the ASGI scope of a GET request of the page, with
+        the Cookie header if it is given.
+        """
+        path, _, query_string = path.partition('?')
+        headers = [(b'host', b'localhost')]
+        if cookie:
+            headers.append((b'cookie', cookie.encode()))
+        return {
+            'type': 'http',
+            'http_version': '1.1',
+            'method': 'GET',
+            'scheme': 'http',
+            'path': path,
+            'root_path': '',
+            'query_string': query_string.encode(),
+            'headers': headers,
+            'server': ('localhost', 80),
+            'client': ('127.0.0.1', 50000),
+        }
+
+    def run_wsgi(self, options: dict) -> List[float]:
+        """
+        Serves the requests with a pool of blocking worker threads, a worker
+        is taken before the request is read and released after the response
+        is sent. Returns the latencies of the requests.
+        """
+        handler = WSGIHandler()
+        workers = threading.BoundedSemaphore(options['workers'])
+        delay = options['client_delay'] / 1000 / 2
+        environ = WsgiToAsgi.build_environ(
+            self.scope(options['path'], options['cookie']), b'')
+
+        def serve() -> float:
+            started = time.perf_counter()
+            with workers:
+                time.sleep(delay)
+                response = handler(
+                    dict(environ), lambda status, headers: None)
+                b''.join(response)
+                response.close()
+                time.sleep(delay)
+            return time.perf_counter() - started
+
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            futures = [
+                pool.submit(serve) for _ in range(options['requests'])
+            ]
+            return [future.result() for future in futures]
+
+    def run_asgi(self, options: dict) -> List[float]:
+        """
+        Serves the requests with the event loop and the adapter. Returns
+        the latencies of the requests.
+        """
+        application = WsgiToAsgi(WSGIHandler(), options['workers'])
+        delay = options['client_delay'] / 1000 / 2
+        scope = self.scope(options['path'], options['cookie'])
+
+        async def receive() -> dict:
+            await asyncio.sleep(delay)
+            return {'type': 'http.request', 'body': b''}
+
+        async def send(message: dict) -> None:
+            if (message['type'] == 'http.response.body'
+                    and not message.get('more_body')):
+                await asyncio.sleep(delay)
+
+        async def serve(clients: asyncio.Semaphore) -> float:
+            async with clients:
+                started = time.perf_counter()
+                await application(dict(scope), receive, send)
+                return time.perf_counter() - started
+
+        async def serve_all() -> List[float]:
+            clients = asyncio.Semaphore(options['concurrency'])
+            return await asyncio.gather(*(
+                serve(clients) for _ in range(options['requests'])
+            ))
+
+        try:
+            return asyncio.run(serve_all())
+        finally:
+            application.executor.shutdown()
+
+    def handle(self, *args, **options):
+        options['cookie'] = (
+            self.get_session_cookie(options['reader'])
+            if options['reader'] else None
+        )
+        self.stdout.write(
+            f'{options["requests"]} запросов к {options["path"]}, '
+            f'{options["concurrency"]} клиентов, '
+            f'{options["workers"]} потоков'
+        )
+        for name, run in (('wsgi', self.run_wsgi), ('asgi', self.run_asgi)):
+            started = time.perf_counter()
+            latencies = sorted(run(options))
+            elapsed = time.perf_counter() - started
+            p95 = latencies[int(len(latencies) * 0.95) - 1]
+            self.stdout.write(
+                f'{name}: {len(latencies) / elapsed:.1f} запросов/с, '
+                f'медиана {statistics.median(latencies) * 1000:.0f} мс, '
+                f'p95 {p95 * 1000:.0f} мс'
+            )
+        self.stdout.write(self.style.SUCCESS('Замеры завершены'))
@@ -0,0 +1,254 @@
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Dict, List, NamedTuple
+
+from django.core.management.base import BaseCommand
+
+from core.backends.sqlite3.base import DEFAULT_PRAGMAS, apply_pragmas
+from core.benchmarks import percentile
+
+BATCH_SIZE = 10000
+FEED_SIZE = 10
+
+
+class Profile(NamedTuple):
+    """
+    How the connections to the database are made.
+
+    Attributes:
+        pragmas (dict): Pragmas of every connection.
+        persistent (bool): Whether a connection is kept for many
+            operations, as with CONN_MAX_AGE, or opened for every one.
+        begin (str): Statement starting the write transactions.
+    """
+
+    pragmas: dict
+    persistent: bool
+    begin: str
+
+
+PROFILES = {
+    'default': Profile({}, False, 'BEGIN'),
+    'production': Profile(DEFAULT_PRAGMAS, True, 'BEGIN IMMEDIATE'),
+}
+
+
+class Worker(threading.Thread):
+    """
+    Repeats an operation on the database until the deadline, counting
+    the operations, their latencies and the lock errors.
+    """
+
+    def __init__(self, path: str, profile: Profile, authors: int,
+                 deadline: float, seed: int) -> None:
+        super().__init__()
+        self.path = path
+        self.profile = profile
+        self.authors = authors
+        self.deadline = deadline
+        self.rng = random.Random(seed)
+        self.latencies: List[float] = []
+        self.errors = 0
+        self.connection = None
+
+    def connect(self) -> sqlite3.Connection:
+        """Returns a connection configured as Django would make it."""
+        if self.connection is not None:
+            return self.connection
+        connection = sqlite3.connect(
+            self.path, isolation_level=None, check_same_thread=False)
+        apply_pragmas(connection, self.profile.pragmas)
+        if self.profile.persistent:
+            self.connection = connection
+        return connection
+
+    def release(self, connection: sqlite3.Connection) -> None:
+        """Closes the connection unless it is persistent."""
+        if not self.profile.persistent:
+            connection.close()
+
+    def operate(self, connection: sqlite3.Connection) -> None:
+        raise NotImplementedError
+
+    def run(self) -> None:
+        while time.perf_counter() < self.deadline:
+            started = time.perf_counter()
+            connection = self.connect()
+            try:
+                self.operate(connection)
+            except sqlite3.OperationalError:
+                self.errors += 1
+                if connection.in_transaction:
+                    connection.execute('ROLLBACK')
+            else:
+                self.latencies.append(time.perf_counter() - started)
+            finally:
+                self.release(connection)
+        if self.connection is not None:
+            self.connection.close()
+
+
+class Reader(Worker):
+    """Reads the first page of the posts of an author and their number."""
+
+    def operate(self, connection: sqlite3.Connection) -> None:
+        author_id = self.rng.randrange(self.authors)
+        connection.execute(
+            'SELECT id, text, pub_date FROM post WHERE author_id = ? '
+            'ORDER BY pub_date DESC, id DESC LIMIT ?',
+            (author_id, FEED_SIZE),
+        ).fetchall()
+        connection.execute(
+            'SELECT COUNT(*) FROM post WHERE author_id = ?', (author_id,)
+        ).fetchone()
+
+
+class Writer(Worker):
+    """
+    Adds a post and updates the counter of its author in a transaction
+    that reads before it writes, as the views do.
+    """
+
+    def operate(self, connection: sqlite3.Connection) -> None:
+        author_id = self.rng.randrange(self.authors)
+        connection.execute(self.profile.begin)
+        connection.execute(
+            'SELECT posts_count FROM author WHERE id = ?', (author_id,)
+        ).fetchone()
+        connection.execute(
+            'INSERT INTO post (author_id, text, pub_date) '
+            "VALUES (?, ?, datetime('now'))",
+            (author_id, 'Текст записи ' * 10),
+        )
+        connection.execute(
+            'UPDATE author SET posts_count = posts_count + 1 WHERE id = ?',
+            (author_id,),
+        )
+        connection.execute('COMMIT')
+
+
+class Command(BaseCommand):
+    """
+    Compares the throughput of concurrent reads and writes of SQLite with
+    the connections Django makes by default and with the production
+    profile of core.backends.sqlite3.
+
+    The default profile uses the rollback journal, a new connection for
+    every operation and deferred transactions. The production one uses
+    the WAL mode with the pragmas of DEFAULT_PRAGMAS, persistent
+    connections and immediate transactions. Every profile works on its
+    own temporary database of the same posts.
+    """
+
+    help = ('Сравнивает скорость одновременных чтений и записей SQLite с '
+            'настройками по умолчанию и с рабочим профилем')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=50000)
+        parser.add_argument('--authors', type=int, default=500)
+        parser.add_argument(
+            '--readers',
+            type=int,
+            default=8,
+            help='Количество читающих потоков',
+        )
+        parser.add_argument(
+            '--writers',
+            type=int,
+            default=2,
+            help='Количество пишущих потоков',
+        )
+        parser.add_argument(
+            '--duration',
+            type=float,
+            default=5,
+            help='Длительность замера каждого профиля, с',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+
+    def create_database(self, path: str, profile: Profile,
+                        options: dict) -> None:
+        """Creates the tables and fills them with posts."""
+        rng = random.Random(options['seed'])
+        connection = sqlite3.connect(path, isolation_level=None)
+        apply_pragmas(connection, profile.pragmas)
+        connection.executescript(
+            'CREATE TABLE author (id INTEGER PRIMARY KEY, posts_count INT);'
+            'CREATE TABLE post (id INTEGER PRIMARY KEY, author_id INT, '
+            'text TEXT, pub_date TEXT);'
+            'CREATE INDEX post_author_pub_date ON post (author_id, pub_date);'
+        )
+        connection.execute('BEGIN')
+        connection.executemany(
+            'INSERT INTO author VALUES (?, 0)',
+            ((author_id,) for author_id in range(options['authors'])),
+        )
+        for start in range(0, options['posts'], BATCH_SIZE):
+            connection.executemany(
+                'INSERT INTO post (author_id, text, pub_date) VALUES '
+                "(?, ?, datetime('now', ?))",
+                (
+                    (rng.randrange(options['authors']), 'Текст записи ' * 10,
+                     f'-{rng.randrange(10 ** 7)} seconds')
+                    for _ in range(
+                        min(BATCH_SIZE, options['posts'] - start))
+                ),
+            )
+        connection.execute(
+            'UPDATE author SET posts_count = (SELECT COUNT(*) FROM post '
+            'WHERE post.author_id = author.id)')
+        connection.execute('COMMIT')
+        connection.close()
+
+    def measure(self, path: str, profile: Profile,
+                options: dict) -> Dict[str, List[Worker]]:
+        """Runs the readers and the writers at once until the deadline."""
+        deadline = time.perf_counter() + options['duration']
+        workers = {'reads': [], 'writes': []}
+        for kind, worker_class, count in (
+                ('reads', Reader, options['readers']),
+                ('writes', Writer, options['writers'])):
+            for index in range(count):
+                workers[kind].append(worker_class(
+                    path, profile, options['authors'], deadline,
+                    options['seed'] + len(workers['reads']) + index,
+                ))
+        for worker in workers['reads'] + workers['writes']:
+            worker.start()
+        for worker in workers['reads'] + workers['writes']:
+            worker.join()
+        return workers
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f'{options["readers"]} читателей и {options["writers"]} '
+            f'писателей, {options["duration"]:g} с на профиль'
+        )
+        self.stdout.write(
+            f'{"профиль":<12}{"операции":<10}{"в секунду":>11}'
+            f'{"p50, мс":>10}{"p95, мс":>10}{"ошибки":>9}'
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            for name, profile in PROFILES.items():
+                path = os.path.join(directory, f'{name}.sqlite3')
+                self.create_database(path, profile, options)
+                workers = self.measure(path, profile, options)
+                for kind, kind_workers in workers.items():
+                    latencies = [
+                        latency * 1000
+                        for worker in kind_workers
+                        for latency in worker.latencies
+                    ]
+                    errors = sum(worker.errors for worker in kind_workers)
+                    p50 = percentile(latencies, 50) if latencies else 0
+                    p95 = percentile(latencies, 95) if latencies else 0
+                    self.stdout.write(
+                        f'{name:<12}{kind:<10}'
+                        f'{len(latencies) / options["duration"]:>11.0f}'
+                        f'{p50:>10.1f}{p95:>10.1f}{errors:>9}'
+                    )
+        self.stdout.write(self.style.SUCCESS('Замеры завершены'))
@@ -0,0 +1,173 @@
+import json
+import platform
+from datetime import datetime, timezone
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.benchmarks import (PERCENTILES, SKIPPED_VIEWS, Dataset, compare,
+                             make_clients, measure)
+from posts.models import Comment, Follow, Post, User
+
+
+class Command(BaseCommand):
+    """
+    Measures the latency, the number of SQL queries and the allocated memory
+    of every page of the site on the current database, which should be
+    filled by seed_benchmark_data.
+
+    Every view of the posts, users and about apps is requested through
+    the test client by an anonymous and a logged-in user, the feeds on
+    their first, middle and last page. The results can be saved as JSON
+    and compared with a previous run, a regression fails the command.
+    """
+
+    help = ('Замеряет время ответа, количество запросов к базе и выделенную '
+            'память каждой страницы сайта')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=30,
+            help='Количество замеров каждой страницы',
+        )
+        parser.add_argument(
+            '--warmup',
+            type=int,
+            default=3,
+            help='Количество запросов перед замерами',
+        )
+        parser.add_argument(
+            '--cold-cache',
+            action='store_true',
+            help='Очищать кеш перед каждым запросом',
+        )
+        parser.add_argument(
+            '--view',
+            dest='views',
+            action='append',
+            help='Замерить только это представление, можно указать '
+                 'несколько раз',
+        )
+        parser.add_argument(
+            '--reader',
+            help='Имя пользователя, от которого делаются запросы, по '
+                 'умолчанию пользователь с наибольшим числом подписок',
+        )
+        parser.add_argument('--output', help='Файл для результатов в JSON')
+        parser.add_argument(
+            '--compare',
+            help='Файл с результатами предыдущего запуска',
+        )
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=20,
+            help='Допустимый рост p95 в процентах',
+        )
+        parser.add_argument(
+            '--min-delta',
+            type=float,
+            default=1,
+            help='Рост p95 в миллисекундах, который считается шумом',
+        )
+
+    def load_baseline(self, path: str) -> dict:
+        """Reads the results of the previous run."""
+        try:
+            with open(path, encoding='utf-8') as file:
+                return json.load(file)
+        except (OSError, ValueError) as error:
+            raise CommandError(f'Не удалось прочитать {path}: {error}')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['compare']:
+            baseline = self.load_baseline(options['compare'])
+        reader = None
+        if options['reader']:
+            reader = User.objects.filter(username=options['reader']).first()
+            if reader is None:
+                raise CommandError(
+                    f'Пользователь {options["reader"]} не найден')
+        try:
+            dataset = Dataset(reader)
+            scenarios = dataset.scenarios()
+        except ValueError as error:
+            raise CommandError(error)
+        if options['views']:
+            scenarios = [
+                scenario for scenario in scenarios
+                if scenario.view in options['views']
+            ]
+        clients = make_clients(dataset.reader)
+        self.stdout.write(
+            f'Запросы от {dataset.reader.username}, не замеряются: '
+            f'{", ".join(sorted(SKIPPED_VIEWS))}'
+        )
+
+        header = ''.join(f'{f"p{percent}, мс":>10}' for percent in PERCENTILES)
+        self.stdout.write(
+            f'{"страница":<48}{"код":>5}{header}{"запросов":>10}'
+            f'{"память, КиБ":>13}'
+        )
+        results = {}
+        for scenario in scenarios:
+            result = measure(
+                clients[scenario.user_kind], scenario, options['repeat'],
+                options['warmup'], options['cold_cache'],
+            )
+            results[scenario.name] = result
+            timings = ''.join(
+                f'{result[f"p{percent}_ms"]:>10.1f}'
+                for percent in PERCENTILES
+            )
+            self.stdout.write(
+                f'{scenario.name:<48}{result["status"]:>5}{timings}'
+                f'{result["queries"]:>10}{result["memory_kib"]:>13.1f}'
+            )
+
+        report = {
+            'created': datetime.now(timezone.utc).isoformat(),
+            'environment': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': settings.DATABASES['default']['ENGINE'],
+            },
+            'options': {
+                name: options[name]
+                for name in ('repeat', 'warmup', 'cold_cache')
+            },
+            'dataset': {
+                'users': User.objects.count(),
+                'posts': Post.objects.count(),
+                'comments': Comment.objects.count(),
+                'follows': Follow.objects.count(),
+            },
+            'results': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+            self.stdout.write(f'Результаты сохранены в {options["output"]}')
+
+        if baseline is not None:
+            if baseline.get('dataset') != report['dataset']:
+                self.stdout.write(self.style.WARNING(
+                    'Данные в базе отличаются от данных предыдущего запуска'))
+            regressions = compare(
+                baseline.get('results', {}), results,
+                options['threshold'], options['min_delta'],
+            )
+            if regressions:
+                for regression in regressions:
+                    self.stdout.write(self.style.ERROR(regression))
+                raise CommandError(
+                    f'Ухудшений по сравнению с {options["compare"]}: '
+                    f'{len(regressions)}'
+                )
+            self.stdout.write(self.style.SUCCESS(
+                f'Ухудшений по сравнению с {options["compare"]} нет'))
+        self.stdout.write(self.style.SUCCESS('Замеры завершены'))
@@ -0,0 +1,235 @@
+import json
+import random
+import socket
+import time
+from contextlib import ExitStack
+from typing import List
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.benchmarks import PERCENTILES, get_allowed_host
+from core.loadtest import (DEFAULT_MIX, HttpSender, LocalServer, Workload,
+                           create_sessions, delete_sessions, is_saturated,
+                           parse_access_log, parse_mix, run_stage, summarize)
+from posts.models import User
+
+SERVER_START_TIMEOUT = 10
+
+
+def parse_rates(value: str) -> List[float]:
+    """Parses the comma-separated rates of the stages."""
+    try:
+        rates = [float(rate) for rate in value.split(',')]
+    except ValueError:
+        raise CommandError(f'Неверный список частот {value!r}')
+    if not rates or min(rates) <= 0:
+        raise CommandError(f'Неверный список частот {value!r}')
+    return rates
+
+
+def wait_for_server(host: str, port: int) -> None:
+    """Waits until the server accepts connections."""
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while True:
+        try:
+            socket.create_connection((host, port), timeout=1).close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise CommandError(f'Сервер {host}:{port} не отвечает')
+            time.sleep(0.1)
+
+
+class Command(BaseCommand):
+    """
+    Loads the site with a mix of reads and writes, or with the requests of
+    an access log, at increasing rates and reports the throughput, latency,
+    errors and database lock timeouts of every stage and the rate at which
+    the server saturates.
+
+    By default the site is served by worker processes forked from
+    the command, so the writes of the workers compete for the SQLite lock
+    as under a production server. The posts, comments and subscriptions
+    created by the load stay in the database, run it on a copy.
+    """
+
+    help = ('Нагружает сайт смесью чтений и записей или запросами из журнала '
+            'доступа и определяет предельную нагрузку')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rates',
+            default='10,20,50,100',
+            help='Частоты запросов в секунду этапов через запятую',
+        )
+        parser.add_argument(
+            '--duration',
+            type=float,
+            default=10,
+            help='Длительность каждого этапа, с',
+        )
+        parser.add_argument(
+            '--mix',
+            help='Доли действий, например index=30,add_comment=5, по '
+                 'умолчанию ' + ','.join(
+                     f'{action}={share}'
+                     for action, share in DEFAULT_MIX.items()),
+        )
+        parser.add_argument(
+            '--access-log',
+            help='Журнал доступа в формате common или combined, запросы из '
+                 'него повторяются вместо смеси действий',
+        )
+        parser.add_argument(
+            '--url',
+            help='Адрес уже запущенного сервера, по умолчанию сайт '
+                 'запускается командой',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=4,
+            help='Количество процессов сервера',
+        )
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=4,
+            help='Количество потоков в каждом процессе сервера',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=64,
+            help='Максимальное количество одновременных запросов',
+        )
+        parser.add_argument(
+            '--sessions',
+            type=int,
+            default=50,
+            help='Количество пользователей, от которых делаются запросы',
+        )
+        parser.add_argument(
+            '--authenticated-share',
+            type=float,
+            default=0.5,
+            help='Доля чтений от имени пользователей',
+        )
+        parser.add_argument(
+            '--timeout',
+            type=float,
+            default=30,
+            help='Время ожидания ответа, с',
+        )
+        parser.add_argument(
+            '--max-error-rate',
+            type=float,
+            default=0.01,
+            help='Доля ошибок, при которой сервер считается перегруженным',
+        )
+        parser.add_argument(
+            '--latency-slo',
+            type=float,
+            default=1000,
+            help='p99 в миллисекундах, при котором сервер считается '
+                 'перегруженным',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Файл для результатов в JSON')
+
+    def handle(self, *args, **options):
+        rates = parse_rates(options['rates'])
+        rng = random.Random(options['seed'])
+        try:
+            mix = parse_mix(options['mix']) if options['mix'] else DEFAULT_MIX
+            workload = Workload(rng, options['authenticated_share'])
+            if options['access_log']:
+                with open(options['access_log'], encoding='utf-8',
+                          errors='replace') as file:
+                    requests = workload.replay(parse_access_log(file))
+            else:
+                requests = workload.generate(mix)
+        except OSError as error:
+            raise CommandError(error)
+        except ValueError as error:
+            raise CommandError(error)
+
+        users = User.objects.order_by('?')[:options['sessions']]
+        sessions = create_sessions(users)
+        stages = []
+        try:
+            with ExitStack() as stack:
+                if options['url']:
+                    url = urlsplit(options['url'])
+                    host, port = url.hostname, url.port or 80
+                    host_header = url.netloc
+                else:
+                    server = stack.enter_context(LocalServer(
+                        options['workers'], options['threads']))
+                    host, port = server.host, server.port
+                    host_header = get_allowed_host()
+                    self.stdout.write(
+                        f'Сервер: {options["workers"]} процессов по '
+                        f'{options["threads"]} потоков, порт {port}'
+                    )
+                wait_for_server(host, port)
+                send = HttpSender(
+                    host, port, host_header, sessions, options['timeout'])
+                stages = self.run_stages(send, requests, rates, options)
+        finally:
+            delete_sessions(sessions)
+
+        self.report_saturation(stages, options)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump({'stages': stages}, file, ensure_ascii=False,
+                          indent=2)
+            self.stdout.write(f'Результаты сохранены в {options["output"]}')
+
+    def run_stages(self, send, requests, rates: List[float],
+                   options: dict) -> List[dict]:
+        """Runs a stage for every rate and prints its summary."""
+        header = ''.join(f'{f"p{percent}, мс":>10}' for percent in PERCENTILES)
+        self.stdout.write(
+            f'{"частота":>8}{"ответов/с":>11}{header}{"ошибки":>9}'
+            f'{"блокировки":>12}'
+        )
+        stages = []
+        for rate in rates:
+            results, started = run_stage(
+                send, requests, rate, options['duration'],
+                options['concurrency'],
+            )
+            summary = summarize(results, started, rate)
+            summary['saturated'] = is_saturated(
+                summary, options['max_error_rate'], options['latency_slo'])
+            stages.append(summary)
+            timings = ''.join(
+                f'{summary[f"p{percent}_ms"]:>10.1f}'
+                for percent in PERCENTILES
+            )
+            self.stdout.write(
+                f'{rate:>8g}{summary["throughput"]:>11.1f}{timings}'
+                f'{summary["error_rate"]:>9.1%}{summary["lock_rate"]:>12.1%}'
+            )
+            for action, stats in summary['actions'].items():
+                self.stdout.write(
+                    f'    {action:<24}{stats["requests"]:>6} запросов, '
+                    f'p95 {stats["p95_ms"]:.1f} мс, '
+                    f'ошибок {stats["errors"]}'
+                )
+        return stages
+
+    def report_saturation(self, stages: List[dict], options: dict) -> None:
+        """Prints the rate at which the server stopped keeping up."""
+        for previous, stage in zip([None] + stages, stages):
+            if stage['saturated']:
+                capacity = previous['throughput'] if previous else 0
+                self.stdout.write(self.style.WARNING(
+                    f'Насыщение при {stage["rate"]:g} запросов/с, '
+                    f'выдержано {capacity:g} ответов/с'
+                ))
+                return
+        self.stdout.write(self.style.SUCCESS(
+            f'Насыщение не достигнуто до {stages[-1]["rate"]:g} запросов/с'))
@@ -0,0 +1,71 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    """
+    Checkpoints the write-ahead log of a SQLite database into the database
+    file and truncates it, then lets SQLite refresh the statistics of
+    the query planner with PRAGMA optimize.
+
+    SQLite checkpoints the log by itself, but only when no reader is in
+    the way, so under steady load the log keeps growing and slows down
+    the reads. With --interval the maintenance is repeated.
+    """
+
+    help = ('Переносит журнал WAL в файл базы SQLite и обновляет '
+            'статистику планировщика запросов')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database',
+            default=DEFAULT_DB_ALIAS,
+            help='Псевдоним базы данных',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=0,
+            help='Повторять обслуживание через это количество секунд',
+        )
+
+    def wal_size(self, connection) -> int:
+        """Returns the size of the write-ahead log file in bytes."""
+        try:
+            return os.path.getsize(f'{connection.settings_dict["NAME"]}-wal')
+        except OSError:
+            return 0
+
+    def maintain(self, connection) -> None:
+        """Checkpoints the log and optimizes the database once."""
+        started = time.perf_counter()
+        size = self.wal_size(connection)
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            busy, log_frames, checkpointed = cursor.fetchone()
+            cursor.execute('PRAGMA optimize')
+        elapsed = time.perf_counter() - started
+        message = (
+            f'Журнал {size // 1024} КиБ -> '
+            f'{self.wal_size(connection) // 1024} КиБ, перенесено '
+            f'{checkpointed} из {log_frames} страниц за {elapsed:.2f} с'
+        )
+        if busy:
+            self.stdout.write(self.style.WARNING(
+                f'{message}, журнал занят читателями и не обрезан'))
+        else:
+            self.stdout.write(message)
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        if connection.vendor != 'sqlite':
+            raise CommandError('Обслуживание нужно только базе SQLite')
+        while True:
+            self.maintain(connection)
+            if not options['interval']:
+                break
+            connection.close_if_unusable_or_obsolete()
+            time.sleep(options['interval'])
@@ -0,0 +1,78 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from core.routers import write_heartbeat
+
+
+class Command(BaseCommand):
+    """
+    Copies the default SQLite database to the SQLite replicas of
+    DATABASE_REPLICAS with the online backup API of SQLite, the replicas
+    may be read while they are copied.
+
+    A heartbeat is written before every copy, the replicas read from it
+    when their data was copied and are not used once it is older than
+    REPLICA_MAX_LAG. With --interval the copies are repeated, the interval
+    should be shorter than REPLICA_MAX_LAG.
+    """
+
+    help = 'Копирует базу данных SQLite в реплики для чтения'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--alias',
+            dest='aliases',
+            action='append',
+            help='Обновить только эту реплику, можно указать несколько раз',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=0,
+            help='Повторять копирование через это количество секунд',
+        )
+
+    def get_replicas(self, aliases) -> list:
+        """Returns the aliases of the replicas to copy, checking them."""
+        replicas = aliases or settings.DATABASE_REPLICAS
+        if not replicas:
+            raise CommandError('Реплики не настроены в DATABASE_REPLICAS')
+        for alias in replicas:
+            if alias not in settings.DATABASE_REPLICAS:
+                raise CommandError(f'{alias} не указана в DATABASE_REPLICAS')
+        for alias in (DEFAULT_DB_ALIAS, *replicas):
+            if connections[alias].vendor != 'sqlite':
+                raise CommandError(
+                    f'{alias} не SQLite, такие реплики обновляет сервер '
+                    'базы данных'
+                )
+        return replicas
+
+    def sync(self, alias: str) -> None:
+        """Copies the default database to the replica."""
+        started = time.perf_counter()
+        write_heartbeat()
+        source = connections[DEFAULT_DB_ALIAS]
+        source.ensure_connection()
+        target = sqlite3.connect(connections[alias].settings_dict['NAME'])
+        try:
+            source.connection.backup(target)
+        finally:
+            target.close()
+        self.stdout.write(
+            f'Реплика {alias} обновлена за '
+            f'{time.perf_counter() - started:.2f} с'
+        )
+
+    def handle(self, *args, **options):
+        replicas = self.get_replicas(options['aliases'])
+        while True:
+            for alias in replicas:
+                self.sync(alias)
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
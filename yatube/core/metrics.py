@@ -0,0 +1,310 @@
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from django.template.backends.django import DjangoTemplates
+from django.template.backends.django import Template as DjangoTemplate
+from django.utils.module_loading import import_string
+
+# Upper bounds of the buckets of the histograms, in seconds for durations.
+DURATION_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    """Formats the labels of a sample in the Prometheus text format."""
+    pairs = []
+    for name, value in zip(names, values):
+        value = (str(value).replace('\\', r'\\')
+                 .replace('"', r'\"').replace('\n', r'\n'))
+        pairs.append(f'{name}="{value}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """
+    A histogram of observed values kept in the memory of the process.
+
+    Args:
+        name (str): Name of the metric.
+        documentation (str): Description of the metric.
+        label_names (tuple): Names of the labels of the samples.
+        buckets (tuple): Upper bounds of the buckets in ascending order.
+    """
+
+    metric_type = 'histogram'
+
+    def __init__(self, name: str, documentation: str,
+                 label_names: Tuple[str, ...],
+                 buckets: Tuple[float, ...] = DURATION_BUCKETS) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        # Labels -> [count per bucket and +Inf, sum].
+        self._samples: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, labels: Tuple[str, ...], value: float) -> None:
+        """Adds the value to the histogram of the labels."""
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            sample = self._samples.get(labels)
+            if sample is None:
+                sample = self._samples[labels] = [
+                    [0] * (len(self.buckets) + 1), 0]
+            sample[0][index] += 1
+            sample[1] += value
+
+    def collect(self) -> Iterable[str]:
+        """Yields the lines of the metric in the Prometheus text format."""
+        with self._lock:
+            samples = [
+                (labels, list(counts), total)
+                for labels, (counts, total) in self._samples.items()
+            ]
+        label_names = (*self.label_names, 'le')
+        for labels, counts, total in sorted(samples):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, '+Inf'), counts):
+                cumulative += count
+                bound = bound if bound == '+Inf' else _format_number(bound)
+                yield (f'{self.name}_bucket'
+                       f'{_format_labels(label_names, (*labels, bound))} '
+                       f'{cumulative}')
+            formatted = _format_labels(self.label_names, labels)
+            yield f'{self.name}_sum{formatted} {_format_number(total)}'
+            yield f'{self.name}_count{formatted} {cumulative}'
+
+
+class Counter:
+    """
+    A counter kept in the memory of the process.
+
+    Args:
+        name (str): Name of the metric, ends with _total.
+        documentation (str): Description of the metric.
+        label_names (tuple): Names of the labels of the samples.
+    """
+
+    metric_type = 'counter'
+
+    def __init__(self, name: str, documentation: str,
+                 label_names: Tuple[str, ...]) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self._lock = threading.Lock()
+        self._samples: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, labels: Tuple[str, ...], amount: float = 1) -> None:
+        """Increases the counter of the labels."""
+        with self._lock:
+            self._samples[labels] = self._samples.get(labels, 0) + amount
+
+    def collect(self) -> Iterable[str]:
+        """Yields the lines of the metric in the Prometheus text format."""
+        with self._lock:
+            samples = sorted(self._samples.items())
+        for labels, value in samples:
+            yield (f'{self.name}{_format_labels(self.label_names, labels)} '
+                   f'{_format_number(value)}')
+
+
+REQUEST_DURATION = Histogram(
+    'yatube_request_duration_seconds',
+    'Time spent by the application on a request.',
+    ('view', 'method'),
+)
+DB_QUERIES = Histogram(
+    'yatube_request_db_queries',
+    'Number of SQL queries executed by a request.',
+    ('view',),
+    QUERY_COUNT_BUCKETS,
+)
+DB_DURATION = Histogram(
+    'yatube_request_db_duration_seconds',
+    'Time spent by a request on SQL queries.',
+    ('view',),
+)
+TEMPLATE_DURATION = Histogram(
+    'yatube_request_template_duration_seconds',
+    'Time spent by a request on rendering templates.',
+    ('view',),
+)
+CACHE_REQUESTS = Counter(
+    'yatube_cache_requests_total',
+    'Keys read from the cache by requests, by result.',
+    ('view', 'result'),
+)
+OBJECT_CACHE_REQUESTS = Counter(
+    'yatube_object_cache_requests_total',
+    'Objects read from the object cache of the feeds, by model and result.',
+    ('model', 'result'),
+)
+METRICS = (
+    REQUEST_DURATION, DB_QUERIES, DB_DURATION, TEMPLATE_DURATION,
+    CACHE_REQUESTS, OBJECT_CACHE_REQUESTS,
+)
+
+
+def render_metrics() -> str:
+    """Returns all metrics in the Prometheus text exposition format."""
+    lines: List[str] = []
+    for metric in METRICS:
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.metric_type}')
+        lines.extend(metric.collect())
+    return '\n'.join(lines) + '\n'
+
+
+class RequestStats:
+    """
+    What a request has spent its time on, collected while it is handled.
+
+    Attributes:
+        queries (int): Number of SQL queries.
+        query_time (float): Time of the SQL queries in seconds.
+        template_time (float): Time of rendering templates in seconds.
+        cache_hits (int): Number of keys found in the cache.
+        cache_misses (int): Number of keys missing from the cache.
+    """
+
+    def __init__(self) -> None:
+        self.queries = 0
+        self.query_time = 0.0
+        self.template_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        # Depth of the templates being rendered, only the outermost template
+        # is timed.
+        self.template_depth = 0
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        """Times the SQL queries, see connection.execute_wrapper()."""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.query_time += time.perf_counter() - started
+            self.queries += 1
+
+    def record(self, view: str, method: str, duration: float) -> None:
+        """Adds the stats of the finished request to the metrics."""
+        labels = (view,)
+        REQUEST_DURATION.observe((view, method), duration)
+        DB_QUERIES.observe(labels, self.queries)
+        DB_DURATION.observe(labels, self.query_time)
+        TEMPLATE_DURATION.observe(labels, self.template_time)
+        if self.cache_hits:
+            CACHE_REQUESTS.inc((view, 'hit'), self.cache_hits)
+        if self.cache_misses:
+            CACHE_REQUESTS.inc((view, 'miss'), self.cache_misses)
+
+    def server_timing(self, duration: float) -> str:
+        """Returns the value of the Server-Timing header of the response."""
+        return ', '.join((
+            f'db;dur={self.query_time * 1000:.1f};'
+            f'desc="{self.queries} queries"',
+            f'tpl;dur={self.template_time * 1000:.1f}',
+            f'cache;desc="{self.cache_hits} hits, '
+            f'{self.cache_misses} misses"',
+            f'total;dur={duration * 1000:.1f}',
+        ))
+
+
+_local = threading.local()
+
+
+def get_current_stats() -> Optional[RequestStats]:
+    """Returns the stats of the request handled by the thread, if any."""
+    return getattr(_local, 'stats', None)
+
+
+def set_current_stats(stats: Optional[RequestStats]) -> None:
+    """Sets the stats the instrumented code of the thread adds to."""
+    _local.stats = stats
+
+
+class TimedTemplate(DjangoTemplate):
+    """A template adding its rendering time to the stats of the request."""
+
+    def render(self, context=None, request=None):
+        stats = get_current_stats()
+        if stats is None:
+            return super().render(context, request)
+        stats.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            stats.template_depth -= 1
+            if not stats.template_depth:
+                stats.template_time += time.perf_counter() - started
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """
+    The Django template backend timing the rendering of the templates it
+    returns. The included templates are counted in the time of the template
+    including them.
+    """
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name).template,
+                             self)
+
+
+_MISSING = object()
+
+
+class InstrumentedCache:
+    """
+    A cache backend counting the hits and misses of the request, the rest
+    is done by the backend given as WRAPPED_BACKEND in the settings.
+
+    Args:
+        location (str): LOCATION of the cache in the settings.
+        params (dict): The other settings of the cache.
+    """
+
+    def __init__(self, location: str, params: dict) -> None:
+        params = dict(params)
+        backend = import_string(params.pop('WRAPPED_BACKEND'))
+        self._cache = backend(location, params)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._cache, name)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._cache
+
+    def get(self, key: str, default: Any = None,
+            version: Optional[int] = None) -> Any:
+        value = self._cache.get(key, _MISSING, version=version)
+        stats = get_current_stats()
+        if stats is not None:
+            if value is _MISSING:
+                stats.cache_misses += 1
+            else:
+                stats.cache_hits += 1
+        return default if value is _MISSING else value
+
+    def get_many(self, keys: Iterable[str],
+                 version: Optional[int] = None) -> Dict[str, Any]:
+        keys = list(keys)
+        values = self._cache.get_many(keys, version=version)
+        stats = get_current_stats()
+        if stats is not None:
+            stats.cache_hits += len(values)
+            stats.cache_misses += len(keys) - len(values)
+        return values
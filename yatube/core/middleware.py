@@ -0,0 +1,95 @@
+import time
+from contextlib import ExitStack
+from typing import Callable
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpRequest, HttpResponse
+
+from . import routers
+from .metrics import RequestStats, set_current_stats
+
+# Methods labelled by name, the others are counted together.
+KNOWN_METHODS = frozenset(('GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE'))
+SAFE_METHODS = frozenset(('GET', 'HEAD', 'OPTIONS'))
+# Cookie set after a write, while it lasts the client reads its own writes
+# from the default database.
+PRIMARY_READS_COOKIE = 'primary_reads'
+
+
+class MetricsMiddleware:
+    """
+    Collects the SQL queries, template rendering and cache reads of every
+    request and adds them to the metrics of the resolved view, see
+    core.metrics. The stats are also sent in the Server-Timing header
+    if SERVER_TIMING is set.
+
+    Should be the first middleware, so that the others are counted in
+    the duration of the request. The body of a streaming response is
+    produced after the middleware returns and is not counted.
+    """
+
+    def __init__(self, get_response: Callable) -> None:
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        stats = RequestStats()
+        set_current_stats(stats)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(stats.execute_wrapper))
+                response = self.get_response(request)
+        finally:
+            set_current_stats(None)
+        duration = time.perf_counter() - started
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unresolved'
+        method = request.method if request.method in KNOWN_METHODS else 'OTHER'
+        stats.record(view, method, duration)
+        if settings.SERVER_TIMING:
+            response['Server-Timing'] = stats.server_timing(duration)
+        return response
+
+
+class ReplicaMiddleware:
+    """
+    Sends the reads of the views of REPLICA_VIEWS to a read replica, see
+    core.routers. The other views and the requests changing data use
+    the default database.
+
+    After a request changing data the client gets a cookie that keeps its
+    reads on the default database for REPLICA_STICKINESS seconds, so
+    the user sees the changes before they reach the replicas.
+    """
+
+    def __init__(self, get_response: Callable) -> None:
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        routers.use_primary()
+        try:
+            response = self.get_response(request)
+        finally:
+            routers.use_primary()
+        if (settings.DATABASE_REPLICAS
+                and request.method not in SAFE_METHODS):
+            response.set_cookie(
+                PRIMARY_READS_COOKIE, '1',
+                max_age=settings.REPLICA_STICKINESS,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
+
+    def process_view(self, request: HttpRequest, view_func, view_args,
+                     view_kwargs) -> None:
+        if (settings.DATABASE_REPLICAS
+                and request.method in SAFE_METHODS
+                and PRIMARY_READS_COOKIE not in request.COOKIES
+                and request.resolver_match.view_name
+                in settings.REPLICA_VIEWS):
+            routers.use_replica()
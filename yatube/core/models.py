@@ -0,0 +1,23 @@
+from django.db import models
+
+
+class Heartbeat(models.Model):
+    """
+    Model for storing the moment the default database was last marked.
+
+    The row is updated on the default database and reaches the replicas
+    together with the other data, so the value read from a replica is
+    the moment its data was copied, see core.routers.
+
+    Fields:
+        time (DateTimeField): When the row was updated.
+    """
+
+    time = models.DateTimeField(verbose_name='Время отметки')
+
+    class Meta:
+        verbose_name = 'Отметка времени'
+        verbose_name_plural = 'Отметки времени'
+
+    def __str__(self):
+        return f'Heartbeat at {self.time}'
@@ -0,0 +1,239 @@
+import hashlib
+import re
+import time
+from typing import Any, Callable, Iterable, List, Optional, Set
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import EmptyResultSet
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.db.models import QuerySet
+from django.dispatch import receiver
+
+from . import routers
+
+TABLE_VERSION_KEY = 'table-version:{table}'
+QUERY_RESULT_KEY = 'query-result:{digest}'
+# Statements changing a table and the tables a query reads, as Django
+# quotes them for SQLite, PostgreSQL and MySQL.
+WRITE_STATEMENT = re.compile(
+    r'\s*(?:INSERT\s+(?:OR\s+\w+\s+)?INTO|UPDATE|DELETE\s+FROM)\s+["`]?(\w+)',
+    re.IGNORECASE,
+)
+TABLE_REFERENCE = re.compile(r'\b(?:FROM|JOIN)\s+["`]?(\w+)', re.IGNORECASE)
+
+_MISSING = object()
+
+
+def _now() -> int:
+    """Returns the current time in microseconds."""
+    return time.time_ns() // 1000
+
+
+def get_table_versions(tables: Iterable[str]) -> List[int]:
+    """
+    Returns the versions of the tables, the times of their last changes in
+    microseconds. A version missing from the cache is started from
+    the current time.
+    """
+    keys = [TABLE_VERSION_KEY.format(table=table) for table in tables]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, _now(), None)
+            versions[key] = cache.get(key)
+    # A result read from a replica copied before the last change would be
+    # cached under the current versions.
+    routers.require_changes_since(max(versions.values()) / 1_000_000)
+    return [versions[key] for key in keys]
+
+
+def bump_table_versions(tables: Iterable[str]) -> None:
+    """
+    Marks the tables as changed, outdating the results read from them.
+
+    Tables without a version have no cached results, their versions are
+    started by the next read after the change.
+    """
+    keys = [TABLE_VERSION_KEY.format(table=table) for table in set(tables)]
+    versions = cache.get_many(keys)
+    if versions:
+        now = _now()
+        cache.set_many(
+            {key: max(now, version + 1) for key, version in versions.items()},
+            None,
+        )
+
+
+def is_shared_cache() -> bool:
+    """
+    Checks whether the cache is shared by the processes. The versions of
+    a cache kept in the memory of a process are not bumped by the writes
+    of the other processes, whose changes would never outdate its results.
+    """
+    return not isinstance(getattr(cache, '_cache', cache), LocMemCache)
+
+
+class TableBump:
+    """
+    Bumps the version of the table when the transaction that changed it
+    is committed.
+
+    Args:
+        table (str): Name of the changed table.
+    """
+
+    def __init__(self, table: str) -> None:
+        self.table = table
+
+    def __call__(self) -> None:
+        bump_table_versions([self.table])
+
+
+def get_changed_tables(connection) -> Set[str]:
+    """
+    Returns the tables changed by the transaction of the connection and
+    not committed yet.
+
+    The tables are those of the TableBump callbacks waiting for the commit,
+    Django drops the callbacks of the transactions and the savepoints that
+    are rolled back.
+    """
+    if not connection.in_atomic_block:
+        return set()
+    return {
+        func.table
+        for _, func in connection.run_on_commit
+        if isinstance(func, TableBump)
+    }
+
+
+def track_writes(execute, sql, params, many, context):
+    """
+    An execute wrapper bumping the version of the table the statement
+    changes, at once without a transaction and on commit inside one.
+    """
+    result = execute(sql, params, many, context)
+    match = WRITE_STATEMENT.match(sql)
+    if match:
+        table = match.group(1)
+        connection = context['connection']
+        if not connection.in_atomic_block:
+            bump_table_versions([table])
+        elif table not in get_changed_tables(connection):
+            connection.on_commit(TableBump(table))
+    return result
+
+
+@receiver(connection_created)
+def install_write_tracking(sender, connection, **kwargs):
+    """
+    Tracks the writes of every new connection. The wrapper goes first, so
+    the wrappers pushed and popped around a request keep their places.
+    """
+    if track_writes not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, track_writes)
+
+
+class CachingQuerySet(QuerySet):
+    """
+    A queryset whose results may be cached with cache().
+
+    A cached queryset keeps its rows, count() and exists() in the cache
+    under the normalized SQL and parameters of the query and the versions
+    of the tables it reads. Every write to a table bumps its version, so
+    the results read from it are never served again.
+
+    Inside a transaction the queries of the tables changed by it go to
+    the database, their results may still be rolled back.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._cache_timeout = _MISSING
+
+    def _clone(self):
+        clone = super()._clone()
+        clone._cache_timeout = self._cache_timeout
+        return clone
+
+    def cache(self, timeout: Optional[int] = None) -> 'CachingQuerySet':
+        """
+        Returns a copy of the queryset whose results are cached. With
+        a cache that is not shared by the processes the results are read
+        from the database.
+
+        Args:
+            timeout (int): Seconds to keep the results, QUERY_CACHE_TIMEOUT
+                by default.
+        """
+        clone = self._chain()
+        if not is_shared_cache():
+            return clone
+        clone._cache_timeout = (
+            settings.QUERY_CACHE_TIMEOUT if timeout is None else timeout)
+        return clone
+
+    def _get_cache_key(self, operation: str) -> Optional[str]:
+        """
+        Returns the key of the result of the operation or None if the
+        result must be read from the database.
+        """
+        if self._cache_timeout is _MISSING or self._prefetch_related_lookups:
+            return None
+        try:
+            sql, params = self.query.get_compiler(using=self.db).as_sql()
+        except EmptyResultSet:
+            return None
+        tables = sorted(set(TABLE_REFERENCE.findall(sql)))
+        changed = set().union(*(
+            get_changed_tables(connection) for connection in connections.all()
+        ))
+        if not tables or changed.intersection(tables):
+            return None
+        versions = get_table_versions(tables)
+        raw = '|'.join((
+            self.model._meta.label_lower,
+            self._iterable_class.__name__,
+            operation,
+            ' '.join(sql.split()),
+            repr(tuple(params)),
+            *map(str, versions),
+        ))
+        return QUERY_RESULT_KEY.format(
+            digest=hashlib.md5(raw.encode()).hexdigest())
+
+    def _cached(self, operation: str, compute: Callable[[], Any]) -> Any:
+        """Returns the cached result of the operation, computing a miss."""
+        key = self._get_cache_key(operation)
+        if key is None:
+            return compute()
+        result = cache.get(key, _MISSING)
+        if result is _MISSING:
+            result = compute()
+            cache.set(key, result, self._cache_timeout)
+        return result
+
+    def _fetch_all(self) -> None:
+        if self._result_cache is None:
+            self._result_cache = self._cached(
+                'rows', lambda: list(self._iterable_class(self)))
+        super()._fetch_all()
+
+    def iterator(self, chunk_size: int = 2000):
+        if self._cache_timeout is _MISSING:
+            return super().iterator(chunk_size)
+        return iter(self._cached(
+            'rows', lambda: list(self._iterable_class(self))))
+
+    def count(self) -> int:
+        if self._result_cache is not None:
+            return len(self._result_cache)
+        return self._cached('count', super().count)
+
+    def exists(self) -> bool:
+        if self._result_cache is not None:
+            return bool(self._result_cache)
+        return self._cached('exists', super().exists)
@@ -0,0 +1,133 @@
+import random
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError
+from django.utils import timezone
+
+from .models import Heartbeat
+
+# Models always read from the default database: a session or a user
+# missing from a replica would log the user out.
+PRIMARY_APPS = frozenset(('sessions', 'auth', 'contenttypes'))
+HEARTBEAT_ID = 1
+
+_state = threading.local()
+_snapshots_lock = threading.Lock()
+# Alias -> (when it was checked, moment of the data of the replica).
+_snapshots: Dict[str, Tuple[float, Optional[float]]] = {}
+
+
+def write_heartbeat() -> None:
+    """Marks the current moment in the default database."""
+    Heartbeat.objects.using(DEFAULT_DB_ALIAS).update_or_create(
+        id=HEARTBEAT_ID, defaults={'time': timezone.now()})
+
+
+def read_snapshot(alias: str) -> Optional[float]:
+    """
+    Returns the timestamp of the heartbeat found in the database, the moment
+    its data was copied from the default database, or None if it has none.
+    """
+    try:
+        moment = Heartbeat.objects.using(alias).filter(
+            id=HEARTBEAT_ID).values_list('time', flat=True).first()
+    except DatabaseError:
+        return None
+    return moment.timestamp() if moment else None
+
+
+def get_snapshot(alias: str) -> Optional[float]:
+    """
+    Returns the moment of the data of the replica, read at most once in
+    REPLICA_LAG_CHECK_INTERVAL seconds.
+    """
+    now = time.monotonic()
+    with _snapshots_lock:
+        checked, snapshot = _snapshots.get(alias, (None, None))
+    if checked is None or now - checked >= settings.REPLICA_LAG_CHECK_INTERVAL:
+        snapshot = read_snapshot(alias)
+        with _snapshots_lock:
+            _snapshots[alias] = (now, snapshot)
+    return snapshot
+
+
+def choose_replica() -> Tuple[Optional[str], Optional[float]]:
+    """
+    Returns a random replica lagging behind the default database by at most
+    REPLICA_MAX_LAG seconds and the moment of its data, or None for both
+    if every replica lags.
+    """
+    replicas = list(settings.DATABASE_REPLICAS)
+    random.shuffle(replicas)
+    for alias in replicas:
+        snapshot = get_snapshot(alias)
+        if (snapshot is not None
+                and time.time() - snapshot <= settings.REPLICA_MAX_LAG):
+            return alias, snapshot
+    return None, None
+
+
+def use_replica() -> Optional[str]:
+    """
+    Sends the reads of the current thread to a replica that does not lag,
+    if there is one, and returns its alias.
+    """
+    _state.alias, _state.snapshot = choose_replica()
+    return _state.alias
+
+
+def use_primary() -> None:
+    """Sends the reads of the current thread to the default database."""
+    _state.alias = _state.snapshot = None
+
+
+def get_read_alias() -> Optional[str]:
+    """Returns the replica the current thread reads from, if any."""
+    return getattr(_state, 'alias', None)
+
+
+def require_changes_since(moment: float) -> None:
+    """
+    Sends the reads of the current thread back to the default database if
+    the replica has been copied before the moment, a timestamp of a change
+    the response must include.
+    """
+    snapshot = getattr(_state, 'snapshot', None)
+    if snapshot is not None and snapshot < moment:
+        use_primary()
+
+
+class ReplicaRouter:
+    """
+    Sends the reads of the current thread to the replica chosen by
+    use_replica() and the rest of the queries to the default database.
+
+    The replicas are the aliases of DATABASES listed in DATABASE_REPLICAS.
+    ReplicaMiddleware chooses a replica for the views of REPLICA_VIEWS.
+    The models of PRIMARY_APPS are always read from the default database.
+    The replicas are not migrated, they get the tables with the data.
+    """
+
+    def db_for_read(self, model, **hints) -> str:
+        alias = get_read_alias()
+        if alias is None or model._meta.app_label in PRIMARY_APPS:
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints) -> str:
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints) -> Optional[bool]:
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None,
+                      **hints) -> Optional[bool]:
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
@@ -1,6 +1,41 @@
+import asyncio
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+from collections import Counter
+from datetime import timedelta
 from http import HTTPStatus
+from io import StringIO
+from unittest import mock
 
-from django.test import TestCase
+from django.core.cache import cache, caches
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.test import (LiveServerTestCase, TestCase, TransactionTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from posts.models import Comment, Group, Post, User
+
+from .asgi import WsgiToAsgi
+from .backends.sqlite3.base import apply_pragmas
+from .benchmarks import SKIPPED_VIEWS, USER_KINDS, get_view_names, percentile
+from .loadtest import parse_access_log, parse_mix
+from .metrics import Histogram, render_metrics
+from .middleware import PRIMARY_READS_COOKIE
+from .models import Heartbeat
+from .checks import check_shared_cache
+from .query_cache import get_table_versions
+from .routers import ReplicaRouter
 
 
 class ViewTestClass(TestCase):
@@ -10,3 +45,704 @@ class ViewTestClass(TestCase):
         # Проверьте, что используется шаблон core/404.html
         self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+class WsgiToAsgiTests(TestCase):
+    """Checking that the ASGI adapter serves the WSGI application."""
+
+    def call(self, application, path: str, method: str = 'GET',
+             body_chunks=(b'',), headers=()) -> list:
+        """Serves one request and returns the messages sent to the client."""
+        messages = [
+            {
+                'type': 'http.request',
+                'body': chunk,
+                'more_body': index < len(body_chunks) - 1,
+            }
+            for index, chunk in enumerate(body_chunks)
+        ]
+        sent = []
+
+        async def receive() -> dict:
+            return messages.pop(0)
+
+        async def send(message: dict) -> None:
+            sent.append(message)
+
+        scope = {
+            'type': 'http',
+            'method': method,
+            'path': path,
+            'query_string': b'a=1',
+            'headers': [(b'host', b'testserver'), *headers],
+        }
+        asyncio.run(application(scope, receive, send))
+        application.executor.shutdown()
+        return sent
+
+    def test_django_page_is_served(self) -> None:
+        """A page of the site is answered with its status and content."""
+        sent = self.call(
+            WsgiToAsgi(WSGIHandler(), max_workers=1),
+            reverse('about:author'),
+        )
+        start, body = sent
+        self.assertEqual(start['type'], 'http.response.start')
+        self.assertEqual(start['status'], HTTPStatus.OK)
+        self.assertIn(
+            (b'content-type', b'text/html; charset=utf-8'), start['headers'])
+        self.assertIn('Об авторе'.encode(), body['body'])
+        self.assertFalse(body.get('more_body', False))
+
+    def test_request_reaches_wsgi_environ(self) -> None:
+        """The body, the headers and the query string are passed on."""
+        received = {}
+
+        def application(environ, start_response):
+            received.update(environ)
+            received['body'] = environ['wsgi.input'].read()
+            start_response('201 Created', [('X-Test', 'yes')])
+            return [b'ok']
+
+        sent = self.call(
+            WsgiToAsgi(application, max_workers=1),
+            '/upload/',
+            method='POST',
+            body_chunks=(b'first ', b'second'),
+            headers=[
+                (b'content-type', b'text/plain'),
+                (b'x-custom', b'value'),
+            ],
+        )
+        cases = {
+            'REQUEST_METHOD': 'POST',
+            'PATH_INFO': '/upload/',
+            'QUERY_STRING': 'a=1',
+            'CONTENT_TYPE': 'text/plain',
+            'HTTP_X_CUSTOM': 'value',
+            'body': b'first second',
+        }
+        for key, expected in cases.items():
+            with self.subTest(key=key):
+                self.assertEqual(received[key], expected)
+        self.assertEqual(sent[0]['status'], HTTPStatus.CREATED)
+        self.assertEqual(sent[0]['headers'], [(b'x-test', b'yes')])
+        self.assertEqual(sent[1]['body'], b'ok')
+
+    def test_streaming_response_is_sent_in_chunks(self) -> None:
+        """Every chunk of a streaming response is sent separately."""
+        class Streaming(list):
+            streaming = True
+            closed = False
+
+            def close(self):
+                self.closed = True
+
+        result = Streaming([b'one', b'two'])
+
+        def application(environ, start_response):
+            start_response('200 OK', [])
+            return result
+
+        sent = self.call(WsgiToAsgi(application, max_workers=1), '/')
+        self.assertEqual(
+            [message.get('body') for message in sent[1:]],
+            [b'one', b'two', b''],
+        )
+        self.assertTrue(result.closed)
+
+    def test_streaming_response_is_read_by_one_thread(self) -> None:
+        """
+        The view, the chunks and the closing of a streaming response run
+        in the same thread, which may hold a database cursor.
+        """
+        threads = []
+
+        class Streaming:
+            streaming = True
+
+            def __iter__(self):
+                for chunk in (b'one', b'two', b'three'):
+                    threads.append(threading.get_ident())
+                    yield chunk
+
+            def close(self):
+                threads.append(threading.get_ident())
+
+        def application(environ, start_response):
+            threads.append(threading.get_ident())
+            start_response('200 OK', [])
+            return Streaming()
+
+        wsgi = WsgiToAsgi(application, max_workers=4)
+        # Every thread of the pool is started and waits for work.
+        barrier = threading.Barrier(4)
+        for _ in range(4):
+            wsgi.executor.submit(barrier.wait)
+        self.call(wsgi, '/')
+        self.assertEqual(len(threads), 5)
+        self.assertEqual(len(set(threads)), 1)
+
+    def test_streaming_stops_when_client_is_gone(self) -> None:
+        """A failed send stops the reading and closes the response."""
+        closed = []
+
+        class Streaming:
+            streaming = True
+
+            def __iter__(self):
+                while True:
+                    yield b'chunk'
+
+            def close(self):
+                closed.append(True)
+
+        def application(environ, start_response):
+            start_response('200 OK', [])
+            return Streaming()
+
+        async def send(message: dict) -> None:
+            if message.get('more_body'):
+                raise OSError('Соединение закрыто')
+
+        async def receive() -> dict:
+            return {'type': 'http.request', 'body': b''}
+
+        wsgi = WsgiToAsgi(application, max_workers=1)
+        scope = {'type': 'http', 'method': 'GET', 'path': '/', 'headers': []}
+        with self.assertRaises(OSError):
+            asyncio.run(wsgi(scope, receive, send))
+        wsgi.executor.shutdown()
+        self.assertEqual(closed, [True])
+
+    def test_lifespan_events_are_answered(self) -> None:
+        """The adapter confirms the startup and the shutdown."""
+        application = WsgiToAsgi(WSGIHandler(), max_workers=1)
+        events = [
+            {'type': 'lifespan.startup'},
+            {'type': 'lifespan.shutdown'},
+        ]
+        sent = []
+
+        async def receive() -> dict:
+            return events.pop(0)
+
+        async def send(message: dict) -> None:
+            sent.append(message['type'])
+
+        asyncio.run(application({'type': 'lifespan'}, receive, send))
+        self.assertEqual(
+            sent,
+            ['lifespan.startup.complete', 'lifespan.shutdown.complete'],
+        )
+
+
+class MetricsTests(TestCase):
+    """Checking the instrumentation of requests and the metrics endpoint."""
+
+    def setUp(self) -> None:
+        """Clears the cache so that the pages are rendered."""
+        cache.clear()
+
+    def get_sample(self, line_start: str) -> float:
+        """Returns the value of the exported sample, 0 if there is none."""
+        for line in render_metrics().splitlines():
+            if line.startswith(line_start + ' '):
+                return float(line.rsplit(' ', 1)[1])
+        return 0
+
+    @override_settings(SERVER_TIMING=True)
+    def test_request_is_measured_by_view(self) -> None:
+        """The queries, templates and cache reads are counted per view."""
+        view = '{view="posts:index"}'
+        requests = self.get_sample(f'yatube_request_db_queries_count{view}')
+        misses = self.get_sample(
+            'yatube_cache_requests_total{view="posts:index",result="miss"}')
+
+        response = self.client.get(reverse('posts:index'))
+
+        self.assertEqual(
+            self.get_sample(f'yatube_request_db_queries_count{view}'),
+            requests + 1,
+        )
+        self.assertGreater(
+            self.get_sample(
+                'yatube_cache_requests_total'
+                '{view="posts:index",result="miss"}'),
+            misses,
+        )
+        self.assertGreater(
+            self.get_sample(
+                f'yatube_request_template_duration_seconds_sum{view}'),
+            0,
+        )
+        timing = response['Server-Timing']
+        for metric in ('db;dur=', 'tpl;dur=', 'cache;desc=', 'total;dur='):
+            with self.subTest(metric=metric):
+                self.assertIn(metric, timing)
+
+    def test_server_timing_is_not_sent_by_default(self) -> None:
+        """Without debugging the clients do not get the Server-Timing."""
+        response = self.client.get(reverse('posts:index'))
+        self.assertFalse(response.has_header('Server-Timing'))
+
+    def test_metrics_are_served_to_allowed_addresses(self) -> None:
+        """Only the addresses of METRICS_ALLOWED_IPS may read the metrics."""
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertIn(
+            '# TYPE yatube_request_duration_seconds histogram',
+            response.content.decode(),
+        )
+        response = self.client.get(reverse('metrics'), REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_proxied_metrics_need_token(self) -> None:
+        """A request passed by a local proxy is served only with the token."""
+        requests = {
+            'no token': ({}, HTTPStatus.NOT_FOUND),
+            'wrong token': (
+                {'HTTP_AUTHORIZATION': 'Bearer wrong'}, HTTPStatus.NOT_FOUND),
+            'token': (
+                {'HTTP_AUTHORIZATION': 'Bearer secret'}, HTTPStatus.OK),
+        }
+        for name, (headers, status) in requests.items():
+            with self.subTest(name=name):
+                response = self.client.get(
+                    reverse('metrics'),
+                    HTTP_X_FORWARDED_FOR='203.0.113.7',
+                    **headers,
+                )
+                self.assertEqual(response.status_code, status)
+
+    def test_histogram_buckets_are_cumulative(self) -> None:
+        """Every bucket counts the values up to its bound."""
+        histogram = Histogram('test_seconds', 'Test.', ('view',), (0.1, 1))
+        for value in (0.05, 0.1, 0.5, 3):
+            histogram.observe(('a"b',), value)
+
+        self.assertEqual(list(histogram.collect()), [
+            'test_seconds_bucket{view="a\\"b",le="0.1"} 2',
+            'test_seconds_bucket{view="a\\"b",le="1"} 3',
+            'test_seconds_bucket{view="a\\"b",le="+Inf"} 4',
+            'test_seconds_sum{view="a\\"b"} 3.65',
+            'test_seconds_count{view="a\\"b"} 4',
+        ])
+
+
+class BenchmarkViewsTests(TestCase):
+    """Checking the benchmark of the views."""
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        """Seeds a small dataset."""
+        super().setUpClass()
+        call_command(
+            'seed_benchmark_data', users=20, groups=2, posts=60,
+            comments=80, follows=5, stdout=StringIO(),
+        )
+
+    def setUp(self) -> None:
+        """Creates a directory for the results."""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'results.json')
+
+    def benchmark(self, *args: str) -> dict:
+        """Runs the benchmark and returns the saved results."""
+        call_command(
+            'benchmark_views', '--repeat=3', '--warmup=0',
+            f'--output={self.path}', *args, stdout=StringIO(),
+        )
+        with open(self.path, encoding='utf-8') as file:
+            return json.load(file)
+
+    def test_every_view_is_measured(self) -> None:
+        """Every page is requested by both kinds of users."""
+        results = self.benchmark()['results']
+
+        measured = {result['view'] for result in results.values()}
+        self.assertEqual(measured, set(get_view_names()) - set(SKIPPED_VIEWS))
+        for user_kind in USER_KINDS:
+            for position in ('first', 'middle', 'last'):
+                with self.subTest(user_kind=user_kind, position=position):
+                    self.assertIn(f'posts:index {position} {user_kind}',
+                                  results)
+        for name, result in results.items():
+            with self.subTest(name=name):
+                self.assertLessEqual(result['p50_ms'], result['p95_ms'])
+                self.assertLessEqual(result['p95_ms'], result['p99_ms'])
+                self.assertGreaterEqual(result['memory_kib'], 0)
+
+    def test_regression_fails_the_run(self) -> None:
+        """A slower page or more queries than in the baseline is an error."""
+        report = self.benchmark('--view=posts:index')
+        for result in report['results'].values():
+            result['p95_ms'] = 0.001
+        with open(self.path, 'w', encoding='utf-8') as file:
+            json.dump(report, file)
+
+        with self.assertRaises(CommandError):
+            call_command(
+                'benchmark_views', '--repeat=3', '--warmup=0',
+                '--view=posts:index', f'--compare={self.path}',
+                '--min-delta=0', stdout=StringIO(),
+            )
+        call_command(
+            'benchmark_views', '--repeat=3', '--warmup=0',
+            '--view=posts:index', f'--compare={self.path}',
+            '--min-delta=1000', stdout=StringIO(),
+        )
+
+    def test_percentile_uses_nearest_rank(self) -> None:
+        """The percentile is one of the values."""
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([3, 1, 2], 95), 3)
+        self.assertEqual(percentile([7], 50), 7)
+
+
+class LoadTestTests(LiveServerTestCase):
+    """Checking the load test of the site."""
+
+    def setUp(self) -> None:
+        """Seeds a small dataset and creates a directory for the results."""
+        call_command(
+            'seed_benchmark_data', users=10, groups=2, posts=30,
+            comments=20, follows=3, stdout=StringIO(),
+        )
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'results.json')
+
+    def test_mix_is_sent_to_the_server(self) -> None:
+        """Every action of the mix is sent and the writes are saved."""
+        comments = Comment.objects.count()
+        posts = Post.objects.count()
+        call_command(
+            'loadtest', f'--url={self.live_server_url}', '--rates=20,40',
+            '--duration=1', '--concurrency=1', '--sessions=3',
+            '--mix=index=1,post_detail=1,add_comment=1,post_create=1',
+            f'--output={self.path}', stdout=StringIO(),
+        )
+
+        with open(self.path, encoding='utf-8') as file:
+            stages = json.load(file)['stages']
+        self.assertEqual([stage['rate'] for stage in stages], [20, 40])
+        self.assertEqual(
+            set(stages[0]['actions']),
+            {'index', 'post_detail', 'add_comment', 'post_create'},
+        )
+        self.assertEqual(stages[0]['error_rate'], 0)
+        actions = Counter()
+        for stage in stages:
+            for action, stats in stage['actions'].items():
+                actions[action] += stats['requests']
+        self.assertEqual(
+            Comment.objects.count(), comments + actions['add_comment'])
+        self.assertEqual(
+            Post.objects.count(), posts + actions['post_create'])
+
+    def test_mix_and_log_are_parsed(self) -> None:
+        """The shares and the request lines are read, the rest is refused."""
+        self.assertEqual(
+            parse_mix('index=3, add_comment=1.5'),
+            {'index': 3, 'add_comment': 1.5},
+        )
+        for value in ('unknown=1', 'index=x', 'index=0'):
+            with self.subTest(value=value):
+                with self.assertRaises(ValueError):
+                    parse_mix(value)
+        log = [
+            '127.0.0.1 - - [10/Oct/2023:13:55:36 +0000] '
+            '"GET /?page=2 HTTP/1.1" 200 2326 "-" "curl/8.0"',
+            'garbage',
+            '127.0.0.1 - - [10/Oct/2023:13:55:37 +0000] '
+            '"POST /posts/5/comment/ HTTP/1.1" 302 0',
+        ]
+        self.assertEqual(list(parse_access_log(log)), [
+            ('GET', '/?page=2'), ('POST', '/posts/5/comment/'),
+        ])
+
+
+@override_settings(
+    DATABASE_REPLICAS=['replica'],
+    REPLICA_LAG_CHECK_INTERVAL=0,
+)
+class ReplicaRouterTests(TransactionTestCase):
+    """Checking that the reads of the feeds are sent to the replica."""
+
+    def setUp(self) -> None:
+        """Adds a replica of the test database in a temporary file."""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        connections.databases['replica'] = dict(
+            connections.databases[DEFAULT_DB_ALIAS],
+            NAME=os.path.join(directory.name, 'replica.sqlite3'),
+        )
+        self.addCleanup(self.remove_replica)
+        cache.clear()
+        self.author = User.objects.create_user(username='auth')
+        self.post = Post.objects.create(text='Старый пост', author=self.author)
+        self.sync()
+        self.new_post = Post.objects.create(
+            text='Новый пост', author=self.author)
+
+    def remove_replica(self) -> None:
+        """Closes the connection to the replica and forgets it."""
+        connections['replica'].close()
+        del connections['replica']
+        del connections.databases['replica']
+
+    def sync(self) -> None:
+        """Copies the test database to the replica."""
+        call_command('sync_replicas', stdout=StringIO())
+
+    def get_api_post_ids(self, client=None) -> list:
+        """Returns the ids of the posts of the API feed."""
+        response = (client or self.client).get(reverse('posts:api_index'))
+        return [post['id'] for post in response.json()['results']]
+
+    def test_reads_of_feeds_go_to_replica(self) -> None:
+        """The API feed shows the posts copied to the replica."""
+        self.assertEqual(self.get_api_post_ids(), [self.post.id])
+        self.sync()
+        self.assertEqual(
+            self.get_api_post_ids(), [self.new_post.id, self.post.id])
+
+    def test_changed_feed_page_is_read_from_primary(self) -> None:
+        """A feed page changed after the copy is read from the primary."""
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, self.new_post.text)
+
+    def test_client_reads_own_writes(self) -> None:
+        """After a POST the client reads from the primary for a while."""
+        self.client.force_login(self.author)
+        response = self.client.post(
+            reverse('posts:add_comment', args=[self.post.id]),
+            {'text': 'Комментарий'},
+        )
+        self.assertIn(PRIMARY_READS_COOKIE, response.cookies)
+        self.assertEqual(
+            self.get_api_post_ids(), [self.new_post.id, self.post.id])
+        self.assertEqual(
+            self.get_api_post_ids(self.client_class()), [self.post.id])
+
+    def test_lagging_replica_is_not_read(self) -> None:
+        """Reads fall back to the primary when the copy is too old."""
+        Heartbeat.objects.using('replica').update(
+            time=timezone.now() - timedelta(hours=1))
+        self.assertEqual(
+            self.get_api_post_ids(), [self.new_post.id, self.post.id])
+
+    def test_writes_and_migrations_use_primary(self) -> None:
+        """Only the reads are routed and the replica is never migrated."""
+        router = ReplicaRouter()
+        self.assertEqual(router.db_for_write(Post), DEFAULT_DB_ALIAS)
+        self.assertFalse(router.allow_migrate('replica', 'posts'))
+        self.assertIsNone(router.allow_migrate(DEFAULT_DB_ALIAS, 'posts'))
+
+
+class SqliteBackendTests(TestCase):
+    """Checking the production profile of the SQLite backend."""
+
+    def setUp(self) -> None:
+        """Adds a database in a temporary file with the default settings."""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        connections.databases['file'] = dict(
+            connections.databases[DEFAULT_DB_ALIAS],
+            NAME=os.path.join(directory.name, 'file.sqlite3'),
+        )
+        self.addCleanup(self.remove_database)
+        self.connection = connections['file']
+
+    def remove_database(self) -> None:
+        """Closes the connection to the database and forgets it."""
+        connections['file'].close()
+        del connections['file']
+        del connections.databases['file']
+
+    def pragma(self, name: str):
+        """Returns the value of the pragma of the connection."""
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_connection_is_tuned(self) -> None:
+        """New connections use WAL and the pragmas of the profile."""
+        expected = {
+            'journal_mode': 'wal',
+            'synchronous': 1,
+            'busy_timeout': 5000,
+            'cache_size': -64 * 1024,
+            'mmap_size': 256 * 1024 * 1024,
+        }
+        for name, value in expected.items():
+            with self.subTest(pragma=name):
+                self.assertEqual(self.pragma(name), value)
+
+    def test_transactions_take_write_lock_at_once(self) -> None:
+        """atomic() starts the transactions in the configured mode."""
+        self.connection.settings_dict['OPTIONS'] = {
+            'transaction_mode': 'IMMEDIATE'}
+        with CaptureQueriesContext(self.connection) as queries:
+            with transaction.atomic(using='file'):
+                pass
+        self.assertEqual(queries.captured_queries[0]['sql'],
+                         'BEGIN IMMEDIATE')
+
+        self.connection.settings_dict['OPTIONS'] = {
+            'transaction_mode': 'SOMETIMES'}
+        with self.assertRaises(ImproperlyConfigured):
+            with transaction.atomic(using='file'):
+                pass
+
+    def test_pragmas_are_validated(self) -> None:
+        """A pragma value cannot smuggle another statement in."""
+        connection = sqlite3.connect(':memory:')
+        self.addCleanup(connection.close)
+        with self.assertRaises(ImproperlyConfigured):
+            apply_pragmas(connection, {'cache_size': '1; DROP TABLE x'})
+
+    def test_log_is_checkpointed(self) -> None:
+        """The maintenance moves the log into the database file."""
+        with self.connection.cursor() as cursor:
+            cursor.execute('CREATE TABLE item (value TEXT)')
+            cursor.executemany(
+                'INSERT INTO item VALUES (%s)', [('x' * 100,)] * 100)
+        wal = f'{self.connection.settings_dict["NAME"]}-wal'
+        self.assertGreater(os.path.getsize(wal), 0)
+
+        call_command(
+            'maintain_database', '--database=file', stdout=StringIO())
+
+        self.assertEqual(os.path.getsize(wal), 0)
+
+
+class QueryCacheTests(TransactionTestCase):
+    """Checking the results of the querysets marked with cache()."""
+
+    def setUp(self) -> None:
+        """
+        Creates a group with an empty cache shared by the processes, the
+        default cache of the settings is kept by every process.
+        """
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        shared = mock.patch.object(
+            caches['default'], '_cache', FileBasedCache(directory.name, {}))
+        shared.start()
+        self.addCleanup(shared.stop)
+        Group.objects.create(title='Первая', slug='first')
+
+    def count(self) -> int:
+        """Returns the cached number of the groups."""
+        return Group.objects.cache().count()
+
+    def test_results_are_cached(self) -> None:
+        """Repeated querysets are answered by the cache."""
+        querysets = {
+            'rows': lambda: list(Group.objects.cache()),
+            'values': lambda: list(Group.objects.cache().values('slug')),
+            'flat': lambda: list(
+                Group.objects.cache().values_list('slug', flat=True)),
+            'count': self.count,
+            'exists': lambda: Group.objects.cache().filter(
+                slug='first').exists(),
+        }
+        results = {}
+        for name, queryset in querysets.items():
+            with self.subTest(queryset=name):
+                with self.assertNumQueries(1):
+                    results[name] = queryset()
+                with self.assertNumQueries(0):
+                    self.assertEqual(queryset(), results[name])
+        self.assertEqual(results['values'], [{'slug': 'first'}])
+        self.assertEqual(results['flat'], ['first'])
+
+    def test_writes_outdate_results(self) -> None:
+        """Every kind of write outdates the results of its table."""
+        writes = {
+            'create': lambda: Group.objects.create(
+                title='Вторая', slug='second'),
+            'update': lambda: Group.objects.filter(slug='second').update(
+                title='Изменённая'),
+            'delete': lambda: Group.objects.filter(slug='second').delete(),
+        }
+        for name, write in writes.items():
+            with self.subTest(write=name):
+                titles = list(
+                    Group.objects.cache().values_list('title', flat=True))
+                write()
+                expected = list(
+                    Group.objects.values_list('title', flat=True))
+                self.assertNotEqual(expected, titles)
+                with self.assertNumQueries(1):
+                    self.assertEqual(
+                        list(Group.objects.cache().values_list(
+                            'title', flat=True)),
+                        expected,
+                    )
+
+    def test_transaction_reads_own_writes(self) -> None:
+        """A transaction reads the tables it changed from the database."""
+        self.assertEqual(self.count(), 1)
+        with transaction.atomic():
+            Group.objects.create(title='Вторая', slug='second')
+            for _ in range(2):
+                with self.assertNumQueries(1):
+                    self.assertEqual(self.count(), 2)
+        self.assertEqual(self.count(), 2)
+
+    def test_rolled_back_writes_are_not_cached(self) -> None:
+        """Results seen inside a rolled back transaction are not kept."""
+        self.assertEqual(self.count(), 1)
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                Group.objects.create(title='Вторая', slug='second')
+                self.assertEqual(self.count(), 2)
+                raise RuntimeError
+        with self.assertNumQueries(0):
+            self.assertEqual(self.count(), 1)
+
+    def test_rolled_back_savepoint_keeps_cache(self) -> None:
+        """Tables changed only in a rolled back savepoint stay cached."""
+        self.assertEqual(self.count(), 1)
+        with transaction.atomic():
+            with self.assertRaises(RuntimeError):
+                with transaction.atomic():
+                    Group.objects.create(title='Вторая', slug='second')
+                    raise RuntimeError
+            with self.assertNumQueries(0):
+                self.assertEqual(self.count(), 1)
+
+    def test_commit_outdates_results(self) -> None:
+        """
+        The commit of a change outdates the results other connections
+        cached before it from the data without the change.
+        """
+        self.assertEqual(self.count(), 1)
+        with transaction.atomic():
+            Group.objects.create(title='Вторая', slug='second')
+            versions = get_table_versions(['posts_group'])
+        self.assertGreater(get_table_versions(['posts_group']), versions)
+        self.assertEqual(self.count(), 2)
+
+    def test_process_cache_is_not_used(self) -> None:
+        """
+        A cache kept by every process is not used for querysets and is
+        reported by the checks.
+        """
+        local = LocMemCache('query-cache-tests', {})
+        self.assertEqual(check_shared_cache(None), [])
+        with mock.patch.object(caches['default'], '_cache', local):
+            self.assertEqual(
+                [warning.id for warning in check_shared_cache(None)],
+                ['core.W001'],
+            )
+            self.assertEqual(self.count(), 1)
+            with self.assertNumQueries(1):
+                self.assertEqual(self.count(), 1)
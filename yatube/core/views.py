@@ -1,5 +1,11 @@
+import hmac
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
 from django.shortcuts import render
 
+from .metrics import render_metrics
+
 
 def page_not_found(request, exception):
     return render(request, 'core/404.html', {'path': request.path}, status=404)
@@ -11,3 +17,31 @@ def csrf_failure(request, reason=''):
 
 def server_error(request):
     return render(request, 'core/500.html', status=500)
+
+
+def is_metrics_reader(request) -> bool:
+    """
+    Checks whether the request may read the metrics: it carries
+    METRICS_TOKEN, or it comes straight from an address of
+    METRICS_ALLOWED_IPS. A request passed by a reverse proxy comes from
+    the address of the proxy and is only trusted with the token.
+    """
+    token = settings.METRICS_TOKEN
+    if token and hmac.compare_digest(
+            request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {token}'):
+        return True
+    return (
+        'HTTP_X_FORWARDED_FOR' not in request.META
+        and request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS
+    )
+
+
+def metrics(request):
+    """
+    Returns the metrics of the process in the Prometheus text format to
+    the readers allowed by is_metrics_reader().
+    """
+    if not is_metrics_reader(request):
+        raise Http404
+    return HttpResponse(
+        render_metrics(), content_type='text/plain; version=0.0.4')
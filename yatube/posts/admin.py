@@ -1,9 +1,54 @@
 from django.contrib import admin
+from django.db import transaction
+from django.http import StreamingHttpResponse
+from django.utils import timezone
 
-from .models import Group, Post
+from .exporting import EXPORTS, gzip_chunks, iter_lines, iter_rows
+from .models import Comment, Follow, Group, Post
+from .search import filter_matching
 
 
-class PostAdmin(admin.ModelAdmin):
+def stream_export(model_name: str, queryset, file_format: str):
+    """
+    Returns a response streaming the objects as a gzipped file. The rows
+    are read in chunks while the response is sent, not loaded at once.
+    """
+    spec = EXPORTS[model_name]
+    response = StreamingHttpResponse(
+        gzip_chunks(iter_lines(spec, iter_rows(spec, queryset), file_format)),
+        content_type='application/gzip',
+    )
+    filename = f'{model_name}s-{timezone.now():%Y%m%d-%H%M%S}.{file_format}.gz'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+class ExportActionsMixin:
+    """
+    Adds the actions downloading the selected objects as gzipped JSON lines
+    or a CSV file.
+
+    Attributes:
+        export_name (str): Name of the export of the model in EXPORTS.
+    """
+
+    export_name = ''
+    actions = ('export_jsonl', 'export_csv')
+
+    def export_jsonl(self, request, queryset):
+        """Downloads the selected objects as gzipped JSON lines."""
+        return stream_export(self.export_name, queryset, 'jsonl')
+
+    export_jsonl.short_description = 'Выгрузить в JSONL'
+
+    def export_csv(self, request, queryset):
+        """Downloads the selected objects as a gzipped CSV file."""
+        return stream_export(self.export_name, queryset, 'csv')
+
+    export_csv.short_description = 'Выгрузить в CSV'
+
+
+class PostAdmin(ExportActionsMixin, admin.ModelAdmin):
     """Model for displaying information about posts in the admin panel."""
 
     list_display = (
@@ -12,24 +57,88 @@ class PostAdmin(admin.ModelAdmin):
         'pub_date',
         'author',
         'group',
+        'comments_count',
     )
     list_editable = ('group',)
+    list_select_related = ('author', 'group')
     search_fields = ('text',)
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
+    export_name = 'post'
+
+    def save_model(self, request, obj, form, change):
+        """Saves the post together with the counters of its relations."""
+        with transaction.atomic():
+            super().save_model(request, obj, form, change)
 
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        """
+        Shares the choices of the groups between the rows of the list, each
+        row would query all groups otherwise.
+        """
+        formfield = super().formfield_for_foreignkey(
+            db_field, request, **kwargs)
+        if db_field.name == 'group' and request is not None:
+            if not hasattr(request, '_group_choices'):
+                request._group_choices = list(formfield.choices)
+            formfield.choices = request._group_choices
+        return formfield
 
-class GroupAdmin(admin.ModelAdmin):
+    def get_search_results(self, request, queryset, search_term):
+        """Finds the posts through the full-text index of their texts."""
+        if not search_term.strip():
+            return queryset, False
+        return filter_matching(queryset, search_term), False
+
+
+class GroupAdmin(ExportActionsMixin, admin.ModelAdmin):
     """Model for displaying information about groups in the admin panel."""
     list_display = (
         'pk',
         'title',
         'slug',
         'description',
+        'posts_count',
     )
     search_fields = ('title',)
     empty_value_display = '-пусто-'
+    export_name = 'group'
+
+
+class CommentAdmin(ExportActionsMixin, admin.ModelAdmin):
+    """Model for displaying information about comments in the admin panel."""
+
+    list_display = (
+        'pk',
+        'text',
+        'created',
+        'author',
+        'post',
+    )
+    list_select_related = ('author', 'post')
+    raw_id_fields = ('post', 'author')
+    list_filter = ('created',)
+    empty_value_display = '-пусто-'
+    export_name = 'comment'
+
+
+class FollowAdmin(ExportActionsMixin, admin.ModelAdmin):
+    """
+    Model for displaying information about subscriptions in the admin panel.
+    """
+
+    list_display = (
+        'pk',
+        'user',
+        'author',
+    )
+    list_select_related = ('user', 'author')
+    raw_id_fields = ('user', 'author')
+    empty_value_display = '-пусто-'
+    export_name = 'follow'
 
 
 admin.site.register(Post, PostAdmin)
 admin.site.register(Group, GroupAdmin)
+admin.site.register(Comment, CommentAdmin)
+admin.site.register(Follow, FollowAdmin)
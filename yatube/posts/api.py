@@ -0,0 +1,224 @@
+from functools import wraps
+from http import HTTPStatus
+from operator import attrgetter
+from typing import Any, Callable, Dict, List, NamedTuple, Sequence, Tuple
+
+from django.db.models import QuerySet
+from django.http import HttpRequest, JsonResponse
+from django.views.decorators.http import require_GET
+
+from . import feeds
+from .models import Group, Post, User
+from .paginator import (COMMENT_ORDERING, FEED_ORDERING,
+                        split_into_keyset_pages)
+
+API_PAGE_SIZE = 10
+MAX_API_PAGE_SIZE = 100
+JSON_DUMPS_PARAMS = {'separators': (',', ':'), 'ensure_ascii': False}
+
+
+class ApiField(NamedTuple):
+    """
+    A field of the objects returned by the API.
+
+    Attributes:
+        columns (tuple): Model fields to load for the value.
+        relation (str): Relation to join for the value or None.
+        serialize (callable): Takes the object and returns the value.
+    """
+
+    columns: Tuple[str, ...]
+    relation: Any
+    serialize: Callable[[Any], Any]
+
+
+POST_FIELDS = {
+    'id': ApiField(('id',), None, attrgetter('id')),
+    'text': ApiField(('text',), None, attrgetter('text')),
+    'pub_date': ApiField(
+        ('pub_date',), None, lambda post: post.pub_date.isoformat()),
+    'author': ApiField(
+        ('author', 'author__username'),
+        'author',
+        lambda post: post.author.username,
+    ),
+    'group': ApiField(
+        ('group', 'group__slug'),
+        'group',
+        lambda post: post.group.slug if post.group_id else None,
+    ),
+    'image': ApiField(
+        ('image',), None, lambda post: post.image.url if post.image else None),
+    'comments_count': ApiField(
+        ('comments_count',), None, attrgetter('comments_count')),
+}
+COMMENT_FIELDS = {
+    'id': ApiField(('id',), None, attrgetter('id')),
+    'post': ApiField(('post',), None, attrgetter('post_id')),
+    'text': ApiField(('text',), None, attrgetter('text')),
+    'created': ApiField(
+        ('created',), None, lambda comment: comment.created.isoformat()),
+    'author': ApiField(
+        ('author', 'author__username'),
+        'author',
+        lambda comment: comment.author.username,
+    ),
+}
+
+
+class ApiError(Exception):
+    """An error reported to the client with the status and the message."""
+
+    def __init__(self, status: HTTPStatus, detail: str) -> None:
+        super().__init__(detail)
+        self.status = status
+        self.detail = detail
+
+
+def api_view(view: Callable) -> Callable:
+    """Answers GET requests with JSON and turns ApiError into a response."""
+    @require_GET
+    @wraps(view)
+    def wrapper(request: HttpRequest, *args, **kwargs) -> JsonResponse:
+        try:
+            data = view(request, *args, **kwargs)
+        except ApiError as error:
+            return JsonResponse(
+                {'detail': error.detail},
+                status=error.status,
+                json_dumps_params=JSON_DUMPS_PARAMS,
+            )
+        return JsonResponse(data, json_dumps_params=JSON_DUMPS_PARAMS)
+    return wrapper
+
+
+def get_requested_fields(request: HttpRequest,
+                         available: Dict[str, ApiField]) -> List[str]:
+    """Returns the names of the fields listed in ?fields=, all by default."""
+    raw = request.GET.get('fields')
+    if not raw:
+        return list(available)
+    names = [name.strip() for name in raw.split(',') if name.strip()]
+    unknown = [name for name in names if name not in available]
+    if unknown or not names:
+        raise ApiError(
+            HTTPStatus.BAD_REQUEST,
+            f'Неизвестные поля: {", ".join(unknown)}. '
+            f'Доступны: {", ".join(available)}',
+        )
+    return list(dict.fromkeys(names))
+
+
+def get_page_size(request: HttpRequest) -> int:
+    """Returns the number of objects per page requested with ?limit=."""
+    raw = request.GET.get('limit')
+    if raw is None:
+        return API_PAGE_SIZE
+    try:
+        limit = int(raw)
+    except ValueError:
+        limit = 0
+    if not 1 <= limit <= MAX_API_PAGE_SIZE:
+        raise ApiError(
+            HTTPStatus.BAD_REQUEST,
+            f'Параметр limit должен быть от 1 до {MAX_API_PAGE_SIZE}',
+        )
+    return limit
+
+
+def project(queryset: QuerySet, available: Dict[str, ApiField],
+            names: Sequence[str], ordering: Sequence[str]) -> QuerySet:
+    """
+    Limits the queryset to the columns and joins of the requested fields.
+    The fields of the ordering are always loaded for the page cursors.
+    """
+    columns = [name.lstrip('-') for name in ordering]
+    relations = []
+    for name in names:
+        field = available[name]
+        columns.extend(field.columns)
+        if field.relation:
+            relations.append(field.relation)
+    queryset = queryset.select_related(None)
+    if relations:
+        queryset = queryset.select_related(*relations)
+    return queryset.only(*dict.fromkeys(columns))
+
+
+def paginate(request: HttpRequest, queryset: QuerySet,
+             available: Dict[str, ApiField],
+             ordering: Sequence[str] = FEED_ORDERING) -> dict:
+    """
+    Returns the page of objects addressed by ?after= or ?before= with the
+    fields requested by ?fields=.
+
+    Args:
+        request (HttpRequest): A basic HTTP request.
+        queryset (QuerySet): Objects of the endpoint, the same as on the page
+            of the site.
+        available (dict): Fields the objects can be returned with.
+        ordering (tuple): Sort key of the pages, must end with a unique field.
+    """
+    names = get_requested_fields(request, available)
+    page = split_into_keyset_pages(
+        request,
+        project(queryset, available, names, ordering),
+        get_page_size(request),
+        ordering,
+    )
+    serializers = [(name, available[name].serialize) for name in names]
+    return {
+        'results': [
+            {name: serialize(obj) for name, serialize in serializers}
+            for obj in page
+        ],
+        'next': page.next_cursor,
+        'previous': page.previous_cursor,
+    }
+
+
+def get_or_error(queryset: QuerySet, detail: str, **lookups) -> Any:
+    """Returns the object or raises ApiError with 404 Not Found."""
+    obj = queryset.filter(**lookups).first()
+    if obj is None:
+        raise ApiError(HTTPStatus.NOT_FOUND, detail)
+    return obj
+
+
+@api_view
+def index(request: HttpRequest) -> dict:
+    """Returns the posts of the main page."""
+    return paginate(request, feeds.get_index_posts(), POST_FIELDS)
+
+
+@api_view
+def group_posts(request: HttpRequest, slug: str) -> dict:
+    """Returns the posts of the community with the slug."""
+    group = get_or_error(
+        Group.objects.only('id'), 'Группа не найдена', slug=slug)
+    return paginate(request, feeds.get_group_posts(group), POST_FIELDS)
+
+
+@api_view
+def profile(request: HttpRequest, username: str) -> dict:
+    """Returns the posts of the user with the username."""
+    author = get_or_error(
+        User.objects.only('id'), 'Пользователь не найден', username=username)
+    return paginate(request, feeds.get_profile_posts(author), POST_FIELDS)
+
+
+@api_view
+def follow_index(request: HttpRequest) -> dict:
+    """Returns the posts of the authors the user is subscribed to."""
+    if not request.user.is_authenticated:
+        raise ApiError(HTTPStatus.UNAUTHORIZED, 'Требуется авторизация')
+    return paginate(request, feeds.get_follow_posts(request.user),
+                    POST_FIELDS)
+
+
+@api_view
+def post_comments(request: HttpRequest, post_id: int) -> dict:
+    """Returns the comments of the post, the oldest first."""
+    post = get_or_error(Post.objects.only('id'), 'Пост не найден', id=post_id)
+    return paginate(request, feeds.get_post_comments(post), COMMENT_FIELDS,
+                    COMMENT_ORDERING)
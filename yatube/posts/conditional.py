@@ -0,0 +1,115 @@
+import hashlib
+from datetime import datetime, timezone
+from typing import Callable, List, Optional
+
+from django.http import HttpRequest
+from django.middleware.csrf import get_token
+from django.views.decorators.http import condition
+
+from . import feed_cache
+from .models import Group, Post, User
+
+
+def _viewer(request: HttpRequest) -> str:
+    """
+    Describes who the page is rendered for. The CSRF token is included
+    because the forms shown to users carry it, it is created here if the
+    request has none so that the page and the ETag use the same token.
+    """
+    if not request.user.is_authenticated:
+        return 'anonymous'
+    get_token(request)
+    return f'{request.user.pk}:{request.META["CSRF_COOKIE"]}'
+
+
+def _get_versions(request: HttpRequest,
+                  get_scopes: Callable[..., Optional[List[str]]],
+                  **kwargs) -> Optional[List[int]]:
+    """
+    Returns the versions of the page scopes, reading them once per request.
+    Returns None if the page does not exist.
+    """
+    if not hasattr(request, '_page_versions'):
+        scopes = get_scopes(request, **kwargs)
+        request._page_scopes = scopes
+        request._page_versions = (
+            None if scopes is None else feed_cache.get_feed_versions(*scopes)
+        )
+    return request._page_versions
+
+
+def page_condition(get_scopes: Callable[..., Optional[List[str]]]):
+    """
+    Makes the view answer 304 Not Modified to a request that carries
+    the current validators of the page.
+
+    The ETag is derived from the versions of the scopes of the page, the
+    page parameters and the viewer. The Last-Modified date is the time of
+    the last change of the scopes. Both are computed without rendering
+    the page.
+
+    Args:
+        get_scopes (callable): Takes the request and the view arguments and
+            returns the scopes of the page or None if there is no page.
+    """
+    def etag(request: HttpRequest, **kwargs) -> Optional[str]:
+        versions = _get_versions(request, get_scopes, **kwargs)
+        if versions is None:
+            return None
+        raw = '|'.join((
+            *request._page_scopes,
+            *map(str, versions),
+            feed_cache.get_page_key(request),
+            _viewer(request),
+        ))
+        return hashlib.md5(raw.encode()).hexdigest()
+
+    def last_modified(request: HttpRequest, **kwargs) -> Optional[datetime]:
+        versions = _get_versions(request, get_scopes, **kwargs)
+        if versions is None:
+            return None
+        return datetime.fromtimestamp(max(versions) / 10 ** 6, timezone.utc)
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
+
+
+def index_scopes(request: HttpRequest) -> List[str]:
+    return [feed_cache.index_scope()]
+
+
+def group_scopes(request: HttpRequest, slug: str) -> Optional[List[str]]:
+    group_id = Group.objects.cache().filter(slug=slug).values_list(
+        'id', flat=True).first()
+    if group_id is None:
+        return None
+    return [feed_cache.group_scope(group_id)]
+
+
+def profile_scopes(request: HttpRequest,
+                   username: str) -> Optional[List[str]]:
+    author_id = User.objects.filter(username=username).values_list(
+        'id', flat=True).first()
+    if author_id is None:
+        return None
+    return [
+        feed_cache.profile_scope(author_id),
+        feed_cache.follow_scope(request.user.id),
+    ]
+
+
+def post_scopes(request: HttpRequest, post_id: int) -> Optional[List[str]]:
+    author_id = Post.objects.filter(id=post_id).values_list(
+        'author_id', flat=True).first()
+    if author_id is None:
+        return None
+    return [
+        feed_cache.post_scope(post_id),
+        feed_cache.profile_scope(author_id),
+    ]
+
+
+def follow_scopes(request: HttpRequest) -> List[str]:
+    return [
+        feed_cache.index_scope(),
+        feed_cache.follow_scope(request.user.id),
+    ]
@@ -0,0 +1,101 @@
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from . import object_cache
+from .models import Comment, Follow, Group, Post, User, UserStats
+
+
+def _deltas(**deltas: int) -> dict:
+    """Turns counter deltas into update expressions that never go below 0."""
+    return {
+        field: Greatest(F(field) + delta, 0)
+        for field, delta in deltas.items()
+        if delta
+    }
+
+
+def change_counters(model: type, pk: int, **deltas: int) -> None:
+    """
+    Adds the deltas to the counter columns of the object with one UPDATE
+    and removes the object from the object cache.
+
+    Args:
+        model (type): Model that holds the counters.
+        pk (int): Pk of the object.
+        **deltas (int): Counter names and the values to be added.
+    """
+    expressions = _deltas(**deltas)
+    if pk is not None and expressions:
+        model.objects.filter(pk=pk).update(**expressions)
+        object_cache.forget_objects(model, pk)
+
+
+def change_user_stats(user_id: int, **deltas: int) -> None:
+    """
+    Adds the deltas to the counters of the user, creating the row of
+    counters if the user does not have one yet.
+
+    A row is only created for an increase: a decrease of a missing row
+    comes from the deletion of the user, whose row is already deleted by
+    the cascade, and a new row would point at the deleted user.
+
+    Args:
+        user_id (int): Pk of the user.
+        **deltas (int): Counter names and the values to be added.
+    """
+    expressions = _deltas(**deltas)
+    if user_id is None or not expressions:
+        return
+    if UserStats.objects.filter(user_id=user_id).update(**expressions):
+        return
+    if any(delta > 0 for delta in deltas.values()):
+        UserStats.objects.get_or_create(user_id=user_id)
+        UserStats.objects.filter(user_id=user_id).update(**expressions)
+
+
+def get_user_stats(user: User) -> UserStats:
+    """
+    Returns the counters of the user.
+
+    Uses the counters loaded with select_related('stats') if there are any.
+    """
+    try:
+        return user.stats
+    except UserStats.DoesNotExist:
+        stats, _ = UserStats.objects.get_or_create(user=user)
+        return stats
+
+
+def _count(model: type, field: str) -> Subquery:
+    """Builds a subquery counting the rows of the model per value of field."""
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(count=Count('pk'))
+            .values('count')
+        ),
+        0,
+    )
+
+
+@transaction.atomic
+def rebuild_counters() -> None:
+    """Recalculates every denormalized counter from the source tables."""
+    UserStats.objects.bulk_create(
+        [
+            UserStats(user_id=user_id)
+            for user_id in User.objects.filter(
+                stats__isnull=True
+            ).values_list('pk', flat=True).iterator()
+        ],
+    )
+    UserStats.objects.update(
+        posts_count=_count(Post, 'author'),
+        followers_count=_count(Follow, 'author'),
+        following_count=_count(Follow, 'user'),
+    )
+    Group.objects.update(posts_count=_count(Post, 'group'))
+    Post.objects.update(comments_count=_count(Comment, 'post'))
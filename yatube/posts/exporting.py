@@ -0,0 +1,249 @@
+import csv
+import json
+import os
+import zlib
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional
+
+from django.db.models import Q, QuerySet
+from django.utils.dateparse import parse_datetime
+
+from .models import Comment, Follow, Group, Post
+
+FORMATS = ('jsonl', 'csv')
+EXPORT_CHUNK_SIZE = 2000
+
+
+class ExportSpec(NamedTuple):
+    """
+    Describes how the objects of a model are exported.
+
+    Attributes:
+        model (type): The exported model.
+        columns (dict): Names of the columns and the lookups of their values.
+        ordering (tuple): Columns of the unique sort key of the rows, it is
+            also the watermark of incremental exports. It must be covered
+            by an index, every chunk is selected by a range on it.
+        filters (dict): Lookups of the optional filters by author and group.
+        date_column (str): Column filtered by the date range or None.
+    """
+
+    model: type
+    columns: Dict[str, str]
+    ordering: tuple
+    filters: Dict[str, str]
+    date_column: Optional[str]
+
+
+# The columns match the records of the import_content command, so an export
+# can be imported into another site.
+EXPORTS = {
+    'post': ExportSpec(
+        Post,
+        {
+            'id': 'id',
+            'text': 'text',
+            'author': 'author__username',
+            'group': 'group__slug',
+            'pub_date': 'pub_date',
+        },
+        ('pub_date', 'id'),
+        {'author': 'author__username', 'group': 'group__slug'},
+        'pub_date',
+    ),
+    'comment': ExportSpec(
+        Comment,
+        {
+            'id': 'id',
+            'post': 'post_id',
+            'author': 'author__username',
+            'text': 'text',
+            'created': 'created',
+        },
+        ('id',),
+        {'author': 'author__username', 'group': 'post__group__slug'},
+        'created',
+    ),
+    'follow': ExportSpec(
+        Follow,
+        {'id': 'id', 'user': 'user__username', 'author': 'author__username'},
+        ('id',),
+        {'author': 'author__username'},
+        None,
+    ),
+    'group': ExportSpec(
+        Group,
+        {
+            'id': 'id',
+            'title': 'title',
+            'slug': 'slug',
+            'description': 'description',
+        },
+        ('id',),
+        {},
+        None,
+    ),
+}
+
+
+def filter_rows(spec: ExportSpec, queryset: QuerySet,
+                author: Optional[str] = None, group: Optional[str] = None,
+                since: Optional[datetime] = None,
+                until: Optional[datetime] = None) -> QuerySet:
+    """
+    Applies the optional filters to the exported objects.
+
+    Raises:
+        ValueError: The model cannot be filtered so.
+    """
+    conditions = {'author': author, 'group': group}
+    for name, value in conditions.items():
+        if value is None:
+            continue
+        if name not in spec.filters:
+            raise ValueError(f'{spec.model.__name__} has no {name}')
+        queryset = queryset.filter(**{spec.filters[name]: value})
+    if since is not None or until is not None:
+        if spec.date_column is None:
+            raise ValueError(f'{spec.model.__name__} has no date')
+        if since is not None:
+            queryset = queryset.filter(**{f'{spec.date_column}__gte': since})
+        if until is not None:
+            queryset = queryset.filter(**{f'{spec.date_column}__lt': until})
+    return queryset
+
+
+def _after(spec: ExportSpec, key: List[Any]) -> Q:
+    """
+    Builds the condition selecting the rows that follow the key. The range
+    on the first column lets SQLite search the index instead of scanning.
+    """
+    lookups = [spec.columns[name] for name in spec.ordering]
+    condition = Q(**{f'{lookups[0]}__gt': key[0]})
+    equal = {}
+    for lookup, value in zip(lookups[:-1], key[:-1]):
+        equal[lookup] = value
+    if len(lookups) > 1:
+        condition |= Q(**equal, **{f'{lookups[-1]}__gt': key[-1]})
+        condition &= Q(**{f'{lookups[0]}__gte': key[0]})
+    return condition
+
+
+def iter_rows(spec: ExportSpec, queryset: QuerySet,
+              watermark: Optional[List[Any]] = None,
+              chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[dict]:
+    """
+    Yields the exported objects as dicts in the order of the sort key.
+
+    The rows are read in chunks, each selected by the key of the last row
+    of the previous chunk, so only one chunk is kept in memory and no
+    query holds the database for the whole export.
+
+    Args:
+        spec (ExportSpec): What to export.
+        queryset (QuerySet): Objects of the model to export.
+        watermark (list): Key of the last row of a previous export, only
+            the rows after it are exported.
+        chunk_size (int): Number of rows read by one query.
+    """
+    names = list(spec.columns)
+    key_indexes = [names.index(name) for name in spec.ordering]
+    rows = queryset.order_by(
+        *(spec.columns[name] for name in spec.ordering)
+    ).values_list(*spec.columns.values())
+    key = watermark
+    while True:
+        chunk = rows.filter(_after(spec, key)) if key else rows
+        chunk = list(chunk[:chunk_size])
+        for row in chunk:
+            yield dict(zip(names, row))
+        if len(chunk) < chunk_size:
+            return
+        key = [chunk[-1][index] for index in key_indexes]
+
+
+def get_watermark(spec: ExportSpec, row: dict) -> List[Any]:
+    """Returns the watermark of the row as JSON serializable values."""
+    return [
+        row[name].isoformat() if isinstance(row[name], datetime)
+        else row[name]
+        for name in spec.ordering
+    ]
+
+
+def parse_watermark(spec: ExportSpec, values: List[Any]) -> List[Any]:
+    """
+    Returns the key stored in the watermark.
+
+    Raises:
+        ValueError: The watermark does not fit the model.
+    """
+    if not isinstance(values, list) or len(values) != len(spec.ordering):
+        raise ValueError(f'Invalid watermark {values!r}')
+    return [
+        parse_datetime(value) if name == spec.date_column else value
+        for name, value in zip(spec.ordering, values)
+    ]
+
+
+def read_watermark(path: str) -> Optional[List[Any]]:
+    """Returns the watermark saved to the file or None if it is missing."""
+    try:
+        with open(path, encoding='utf-8') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+
+
+def write_watermark(path: str, values: List[Any]) -> None:
+    """Saves the watermark, replacing the file atomically."""
+    temporary_path = f'{path}.tmp'
+    with open(temporary_path, 'w', encoding='utf-8') as file:
+        json.dump(values, file)
+    os.replace(temporary_path, path)
+
+
+class _Line:
+    """A file-like object returning what the csv writer writes to it."""
+
+    def write(self, value: str) -> str:
+        return value
+
+
+def _serialize(value: Any) -> Any:
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def iter_lines(spec: ExportSpec, rows: Iterable[dict],
+               file_format: str) -> Iterator[str]:
+    """Yields the rows as JSON lines or as CSV lines after a header."""
+    if file_format == 'csv':
+        writer = csv.writer(_Line())
+        yield writer.writerow(spec.columns)
+        for row in rows:
+            yield writer.writerow(_serialize(value) for value in row.values())
+        return
+    for row in rows:
+        yield json.dumps(
+            {name: _serialize(value) for name, value in row.items()},
+            ensure_ascii=False,
+            separators=(',', ':'),
+        ) + '\n'
+
+
+def gzip_chunks(lines: Iterable[str],
+                chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+    """Compresses the lines into gzip data, yielding it in chunks."""
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    buffer = []
+    size = 0
+    for line in lines:
+        data = line.encode('utf-8')
+        buffer.append(data)
+        size += len(data)
+        if size >= chunk_size:
+            compressed = compressor.compress(b''.join(buffer))
+            buffer, size = [], 0
+            if compressed:
+                yield compressed
+    yield compressor.compress(b''.join(buffer)) + compressor.flush()
@@ -0,0 +1,147 @@
+import hashlib
+import time
+from functools import partial
+from typing import Iterable, List
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpRequest
+
+from core import routers
+
+from .paginator import get_page_position
+
+FEED_VERSION_KEY = 'feed-version:{scope}'
+FEED_FRAGMENT_KEY = 'feed-fragment:{name}:{digest}'
+# Changes of users and groups affect every feed, the version of this scope
+# is a part of the version of every feed.
+GLOBAL_SCOPE = 'all'
+PAGE_PARAMETERS = ('page', 'after', 'before')
+
+
+def index_scope() -> str:
+    return 'index'
+
+
+def group_scope(group_id: int) -> str:
+    return f'group:{group_id}'
+
+
+def profile_scope(author_id: int) -> str:
+    return f'profile:{author_id}'
+
+
+def follow_scope(user_id: int) -> str:
+    return f'follow:{user_id}'
+
+
+def post_scope(post_id: int) -> str:
+    return f'post:{post_id}'
+
+
+def _now() -> int:
+    """Returns the current time in microseconds."""
+    return time.time_ns() // 1000
+
+
+def get_feed_versions(*scopes: str) -> List[int]:
+    """
+    Returns the versions of the scopes, the global scope going first.
+
+    A version is the time of the last change in microseconds. A version
+    missing from the cache is started from the current time, so a culled
+    version never brings back the fragments cached under an older one.
+    """
+    keys = [
+        FEED_VERSION_KEY.format(scope=scope)
+        for scope in (GLOBAL_SCOPE, *scopes)
+    ]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, _now(), None)
+            versions[key] = cache.get(key)
+    # A page of a feed changed after the replica was copied is read from
+    # the default database, otherwise the outdated page would be cached
+    # under the new version.
+    routers.require_changes_since(max(versions.values()) / 1_000_000)
+    return [versions[key] for key in keys]
+
+
+def get_feed_version(*scopes: str) -> str:
+    """
+    Returns a token that names the scopes and changes whenever one of them
+    changes.
+    """
+    versions = get_feed_versions(*scopes)
+    return '|'.join(
+        f'{scope}@{version}'
+        for scope, version in zip((GLOBAL_SCOPE, *scopes), versions)
+    )
+
+
+def _bump(scopes: Iterable[str]) -> None:
+    keys = [FEED_VERSION_KEY.format(scope=scope) for scope in set(scopes)]
+    versions = cache.get_many(keys)
+    now = _now()
+    cache.set_many(
+        {key: max(now, versions.get(key, 0) + 1) for key in keys},
+        None,
+    )
+
+
+def bump_feed_versions(*scopes: str) -> None:
+    """
+    Marks the scopes as changed, outdating their cached fragments and
+    the validators of their pages.
+
+    Inside a transaction the scopes are bumped again on commit: a page read
+    before the commit would be cached under the new version without
+    the change.
+    """
+    _bump(scopes)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(partial(_bump, scopes))
+
+
+def get_page_key(request: HttpRequest) -> str:
+    """Returns the part of the query string that selects the feed page."""
+    return '&'.join(
+        f'{name}={request.GET[name]}'
+        for name in PAGE_PARAMETERS
+        if name in request.GET
+    )
+
+
+def get_feed_cache_context(page, *scopes: str) -> dict:
+    """
+    Returns the context variables the templates use as the timeout and
+    the key of the cached feed fragment.
+
+    Args:
+        page: The Page or the KeysetPage of the feed.
+        *scopes (str): Scopes whose changes outdate the fragment.
+    """
+    return {
+        'feed_cache_timeout': settings.FEED_CACHE_TIMEOUT,
+        'feed_version': get_feed_version(*scopes),
+        'feed_page': get_page_position(page),
+    }
+
+
+def get_fragment_key(name: str, position: str, *scopes: str) -> str:
+    """
+    Returns the cache key of the rendered feed page for the current
+    versions of the scopes.
+
+    Args:
+        name (str): Name of the feed.
+        position (str): Position of the page, see get_page_position().
+        *scopes (str): Scopes whose changes outdate the page.
+    """
+    raw = f'{get_feed_version(*scopes)}#{position}'
+    return FEED_FRAGMENT_KEY.format(
+        name=name,
+        digest=hashlib.md5(raw.encode()).hexdigest(),
+    )
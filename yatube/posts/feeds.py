@@ -0,0 +1,29 @@
+from django.db.models import QuerySet
+
+from .models import Group, Post, User
+from .timelines import get_follow_feed
+
+
+def get_index_posts() -> QuerySet:
+    """Returns the posts of the main page."""
+    return Post.objects.select_related('author', 'group')
+
+
+def get_group_posts(group: Group) -> QuerySet:
+    """Returns the posts of the community."""
+    return group.posts.select_related('author', 'group')
+
+
+def get_profile_posts(author: User) -> QuerySet:
+    """Returns the posts of the author."""
+    return author.posts.select_related('author', 'group')
+
+
+def get_follow_posts(user: User) -> QuerySet:
+    """Returns the posts of the authors the user is subscribed to."""
+    return get_follow_feed(user)
+
+
+def get_post_comments(post: Post) -> QuerySet:
+    """Returns the comments of the post."""
+    return post.comments.select_related('author')
@@ -14,7 +14,7 @@ class PostForm(forms.ModelForm):
     """
 
     group = forms.ModelChoiceField(
-        queryset=Group.objects.all(),
+        queryset=Group.objects.cache(),
         required=False,
         label='Группа',
         help_text='Группа, к которой будет относиться пост',
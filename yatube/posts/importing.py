@@ -0,0 +1,365 @@
+import csv
+import json
+from collections import OrderedDict
+from datetime import datetime
+from typing import (Callable, Hashable, Iterable, Iterator, List, Optional,
+                    Tuple)
+
+from django.db import transaction
+from django.db.models import Model, QuerySet
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import feed_cache
+from .counters import rebuild_counters
+from .models import Comment, Follow, Group, ImportCheckpoint, Post, User
+from .timelines import rebuild_timeline
+
+FORMATS = ('jsonl', 'csv')
+# Keys are looked up in chunks to stay below the limit of SQLite on the
+# number of query parameters.
+QUERY_CHUNK_SIZE = 500
+# Number of the keys an IdMap remembers, the least recently used ones are
+# forgotten and looked up again when they come back.
+ID_MAP_SIZE = 100000
+
+
+class RecordError(ValueError):
+    """A record that cannot be imported."""
+
+
+def read_records(path: str, file_format: str,
+                 offset: int = 0) -> Iterator[Tuple[dict, int]]:
+    """
+    Reads the records of the file one by one.
+
+    Yields every record together with the offset in bytes the reading
+    should be resumed from after it, the reading starts from the offset.
+    Only one record is kept in memory, whatever the size of the file.
+
+    Args:
+        path (str): Path of a JSONL file or a CSV file with a header.
+        file_format (str): 'jsonl' or 'csv'.
+        offset (int): Offset of the first record to read.
+    """
+    with open(path, 'rb') as file:
+        header = None
+        if file_format == 'csv':
+            first_line = file.readline()
+            header = next(csv.reader([first_line.decode('utf-8-sig')]))
+            offset = max(offset, len(first_line))
+        file.seek(offset)
+
+        position = offset
+
+        def lines() -> Iterator[str]:
+            nonlocal position
+            for line in file:
+                position += len(line)
+                yield line.decode('utf-8')
+
+        if file_format == 'csv':
+            for row in csv.DictReader(lines(), fieldnames=header):
+                yield row, position
+            return
+
+        for line in lines():
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            if not isinstance(record, dict):
+                record = {'_error': f'not a JSON object: {line[:80]!r}'}
+            yield record, position
+
+
+class IdMap:
+    """
+    Maps natural keys such as usernames to ids. Unknown keys are looked up
+    with one query per batch of records and remembered, at most max_size
+    of them, so the memory does not grow with the file.
+
+    Args:
+        queryset (QuerySet): Objects to look the keys up in.
+        key_field (str): Name of the field holding the key.
+        max_size (int): Number of the remembered keys, ID_MAP_SIZE by
+            default. The keys of the last loaded batch are always kept.
+    """
+
+    def __init__(self, queryset: QuerySet, key_field: str,
+                 max_size: int = ID_MAP_SIZE) -> None:
+        self.queryset = queryset
+        self.key_field = key_field
+        self.max_size = max_size
+        self.ids: 'OrderedDict[Hashable, Optional[int]]' = OrderedDict()
+
+    def load(self, keys: Iterable[Hashable]) -> None:
+        """
+        Looks up the keys that have not been seen yet and forgets the least
+        recently used ones.
+        """
+        keys = {key for key in keys if key}
+        missing = []
+        for key in keys:
+            if key in self.ids:
+                self.ids.move_to_end(key)
+            else:
+                missing.append(key)
+        self.ids.update(dict.fromkeys(missing))
+        for start in range(0, len(missing), QUERY_CHUNK_SIZE):
+            self.ids.update(
+                self.queryset.filter(**{
+                    f'{self.key_field}__in':
+                        missing[start:start + QUERY_CHUNK_SIZE],
+                }).values_list(self.key_field, 'id')
+            )
+        for _ in range(len(self.ids) - max(self.max_size, len(keys))):
+            self.ids.popitem(last=False)
+
+    def __getitem__(self, key: Hashable) -> int:
+        value = self.ids.get(key)
+        if value is None:
+            raise RecordError(f'{self.key_field} {key!r} not found')
+        return value
+
+
+class DateKeepingQuerySet(QuerySet):
+    """
+    A queryset whose bulk_create() saves the dates of auto_now_add fields
+    as they are set on the objects, Django replaces them with the current
+    time otherwise. The inserts are raw, as those of loaddata, so the
+    fields are not changed and other threads keep their dates.
+    """
+
+    def _insert(self, *args, **kwargs):
+        kwargs['raw'] = True
+        return super()._insert(*args, **kwargs)
+
+
+def bulk_create_keeping_dates(model: type, objects: List[Model],
+                              **kwargs) -> List[Model]:
+    """Inserts the objects with bulk_create, keeping their dates."""
+    return DateKeepingQuerySet(model).bulk_create(objects, **kwargs)
+
+
+def parse_date(value: Optional[str]) -> datetime:
+    """Returns the date of the record, the current time if it is empty."""
+    if not value:
+        return timezone.now()
+    date = parse_datetime(str(value))
+    if date is None:
+        raise RecordError(f'invalid date {value!r}')
+    if timezone.is_naive(date):
+        date = timezone.make_aware(date)
+    return date
+
+
+def require(record: dict, name: str) -> str:
+    """Returns the non-empty value of the field of the record."""
+    value = record.get(name)
+    if value is None or value == '':
+        raise RecordError(f'field {name!r} is required')
+    return str(value)
+
+
+class Importer:
+    """
+    Creates the objects of one model from records in batches.
+
+    The authors and groups are referenced by usernames and slugs, posts by
+    ids. Denormalized counters and follow feeds are not updated by
+    bulk_create, they are rebuilt by finish(). The users whose feeds have
+    changed are found by a query over the objects created by the import,
+    nothing is collected while the records are read.
+    """
+
+    model: type = Model
+    user_fields: Tuple[str, ...] = ()
+    # Skips the rows violating unique constraints instead of failing.
+    ignore_conflicts = False
+
+    def __init__(self) -> None:
+        self.users = IdMap(User.objects.all(), 'username')
+
+    def load(self, records: List[dict]) -> None:
+        """Looks up the references of the batch of records."""
+        self.users.load(
+            str(record[name])
+            for record in records
+            for name in self.user_fields
+            if record.get(name) not in (None, '')
+        )
+
+    def build(self, record: dict) -> Model:
+        """Returns the unsaved object of the record or raises RecordError."""
+        raise NotImplementedError
+
+    def save(self, objects: List[Model]) -> int:
+        """Inserts the objects and returns their number."""
+        bulk_create_keeping_dates(
+            self.model, objects, ignore_conflicts=self.ignore_conflicts)
+        return len(objects)
+
+    def import_batch(self, records: List[dict],
+                     on_error: Callable[[int, str], None]) -> int:
+        """
+        Creates the objects of the records in one transaction and returns
+        their number. Invalid records are skipped, their indexes in the batch
+        and the errors are passed to on_error.
+        """
+        self.load(records)
+        objects = []
+        for index, record in enumerate(records):
+            try:
+                if '_error' in record:
+                    raise RecordError(record['_error'])
+                objects.append(self.build(record))
+            except RecordError as error:
+                on_error(index, str(error))
+        with transaction.atomic():
+            return self.save(objects)
+
+    def get_last_id(self) -> int:
+        """Returns the greatest id of the model, 0 if there are no objects."""
+        return self.model._default_manager.order_by('-pk').values_list(
+            'pk', flat=True).first() or 0
+
+    def finish(self, start_id: int) -> None:
+        """
+        Updates the data derived from the imported objects.
+
+        Args:
+            start_id (int): The greatest id of the model before the import,
+                see get_last_id().
+        """
+        rebuild_counters()
+        for user_id in self.get_timeline_user_ids(start_id):
+            rebuild_timeline(user_id)
+        feed_cache.bump_feed_versions(feed_cache.GLOBAL_SCOPE)
+
+    def get_timeline_user_ids(self, start_id: int) -> Iterable[int]:
+        """
+        Returns the users whose follow feeds have changed by the objects
+        created after start_id. The ids are read from the database as they
+        are iterated.
+        """
+        return ()
+
+
+class PostImporter(Importer):
+    """Imports posts: text, author, group, pub_date."""
+
+    model = Post
+    user_fields = ('author',)
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.groups = IdMap(Group.objects.all(), 'slug')
+
+    def load(self, records: List[dict]) -> None:
+        super().load(records)
+        self.groups.load(
+            str(record['group'])
+            for record in records
+            if record.get('group') not in (None, '')
+        )
+
+    def build(self, record: dict) -> Post:
+        group = record.get('group')
+        return Post(
+            text=require(record, 'text'),
+            author_id=self.users[require(record, 'author')],
+            group_id=self.groups[str(group)] if group else None,
+            pub_date=parse_date(record.get('pub_date')),
+        )
+
+    def get_timeline_user_ids(self, start_id: int) -> Iterable[int]:
+        return Follow.objects.filter(
+            author_id__in=Post.objects.filter(
+                pk__gt=start_id).values('author_id'),
+        ).order_by('user_id').values_list(
+            'user_id', flat=True).distinct().iterator()
+
+
+class CommentImporter(Importer):
+    """Imports comments: post id, author, text, created."""
+
+    model = Comment
+    user_fields = ('author',)
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.posts = IdMap(Post.objects.all(), 'id')
+
+    def load(self, records: List[dict]) -> None:
+        super().load(records)
+        post_ids = set()
+        for record in records:
+            try:
+                post_ids.add(int(record.get('post')))
+            except (TypeError, ValueError):
+                pass
+        # Only the posts of the batch are remembered, there may be many.
+        self.posts.ids.clear()
+        self.posts.load(post_ids)
+
+    def build(self, record: dict) -> Comment:
+        try:
+            post_id = int(require(record, 'post'))
+        except ValueError:
+            raise RecordError(f'invalid post id {record["post"]!r}')
+        return Comment(
+            post_id=self.posts[post_id],
+            author_id=self.users[require(record, 'author')],
+            text=require(record, 'text'),
+            created=parse_date(record.get('created')),
+        )
+
+
+class FollowImporter(Importer):
+    """Imports subscriptions: user, author."""
+
+    model = Follow
+    user_fields = ('user', 'author')
+    ignore_conflicts = True
+
+    def build(self, record: dict) -> Follow:
+        user_id = self.users[require(record, 'user')]
+        author_id = self.users[require(record, 'author')]
+        if user_id == author_id:
+            raise RecordError('a user cannot follow themselves')
+        return Follow(user_id=user_id, author_id=author_id)
+
+    def get_timeline_user_ids(self, start_id: int) -> Iterable[int]:
+        return Follow.objects.filter(pk__gt=start_id).order_by(
+            'user_id').values_list('user_id', flat=True).distinct().iterator()
+
+
+IMPORTERS = {
+    'post': PostImporter,
+    'comment': CommentImporter,
+    'follow': FollowImporter,
+}
+
+
+def read_checkpoint(name: str) -> ImportCheckpoint:
+    """
+    Returns the position the import should be resumed from, the start of
+    the file if there is no checkpoint.
+    """
+    checkpoint = ImportCheckpoint.objects.filter(name=name).first()
+    return checkpoint or ImportCheckpoint(name=name)
+
+
+def write_checkpoint(checkpoint: ImportCheckpoint, offset: int,
+                     records: int) -> None:
+    """
+    Saves the position after the batch. It is called in the transaction of
+    the batch, so a failure never leaves the position of uncommitted
+    objects or the objects without their position.
+    """
+    checkpoint.offset = offset
+    checkpoint.records = records
+    checkpoint.save()
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Follow
+from posts.timelines import rebuild_timeline
+
+
+class Command(BaseCommand):
+    """Builds the materialized follow feeds from the existing posts."""
+
+    help = 'Заполняет ленты подписок пользователей существующими постами'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            dest='usernames',
+            action='append',
+            help='Перестроить ленту только этого пользователя',
+        )
+
+    def handle(self, *args, **options):
+        follows = Follow.objects.all()
+        if options['usernames']:
+            follows = follows.filter(user__username__in=options['usernames'])
+        user_ids = follows.order_by('user_id').values_list(
+            'user_id', flat=True).distinct()
+
+        rebuilt = 0
+        for user_id in user_ids.iterator():
+            rebuild_timeline(user_id)
+            rebuilt += 1
+        self.stdout.write(
+            self.style.SUCCESS(f'Перестроено лент: {rebuilt}')
+        )
@@ -0,0 +1,151 @@
+import itertools
+import random
+import statistics
+import time
+from typing import List
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from posts import feed_cache
+from posts.counters import rebuild_counters
+from posts.models import Post, User
+from posts.search import (SearchPaginator, filter_matching,
+                          is_search_index_supported)
+
+BENCHMARK_USERNAME = 'search-benchmark'
+WORDS = (
+    'кот', 'собака', 'город', 'река', 'книга', 'музыка', 'погода', 'поезд',
+    'работа', 'отпуск', 'море', 'лес', 'программа', 'ошибка', 'сервер',
+    'база', 'запрос', 'индекс', 'кофе', 'утро', 'вечер', 'друг', 'фильм',
+    'дорога', 'дом', 'сад', 'зима', 'лето', 'весна', 'осень',
+)
+SYLLABLES = (
+    'ба', 'ве', 'ги', 'до', 'жу', 'за', 'ки', 'ло', 'му', 'на', 'по', 'ре',
+    'си', 'то', 'фу', 'ха', 'це', 'чи', 'ша', 'ю', 'я', 'ор', 'ан', 'ел',
+)
+# The words of the texts follow Zipf's law, the query words are placed
+# behind the most frequent ones, so each of them is used in a few
+# per cent of the posts as a real word would be.
+VOCABULARY_SIZE = 20000
+QUERY_WORDS_RANK = 100
+DEFAULT_QUERIES = ('кот', 'сервер индекс', 'зима море кофе')
+BATCH_SIZE = 10000
+PAGE_SIZE = 10
+
+
+class Command(BaseCommand):
+    """
+    Compares the full-text search with the LIKE search the admin used
+    before, timing the first page of results and the number of matches.
+    """
+
+    help = ('Сравнивает скорость полнотекстового поиска и поиска через LIKE '
+            'по тексту записей')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--posts',
+            type=int,
+            default=0,
+            help='Дополнить базу сгенерированными записями до этого числа',
+        )
+        parser.add_argument(
+            '--query',
+            dest='queries',
+            action='append',
+            help='Поисковый запрос, можно указать несколько раз',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Количество замеров каждого запроса',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+
+    def build_vocabulary(self, rng: random.Random) -> List[str]:
+        """Returns the words of the generated texts, frequent ones first."""
+        words = [
+            ''.join(syllables)
+            for syllables in itertools.product(SYLLABLES, repeat=3)
+        ]
+        rng.shuffle(words)
+        words = words[:VOCABULARY_SIZE - len(WORDS)]
+        return (
+            words[:QUERY_WORDS_RANK] + list(WORDS) + words[QUERY_WORDS_RANK:]
+        )
+
+    def generate_posts(self, total: int, seed: int) -> None:
+        """Adds posts of random words until the database has total posts."""
+        missing = total - Post.objects.count()
+        if missing <= 0:
+            return
+        author, _ = User.objects.get_or_create(username=BENCHMARK_USERNAME)
+        rng = random.Random(seed)
+        vocabulary = self.build_vocabulary(rng)
+        cum_weights = list(itertools.accumulate(
+            1 / rank for rank in range(1, len(vocabulary) + 1)))
+        started = time.perf_counter()
+        while missing > 0:
+            size = min(missing, BATCH_SIZE)
+            with transaction.atomic():
+                Post.objects.bulk_create(
+                    Post(
+                        text=' '.join(rng.choices(
+                            vocabulary,
+                            cum_weights=cum_weights,
+                            k=rng.randint(5, 40),
+                        )),
+                        author=author,
+                    )
+                    for _ in range(size)
+                )
+            missing -= size
+        rebuild_counters()
+        feed_cache.bump_feed_versions(
+            feed_cache.index_scope(),
+            feed_cache.profile_scope(author.id),
+        )
+        self.stdout.write(
+            f'Записи созданы за {time.perf_counter() - started:.1f} с')
+
+    def measure(self, function, repeat: int) -> float:
+        """Returns the median time of the function calls in milliseconds."""
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            function()
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
+
+    def handle(self, *args, **options):
+        if not is_search_index_supported():
+            raise CommandError(
+                'Полнотекстовый индекс доступен только в SQLite')
+        self.generate_posts(options['posts'], options['seed'])
+
+        posts = Post.objects.all()
+        self.stdout.write(f'Записей в базе: {posts.count()}')
+        self.stdout.write(
+            f'{"запрос":<24}{"метод":<8}{"страница, мс":>14}'
+            f'{"количество, мс":>16}{"найдено":>10}'
+        )
+        for query in options['queries'] or DEFAULT_QUERIES:
+            like = posts
+            for word in query.split():
+                like = like.filter(text__icontains=word)
+            fts = filter_matching(posts, query)
+            methods = (
+                ('fts', lambda: SearchPaginator(query, PAGE_SIZE).page_after(),
+                 fts),
+                ('like', lambda: list(like[:PAGE_SIZE]), like),
+            )
+            for name, first_page, matches in methods:
+                page_time = self.measure(first_page, options['repeat'])
+                count_time = self.measure(matches.count, options['repeat'])
+                self.stdout.write(
+                    f'{query:<24}{name:<8}{page_time:>14.1f}'
+                    f'{count_time:>16.1f}{matches.count():>10}'
+                )
+        self.stdout.write(self.style.SUCCESS('Замеры завершены'))
@@ -0,0 +1,133 @@
+import contextlib
+import os
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from posts.exporting import (EXPORT_CHUNK_SIZE, EXPORTS, FORMATS,
+                             filter_rows, get_watermark, gzip_chunks,
+                             iter_lines, iter_rows, parse_watermark,
+                             read_watermark, write_watermark)
+
+
+def parse_moment(value: str) -> datetime:
+    """Parses a date or a date with time given in the arguments."""
+    moment = parse_datetime(value)
+    if moment is None:
+        date = parse_date(value)
+        if date is None:
+            raise CommandError(f'Неверная дата {value!r}')
+        moment = datetime.combine(date, datetime.min.time())
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+class Command(BaseCommand):
+    """
+    Exports posts, comments, subscriptions or groups to a gzipped JSONL or
+    CSV file.
+
+    The rows are read in chunks in the order of their sort key and written
+    as they come, so the memory used does not depend on the number of rows.
+    With --watermark the key of the last exported row is saved to the file
+    and the next run exports only the rows after it. Posts are ordered by
+    pub_date and id, the other models by id, so a post created later with
+    an older pub_date, for example by import_content, is not exported
+    incrementally.
+    """
+
+    help = ('Экспортирует записи, комментарии, подписки или группы в файл '
+            'JSONL или CSV, сжатый gzip')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к файлу экспорта')
+        parser.add_argument(
+            '--model',
+            required=True,
+            choices=sorted(EXPORTS),
+            help='Что экспортировать',
+        )
+        parser.add_argument(
+            '--format',
+            choices=FORMATS,
+            help='Формат файла, по умолчанию определяется по расширению',
+        )
+        parser.add_argument('--author', help='Только объекты автора')
+        parser.add_argument('--group', help='Только объекты группы')
+        parser.add_argument(
+            '--since', help='Только созданные с этой даты включительно')
+        parser.add_argument(
+            '--until', help='Только созданные до этой даты')
+        parser.add_argument(
+            '--watermark',
+            help=('Файл с ключом последней выгруженной строки: выгружаются '
+                  'только строки после него, ключ обновляется после '
+                  'успешного экспорта. Записи, добавленные позже с более '
+                  'ранней датой публикации, пропускаются'),
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=EXPORT_CHUNK_SIZE,
+            help='Количество строк, читаемых одним запросом',
+        )
+
+    def handle(self, *args, **options):
+        spec = EXPORTS[options['model']]
+        path = options['path']
+        file_format = options['format'] or (
+            'csv' if '.csv' in path.lower() else 'jsonl')
+        since, until = (
+            parse_moment(options[name]) if options[name] else None
+            for name in ('since', 'until')
+        )
+        try:
+            queryset = filter_rows(
+                spec, spec.model.objects.all(), options['author'],
+                options['group'], since, until,
+            )
+            watermark = None
+            if options['watermark']:
+                saved = read_watermark(options['watermark'])
+                if saved is not None:
+                    watermark = parse_watermark(spec, saved)
+        except ValueError as error:
+            raise CommandError(error)
+
+        started = time.perf_counter()
+        exported = 0
+        last_row = None
+
+        def rows():
+            nonlocal exported, last_row
+            for row in iter_rows(spec, queryset, watermark,
+                                 options['chunk_size']):
+                exported += 1
+                last_row = row
+                yield row
+
+        # The file appears under its name only when the export is complete.
+        temporary_path = f'{path}.tmp'
+        try:
+            with open(temporary_path, 'wb') as file:
+                for data in gzip_chunks(iter_lines(spec, rows(), file_format)):
+                    file.write(data)
+        except BaseException:
+            # The file may not have been created, the original error is
+            # raised either way.
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(temporary_path)
+            raise
+        os.replace(temporary_path, path)
+
+        if options['watermark'] and last_row is not None:
+            write_watermark(options['watermark'],
+                            get_watermark(spec, last_row))
+        self.stdout.write(self.style.SUCCESS(
+            f'Выгружено {exported} строк за '
+            f'{time.perf_counter() - started:.1f} с'
+        ))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts.thumbnails import (POST_THUMBNAIL_GEOMETRY, POST_THUMBNAIL_OPTIONS,
+                              generate_thumbnails, get_ready_thumbnail)
+
+
+class Command(BaseCommand):
+    """Creates the missing thumbnails of the images of existing posts."""
+
+    help = 'Создаёт недостающие миниатюры картинок постов'
+
+    def handle(self, *args, **options):
+        image_names = Post.objects.exclude(image='').order_by(
+            'id').values_list('image', flat=True)
+
+        created = 0
+        for image_name in image_names.iterator():
+            if get_ready_thumbnail(
+                image_name,
+                POST_THUMBNAIL_GEOMETRY,
+                **POST_THUMBNAIL_OPTIONS,
+            ):
+                continue
+            generate_thumbnails(image_name)
+            created += 1
+        self.stdout.write(
+            self.style.SUCCESS(f'Обработано картинок: {created}')
+        )
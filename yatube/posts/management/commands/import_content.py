@@ -0,0 +1,123 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from posts.importing import (FORMATS, IMPORTERS, read_checkpoint,
+                             read_records, write_checkpoint)
+
+# Seconds between the progress reports.
+REPORT_INTERVAL = 5
+
+
+class Command(BaseCommand):
+    """
+    Imports posts, comments or subscriptions from a JSONL or CSV file.
+
+    The file is read record by record and the objects are created with
+    bulk_create, one transaction per batch. The position in the file is
+    saved to the database in the transaction of every batch, so a failed
+    import is resumed from the last committed batch by running the command
+    again. The checkpoint also keeps the greatest id of the model before
+    the import, the feeds changed by the objects above it are rebuilt at
+    the end.
+    """
+
+    help = ('Импортирует записи, комментарии или подписки из файла JSONL '
+            'или CSV')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к файлу')
+        parser.add_argument(
+            '--model',
+            required=True,
+            choices=sorted(IMPORTERS),
+            help='Что импортировать',
+        )
+        parser.add_argument(
+            '--format',
+            choices=FORMATS,
+            help='Формат файла, по умолчанию определяется по расширению',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество записей в одной транзакции',
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help='Имя позиции импорта, по умолчанию абсолютный путь к файлу',
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Начать импорт с начала файла, не учитывая позицию',
+        )
+
+    def report(self, records: int, imported: int, skipped: int,
+               started: float) -> None:
+        """Prints the progress and the throughput of the import."""
+        elapsed = time.perf_counter() - started
+        rate = imported / elapsed if elapsed else 0
+        self.stdout.write(
+            f'Обработано {records}, создано {imported}, пропущено {skipped}, '
+            f'{rate:.0f} объектов/с'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f'Файл {path} не найден')
+        file_format = options['format'] or (
+            'csv' if path.lower().endswith('.csv') else 'jsonl')
+        name = options['checkpoint'] or os.path.abspath(path)
+        checkpoint = read_checkpoint(name)
+        if options['restart'] and checkpoint.pk:
+            checkpoint.delete()
+            checkpoint = read_checkpoint(name)
+        if checkpoint.offset:
+            self.stdout.write(
+                f'Продолжение импорта после записи {checkpoint.records}')
+
+        importer = IMPORTERS[options['model']]()
+        if not checkpoint.pk:
+            checkpoint.start_id = importer.get_last_id()
+        records = checkpoint.records
+        imported = skipped = 0
+        started = reported = time.perf_counter()
+
+        def on_error(index: int, error: str) -> None:
+            nonlocal skipped
+            skipped += 1
+            self.stderr.write(f'Запись {records + index + 1}: {error}')
+
+        def commit_batch(batch: list, offset: int) -> None:
+            nonlocal records, imported
+            with transaction.atomic():
+                imported += importer.import_batch(batch, on_error)
+                records += len(batch)
+                write_checkpoint(checkpoint, offset, records)
+
+        batch = []
+        offset = checkpoint.offset
+        for record, offset in read_records(path, file_format, offset):
+            batch.append(record)
+            if len(batch) < options['batch_size']:
+                continue
+            commit_batch(batch, offset)
+            batch = []
+            if time.perf_counter() - reported >= REPORT_INTERVAL:
+                self.report(records, imported, skipped, started)
+                reported = time.perf_counter()
+        if batch:
+            commit_batch(batch, offset)
+
+        self.report(records, imported, skipped, started)
+        self.stdout.write('Пересчёт счётчиков и лент подписок')
+        importer.finish(checkpoint.start_id)
+        if checkpoint.pk:
+            checkpoint.delete()
+        self.stdout.write(self.style.SUCCESS(
+            f'Импорт завершён за {time.perf_counter() - started:.1f} с'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.search import is_search_index_supported, rebuild_search_index
+
+
+class Command(BaseCommand):
+    """Rebuilds the full-text index of the posts."""
+
+    help = ('Перестраивает полнотекстовый индекс записей и восстанавливает '
+            'триггеры, которые его обновляют')
+
+    def handle(self, *args, **options):
+        if not is_search_index_supported():
+            raise CommandError(
+                'Полнотекстовый индекс доступен только в SQLite')
+        rebuild_search_index()
+        self.stdout.write(self.style.SUCCESS('Индекс записей перестроен'))
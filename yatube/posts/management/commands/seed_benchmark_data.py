@@ -0,0 +1,276 @@
+import io
+import itertools
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, Iterator, List, Sequence
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max, Min
+from faker import Faker
+from PIL import Image
+
+from posts import feed_cache
+from posts.counters import rebuild_counters
+from posts.importing import bulk_create_keeping_dates
+from posts.models import Comment, Follow, Group, Post, User
+from posts.timelines import rebuild_timeline
+
+# Password of every generated user, so that load tests can log in as them.
+BENCHMARK_PASSWORD = 'benchmark'
+# The dates are counted back from a fixed day, so the data does not depend
+# on when it is generated.
+LAST_DATE = datetime(2024, 1, 1, tzinfo=timezone.utc)
+# Texts are joined from a pool of sentences made by Faker, generating every
+# text with Faker would take most of the time.
+SENTENCE_POOL_SIZE = 5000
+IMAGE_SIZES = ((640, 480), (800, 600), (1024, 768), (480, 640))
+
+
+def power_law_weights(size: int, exponent: float) -> List[float]:
+    """
+    Returns the cumulative weights of the ranks 1..size following
+    the power law, rank 1 is the most frequent.
+    """
+    return list(itertools.accumulate(
+        1 / rank ** exponent for rank in range(1, size + 1)))
+
+
+def chunked(items: Iterable, size: int) -> Iterator[list]:
+    """Splits the items into lists of the size."""
+    iterator = iter(items)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class Command(BaseCommand):
+    """
+    Fills the database with generated users, groups, posts, comments and
+    subscriptions for benchmarks.
+
+    The number of posts of the authors and of the followers of the authors
+    follow the power law, as do the comments of the posts, so there are
+    a few prolific and popular users and a long tail. The same seed and
+    Faker version produce the same data. Objects are inserted with
+    bulk_create in batches, the counters and the follow feeds are rebuilt
+    once at the end.
+    """
+
+    help = ('Заполняет базу сгенерированными пользователями, группами, '
+            'записями, комментариями и подписками для замеров')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=100000)
+        parser.add_argument('--comments', type=int, default=200000)
+        parser.add_argument(
+            '--follows',
+            type=int,
+            default=20,
+            help='Среднее количество подписок пользователя',
+        )
+        parser.add_argument(
+            '--images',
+            type=int,
+            default=0,
+            help='Количество записей с картинками, файлы создаются в MEDIA',
+        )
+        parser.add_argument(
+            '--exponent',
+            type=float,
+            default=1.1,
+            help='Показатель степенного распределения авторов и подписчиков',
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=3 * 365,
+            help='За сколько дней до 2024-01-01 распределены даты',
+        )
+        parser.add_argument('--prefix', default='bench')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def report(self, name: str, count: int, started: float) -> None:
+        """Prints the number of created objects and the rate."""
+        elapsed = time.perf_counter() - started
+        rate = count / elapsed if elapsed else 0
+        self.stdout.write(
+            f'{name}: {count} за {elapsed:.1f} с, {rate:.0f} объектов/с')
+
+    def insert(self, model: type, objects: Iterable, batch_size: int,
+               **kwargs) -> range:
+        """
+        Inserts the objects in batches and returns the range of their ids.
+
+        Raises:
+            CommandError: The ids are not consecutive, someone else has
+                inserted rows at the same time.
+        """
+        before = model.objects.aggregate(last=Max('id'))['last'] or 0
+        count = 0
+        for chunk in chunked(objects, batch_size):
+            with transaction.atomic():
+                bulk_create_keeping_dates(model, chunk, **kwargs)
+            count += len(chunk)
+        ids = model.objects.filter(id__gt=before).aggregate(
+            first=Min('id'), last=Max('id'))
+        if count and ids['last'] - ids['first'] + 1 != count:
+            raise CommandError(
+                f'{model.__name__}: идентификаторы идут не подряд')
+        return range(ids['first'] or 1, (ids['last'] or 0) + 1)
+
+    def random_dates(self, rng: random.Random, days: int) -> Iterator:
+        """Yields random dates within the days before LAST_DATE."""
+        seconds = days * 24 * 60 * 60
+        while True:
+            yield LAST_DATE - timedelta(seconds=rng.randrange(seconds))
+
+    def create_images(self, rng: random.Random, count: int,
+                      prefix: str) -> List[str]:
+        """Saves the image files and returns their names in the storage."""
+        names = []
+        for index in range(count):
+            image = Image.new(
+                'RGB',
+                rng.choice(IMAGE_SIZES),
+                tuple(rng.randrange(256) for _ in range(3)),
+            )
+            content = io.BytesIO()
+            image.save(content, 'JPEG')
+            names.append(default_storage.save(
+                f'posts/{prefix}-{index}.jpg', ContentFile(content.getvalue())
+            ))
+        return names
+
+    def handle(self, *args, **options):
+        prefix = options['prefix']
+        if User.objects.filter(username__startswith=f'{prefix}-').exists():
+            raise CommandError(
+                f'Пользователи {prefix}-* уже созданы, '
+                'укажите другой --prefix'
+            )
+        if not options['users'] and options['posts']:
+            raise CommandError('Для записей нужны пользователи')
+        if options['images'] > options['posts']:
+            raise CommandError(
+                'Картинок (--images) не может быть больше, чем записей '
+                '(--posts)'
+            )
+        rng = random.Random(options['seed'])
+        fake = Faker('ru_RU')
+        fake.seed_instance(options['seed'])
+        batch_size = options['batch_size']
+        exponent = options['exponent']
+        started = time.perf_counter()
+        sentences = [fake.sentence() for _ in range(SENTENCE_POOL_SIZE)]
+
+        stage = time.perf_counter()
+        password = make_password(BENCHMARK_PASSWORD)
+        user_ids = self.insert(User, (
+            User(
+                username=f'{prefix}-{index}',
+                first_name=fake.first_name(),
+                last_name=fake.last_name(),
+                password=password,
+            )
+            for index in range(options['users'])
+        ), batch_size)
+        self.report('Пользователи', len(user_ids), stage)
+
+        stage = time.perf_counter()
+        group_ids = self.insert(Group, (
+            Group(
+                title=fake.sentence(nb_words=3).rstrip('.'),
+                slug=f'{prefix}-{index}',
+                description=' '.join(rng.choices(sentences, k=3)),
+            )
+            for index in range(options['groups'])
+        ), batch_size)
+        self.report('Группы', len(group_ids), stage)
+
+        # Authors are ranked in a random order, so the most prolific author
+        # is not always the first user.
+        ranked_users: Sequence[int] = rng.sample(user_ids, len(user_ids))
+        user_weights = power_law_weights(len(ranked_users), exponent)
+
+        stage = time.perf_counter()
+        image_names = self.create_images(rng, options['images'], prefix)
+        image_posts = dict(zip(
+            rng.sample(range(options['posts']), len(image_names)),
+            image_names,
+        ))
+        dates = self.random_dates(rng, options['days'])
+        post_ids = self.insert(Post, (
+            Post(
+                text=' '.join(rng.choices(sentences, k=rng.randint(1, 6))),
+                author_id=rng.choices(
+                    ranked_users, cum_weights=user_weights)[0],
+                group_id=(
+                    rng.choice(group_ids)
+                    if group_ids and rng.random() < 0.5 else None
+                ),
+                pub_date=next(dates),
+                image=image_posts.get(index, ''),
+            )
+            for index in range(options['posts'])
+        ), batch_size)
+        self.report('Записи', len(post_ids), stage)
+
+        stage = time.perf_counter()
+        ranked_posts = rng.sample(post_ids, len(post_ids))
+        post_weights = power_law_weights(len(ranked_posts), exponent)
+        comments = self.insert(Comment, (
+            Comment(
+                post_id=rng.choices(
+                    ranked_posts, cum_weights=post_weights)[0],
+                author_id=rng.choice(user_ids),
+                text=rng.choice(sentences),
+                created=next(dates),
+            )
+            for _ in range(options['comments'] if post_ids else 0)
+        ), batch_size)
+        self.report('Комментарии', len(comments), stage)
+
+        stage = time.perf_counter()
+        followers = []
+
+        def follows() -> Iterator[Follow]:
+            for user_id in user_ids:
+                count = 0
+                if options['follows']:
+                    count = int(rng.expovariate(1 / options['follows']))
+                # Popular authors are drawn again and again, the number of
+                # draws is limited instead of waiting for the rare ones.
+                draws = rng.choices(
+                    ranked_users, cum_weights=user_weights, k=count * 2)
+                authors = list(dict.fromkeys(
+                    author_id for author_id in draws if author_id != user_id
+                ))[:count]
+                if authors:
+                    followers.append(user_id)
+                for author_id in sorted(authors):
+                    yield Follow(user_id=user_id, author_id=author_id)
+
+        follow_ids = self.insert(Follow, follows(), batch_size)
+        self.report('Подписки', len(follow_ids), stage)
+
+        stage = time.perf_counter()
+        rebuild_counters()
+        for user_id in followers:
+            rebuild_timeline(user_id)
+        feed_cache.bump_feed_versions(feed_cache.GLOBAL_SCOPE)
+        self.report('Ленты подписок', len(followers), stage)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Данные созданы за {time.perf_counter() - started:.1f} с, '
+            f'пароль пользователей: {BENCHMARK_PASSWORD}'
+        ))
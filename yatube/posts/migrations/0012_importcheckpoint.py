@@ -0,0 +1,27 @@
+# Generated by Django 2.2.16 on 2026-10-17 08:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0011_comment_ordering'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportCheckpoint',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True, verbose_name='Имя импорта')),
+                ('offset', models.BigIntegerField(default=0, verbose_name='Позиция в файле')),
+                ('records', models.PositiveIntegerField(default=0, verbose_name='Обработано записей')),
+                ('affected_user_ids', models.TextField(blank=True, verbose_name='Пользователи с изменёнными лентами')),
+            ],
+            options={
+                'verbose_name': 'Позиция импорта',
+                'verbose_name_plural': 'Позиции импорта',
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 2.2.16 on 2026-10-17 09:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0012_importcheckpoint'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='importcheckpoint',
+            name='affected_user_ids',
+        ),
+        migrations.AddField(
+            model_name='importcheckpoint',
+            name='start_id',
+            field=models.BigIntegerField(default=0, verbose_name='Последний id до импорта'),
+        ),
+    ]
@@ -1,6 +1,8 @@
 from django.contrib.auth import get_user_model
 from django.db import models
 
+from core.query_cache import CachingQuerySet
+
 MAX_CHAR_FIELD_SIZE = 200
 MAX_NUMBER_CHARS_IN_POST_PRESENTATION = 15
 MAX_NUMBER_CHARS_IN_COMMENT_PRESENTATION = 10
@@ -17,6 +19,8 @@ class Group(models.Model):
         slug (SlugField): The unique address of the group, part of the URL.
         description (TextField): A text describing the community.
             This text will be displayed on the community page.
+        posts_count (PositiveIntegerField): Number of posts in the group,
+            maintained by the signals of the Post model.
     """
 
     title = models.CharField(
@@ -34,6 +38,13 @@ class Group(models.Model):
         verbose_name='Описание группы',
         help_text='Введите описание группы',
     )
+    posts_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество постов',
+    )
+
+    objects = CachingQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Группа'
@@ -53,6 +64,8 @@ class Post(models.Model):
         author (ForeignKey): Indicates the author of the post.
         group (ForeignKey): Indicates the group of the post.
         image (ImageField): Image for the post.
+        comments_count (PositiveIntegerField): Number of comments on the
+            post, maintained by the signals of the Comment model.
     """
 
     text = models.TextField(verbose_name='Текст поста',
@@ -83,11 +96,32 @@ class Post(models.Model):
         upload_to='posts/',
         blank=True
     )
+    comments_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество комментариев',
+    )
+
+    objects = CachingQuerySet.as_manager()
 
     class Meta:
-        ordering = ['-pub_date']
+        ordering = ['-pub_date', '-id']
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        indexes = [
+            models.Index(
+                fields=['-pub_date'],
+                name='post_pub_date_idx',
+            ),
+            models.Index(
+                fields=['author', '-pub_date'],
+                name='post_author_pub_date_idx',
+            ),
+            models.Index(
+                fields=['group', '-pub_date'],
+                name='post_group_pub_date_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.text[:MAX_NUMBER_CHARS_IN_POST_PRESENTATION]
@@ -129,6 +163,13 @@ class Comment(models.Model):
     class Meta:
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
+        ordering = ['created', 'id']
+        indexes = [
+            models.Index(
+                fields=['post', 'created'],
+                name='comment_post_created_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.text[:MAX_NUMBER_CHARS_IN_COMMENT_PRESENTATION]
@@ -154,5 +195,148 @@ class Follow(models.Model):
         related_name='following'
     )
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'author'],
+                name='unique_follow',
+            ),
+        ]
+
     def __str__(self):
         return f'{self.user.username} follows {self.author.username}'
+
+
+class UserStats(models.Model):
+    """
+    Model for storing denormalized counters of a user.
+
+    The counters are maintained by the signals of the Post and Follow models
+    and can be recalculated with the rebuild_counters command.
+
+    Fields:
+        user (OneToOneField): Link to the user the counters belong to.
+        posts_count (PositiveIntegerField): Number of posts by the user.
+        followers_count (PositiveIntegerField): Number of users subscribed
+            to the user.
+        following_count (PositiveIntegerField): Number of authors the user
+            is subscribed to.
+    """
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь',
+    )
+    posts_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество постов',
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество подписчиков',
+    )
+    following_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество подписок',
+    )
+
+    class Meta:
+        verbose_name = 'Статистика пользователя'
+        verbose_name_plural = 'Статистика пользователей'
+
+    def __str__(self):
+        return f'Statistics of {self.user_id}'
+
+
+class TimelineEntry(models.Model):
+    """
+    Model for storing the materialized follow feed of a user.
+
+    An entry is pushed to every follower when a post is created and the feeds
+    are trimmed to the FOLLOW_TIMELINE_DEPTH newest posts.
+
+    Fields:
+        user (ForeignKey): Link to the user the feed belongs to.
+        post (ForeignKey): Link to the post in the feed.
+        pub_date (DateTimeField): Date of publication of the post, copied to
+            order and trim the feed without joining the posts.
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Пользователь',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост',
+    )
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_timeline_entry',
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date'],
+                name='timeline_user_pub_date_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.post_id} in the feed of {self.user_id}'
+
+
+class ImportCheckpoint(models.Model):
+    """
+    Model for storing the position of an interrupted import.
+
+    The position is saved in the transaction of every imported batch, so it
+    always matches the committed objects.
+
+    Fields:
+        name (CharField): Name of the import, the path of the file.
+        offset (BigIntegerField): Offset in bytes the reading of the file is
+            resumed from.
+        records (PositiveIntegerField): Number of the processed records.
+        start_id (BigIntegerField): The greatest id of the imported model
+            before the import started, the objects above it are the
+            imported ones.
+    """
+
+    name = models.CharField(
+        max_length=255,
+        unique=True,
+        verbose_name='Имя импорта',
+    )
+    offset = models.BigIntegerField(
+        default=0,
+        verbose_name='Позиция в файле',
+    )
+    records = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Обработано записей',
+    )
+    start_id = models.BigIntegerField(
+        default=0,
+        verbose_name='Последний id до импорта',
+    )
+
+    class Meta:
+        verbose_name = 'Позиция импорта'
+        verbose_name_plural = 'Позиции импорта'
+
+    def __str__(self):
+        return f'{self.name} at {self.offset}'
@@ -0,0 +1,208 @@
+from functools import partial
+from typing import Dict, Iterable, List, Optional, Sequence, Set
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Page
+from django.db import transaction
+from django.db.models import Model, QuerySet
+
+from core.metrics import OBJECT_CACHE_REQUESTS
+
+from .models import Group, Post, User
+
+OBJECT_KEY = 'object:{label}:{pk}'
+# Part of every key, raised when the cached fields change, so objects
+# pickled by the previous code are never read.
+OBJECT_CACHE_VERSION = 1
+# Fields of the objects kept in the cache, None keeps every field. Users
+# are kept without their passwords and permissions, the feeds show only
+# their names.
+CACHED_FIELDS: Dict[type, Optional[Sequence[str]]] = {
+    Post: None,
+    User: ('id', 'username', 'first_name', 'last_name'),
+    Group: None,
+}
+# Fields a page of posts is selected with before the posts are read from
+# the cache, the sort key and the keys of the related objects.
+POST_KEY_FIELDS = ('id', 'pub_date', 'author_id', 'group_id')
+
+
+def _key(model: type, pk: int) -> str:
+    return OBJECT_KEY.format(label=model._meta.label_lower, pk=pk)
+
+
+def get_cached_fields(model: type, prefix: str = '') -> List[str]:
+    """Returns the names of the cached fields of the model for only()."""
+    names = CACHED_FIELDS[model]
+    if names is None:
+        names = [field.name for field in model._meta.concrete_fields]
+    return [f'{prefix}{name}' for name in names]
+
+
+def _detach(instance: Model) -> Model:
+    """Drops the related objects, they are cached under their own keys."""
+    instance._state.fields_cache = {}
+    return instance
+
+
+def _count(model: type, hits: int, misses: int) -> None:
+    """Counts the hits and misses of the model for the hit ratio."""
+    label = model._meta.label_lower
+    if hits:
+        OBJECT_CACHE_REQUESTS.inc((label, 'hit'), hits)
+    if misses:
+        OBJECT_CACHE_REQUESTS.inc((label, 'miss'), misses)
+
+
+def get_objects(
+        pks: Dict[type, Iterable[int]]) -> Dict[type, Dict[int, Model]]:
+    """
+    Returns the objects of several models by their pks, read from the cache
+    with one get_many. The missing objects of a model are read from the
+    database with one query and cached.
+
+    Posts missing from the cache are read together with their authors and
+    groups, so a cold cache costs a single query for a page of posts.
+
+    Args:
+        pks (dict): Models of CACHED_FIELDS and the pks of their objects.
+    """
+    keys = {
+        (model, pk): _key(model, pk)
+        for model, model_pks in pks.items()
+        for pk in model_pks
+        if pk is not None
+    }
+    found = cache.get_many(keys.values(), version=OBJECT_CACHE_VERSION)
+    objects: Dict[type, Dict[int, Model]] = {model: {} for model in pks}
+    missing: Dict[type, Set[int]] = {model: set() for model in pks}
+    for (model, pk), key in keys.items():
+        if key in found:
+            objects[model][pk] = found[key]
+        else:
+            missing[model].add(pk)
+    for model in pks:
+        _count(model, len(objects[model]), len(missing[model]))
+
+    loaded: Dict[str, Model] = {}
+    if missing.get(Post):
+        posts = Post.objects.select_related('author', 'group').only(
+            *get_cached_fields(Post),
+            *get_cached_fields(User, 'author__'),
+            *get_cached_fields(Group, 'group__'),
+        ).filter(pk__in=missing.pop(Post)).order_by()
+        for post in posts:
+            for model, instance in ((User, post.author), (Group, post.group)):
+                if instance is not None and instance.pk in missing.get(
+                        model, ()):
+                    missing[model].discard(instance.pk)
+                    objects[model][instance.pk] = _detach(instance)
+                    loaded[_key(model, instance.pk)] = instance
+            objects[Post][post.pk] = _detach(post)
+            loaded[_key(Post, post.pk)] = post
+    for model, model_pks in missing.items():
+        if not model_pks:
+            continue
+        instances = model._default_manager.only(
+            *get_cached_fields(model)).filter(pk__in=model_pks).order_by()
+        for instance in instances:
+            objects[model][instance.pk] = instance
+            loaded[_key(model, instance.pk)] = instance
+    if loaded:
+        cache.set_many(loaded, settings.OBJECT_CACHE_TIMEOUT,
+                       version=OBJECT_CACHE_VERSION)
+    return objects
+
+
+def hydrate_posts(posts: Iterable[Post]) -> List[Post]:
+    """
+    Replaces the posts selected with POST_KEY_FIELDS by the cached posts
+    with their authors and groups, keeping the order. Posts deleted since
+    they were selected are left out.
+    """
+    posts = list(posts)
+    objects = get_objects({
+        Post: [post.id for post in posts],
+        User: {post.author_id for post in posts},
+        Group: {post.group_id for post in posts},
+    })
+    hydrated = []
+    for post in posts:
+        post = objects[Post].get(post.id)
+        if post is None:
+            continue
+        if post.author_id in objects[User]:
+            post.author = objects[User][post.author_id]
+        if post.group_id in objects[Group]:
+            post.group = objects[Group][post.group_id]
+        hydrated.append(post)
+    return hydrated
+
+
+class CachedPosts(Sequence):
+    """
+    The posts of a page read from the object cache when the page is first
+    iterated, so a page whose rendered fragment is cached reads no posts.
+
+    Args:
+        posts (Iterable): Posts selected with POST_KEY_FIELDS.
+    """
+
+    def __init__(self, posts: Iterable[Post]) -> None:
+        self._posts = posts
+        self._hydrated: Optional[List[Post]] = None
+
+    def __repr__(self) -> str:
+        return f'<CachedPosts of {self._posts!r}>'
+
+    def _get(self) -> List[Post]:
+        if self._hydrated is None:
+            self._hydrated = hydrate_posts(self._posts)
+        return self._hydrated
+
+    def __len__(self) -> int:
+        return len(self._get())
+
+    def __getitem__(self, index):
+        return self._get()[index]
+
+
+def select_post_keys(posts: QuerySet) -> QuerySet:
+    """
+    Returns the queryset of the posts reading only POST_KEY_FIELDS, the
+    first phase of rendering a feed page. The keys of the page and the
+    number of the posts are kept in the query cache.
+    """
+    return posts.select_related(None).only(*POST_KEY_FIELDS).cache()
+
+
+def hydrate_page(page: Page) -> Page:
+    """
+    Makes the posts of the page selected by select_post_keys() be read from
+    the object cache, the second phase of rendering a feed page.
+
+    Args:
+        page: A Page or a KeysetPage of posts.
+    """
+    page.object_list = CachedPosts(page.object_list)
+    return page
+
+
+def _delete(keys: List[str]) -> None:
+    cache.delete_many(keys, version=OBJECT_CACHE_VERSION)
+
+
+def forget_objects(model: type, *pks: int) -> None:
+    """
+    Removes the changed objects of the model from the cache.
+
+    Inside a transaction the objects are removed again on commit: a feed
+    read before the commit would cache the rows without the change.
+    """
+    if model not in CACHED_FIELDS:
+        return
+    keys = [_key(model, pk) for pk in pks if pk is not None]
+    _delete(keys)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(partial(_delete, keys))
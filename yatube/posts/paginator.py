@@ -1,18 +1,321 @@
+import base64
+import binascii
+import json
+from typing import Any, Iterator, List, Optional, Sequence, Tuple
+
+from django.core.exceptions import ValidationError
 from django.core.paginator import Page, Paginator
-from django.db.models import QuerySet
+from django.db.models import Q, QuerySet
 from django.http import HttpRequest
 
+FEED_ORDERING = ('-pub_date', '-id')
+COMMENT_ORDERING = ('created', 'id')
+
+
+def encode_key(values: Sequence[Any]) -> str:
+    """Packs the values of a sort key into an opaque URL-safe token."""
+    raw = json.dumps(list(values), separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_key(cursor: str) -> Optional[List[Any]]:
+    """Unpacks the values of a sort key or returns None if it is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw.decode())
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    return values if isinstance(values, list) else None
+
+
+def _position(direction: str, cursor: Optional[str]) -> str:
+    """
+    Returns the canonical position of the cursor, the first page if it is
+    malformed. Tokens differing only in padding or spacing get the same
+    position.
+    """
+    values = decode_key(cursor) if cursor else None
+    if values is None:
+        return 'after='
+    return f'{direction}={encode_key(values)}'
+
+
+class KeysetPage:
+    """
+    A page of objects selected by a cursor instead of a page number.
+
+    Supports the part of the Page interface used by the templates: it can be
+    iterated, measured and asked about neighbouring pages. The neighbouring
+    pages are addressed by opaque tokens for the ?after= and ?before=
+    parameters.
+
+    Attributes:
+        object_list (list): Objects of the page.
+        next_cursor (str): Token of the next page or None.
+        previous_cursor (str): Token of the previous page or None.
+        position (str): Canonical cursor the page was selected by.
+    """
+
+    is_keyset = True
+
+    def __init__(self, object_list: List[Any], next_cursor: Optional[str],
+                 previous_cursor: Optional[str],
+                 position: str = 'after=') -> None:
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.position = position
+
+    def __repr__(self) -> str:
+        return f'<KeysetPage of {len(self.object_list)} objects>'
+
+    def __len__(self) -> int:
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        # The templates look attributes up as keys first, which must not
+        # read the objects.
+        if not isinstance(index, (int, slice)):
+            raise TypeError(
+                f'KeysetPage indices must be integers or slices, '
+                f'not {type(index).__name__}.')
+        return self.object_list[index]
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self.object_list)
+
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+
+    def has_previous(self) -> bool:
+        return self.previous_cursor is not None
+
+    def has_other_pages(self) -> bool:
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """
+    Splits an ordered queryset into pages by the values of the sort key.
+
+    Each page is selected with a range condition on the key and a LIMIT,
+    so neither COUNT(*) nor OFFSET is ever executed. The last field of
+    the ordering must be unique, otherwise rows with equal keys may be lost
+    on a page boundary.
+
+    Args:
+        queryset (QuerySet): Objects to be paginated.
+        per_page (int): Maximum number of objects per page.
+        ordering (tuple): Field names of the key, with '-' for descending.
+    """
+
+    def __init__(self, queryset: QuerySet, per_page: int,
+                 ordering: Sequence[str] = FEED_ORDERING) -> None:
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = tuple(ordering)
+        self.fields = [
+            queryset.model._meta.get_field(name.lstrip('-'))
+            for name in self.ordering
+        ]
+
+    def encode_cursor(self, obj: Any) -> str:
+        """Returns an opaque token pointing at the key of the object."""
+        return encode_key([
+            field.value_to_string(obj) for field in self.fields
+        ])
+
+    def decode_cursor(self, cursor: str) -> Optional[Tuple[Any, ...]]:
+        """Returns the key stored in the token or None if it is malformed."""
+        values = decode_key(cursor)
+        if values is None or len(values) != len(self.fields):
+            return None
+        try:
+            return tuple(
+                field.to_python(value)
+                for field, value in zip(self.fields, values)
+            )
+        except (ValueError, TypeError, ValidationError):
+            return None
+
+    def _seek(self, key: Tuple[Any, ...], backwards: bool) -> Q:
+        """
+        Builds the condition selecting rows that follow the key in the
+        direction of pagination.
+
+        The condition on the first field alone is repeated as a non-strict
+        range, so the database seeks the index to the key instead of
+        reading every row before it.
+        """
+        condition = Q()
+        equal = {}
+        for name, value in zip(self.ordering, key):
+            descending = name.startswith('-')
+            name = name.lstrip('-')
+            lookup = 'gt' if descending == backwards else 'lt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        if len(self.ordering) > 1:
+            name = self.ordering[0]
+            lookup = 'gte' if name.startswith('-') == backwards else 'lte'
+            condition &= Q(**{f'{name.lstrip("-")}__{lookup}': key[0]})
+        return condition
+
+    def page_after(self, cursor: Optional[str] = None) -> KeysetPage:
+        """Returns the page following the cursor or the first page."""
+        queryset = self.queryset.order_by(*self.ordering)
+        key = self.decode_cursor(cursor) if cursor else None
+        if key is not None:
+            queryset = queryset.filter(self._seek(key, backwards=False))
+
+        objects = list(queryset[:self.per_page + 1])
+        has_next = len(objects) > self.per_page
+        objects = objects[:self.per_page]
+
+        return KeysetPage(
+            objects,
+            self.encode_cursor(objects[-1]) if has_next else None,
+            self.encode_cursor(objects[0]) if key and objects else None,
+            _position('after', cursor) if key else 'after=',
+        )
+
+    def page_before(self, cursor: str) -> KeysetPage:
+        """Returns the page preceding the cursor."""
+        key = self.decode_cursor(cursor)
+        if key is None:
+            return self.page_after()
+
+        reverse_ordering = [
+            name.lstrip('-') if name.startswith('-') else f'-{name}'
+            for name in self.ordering
+        ]
+        queryset = self.queryset.filter(
+            self._seek(key, backwards=True)
+        ).order_by(*reverse_ordering)
+
+        objects = list(queryset[:self.per_page + 1])
+        has_previous = len(objects) > self.per_page
+        objects = objects[:self.per_page][::-1]
+        if not objects:
+            return self.page_after()
+
+        return KeysetPage(
+            objects,
+            self.encode_cursor(objects[-1]),
+            self.encode_cursor(objects[0]) if has_previous else None,
+            _position('before', cursor),
+        )
+
+
+def split_into_keyset_pages(request: HttpRequest, posts: QuerySet,
+                            max_sample_size: int,
+                            ordering: Sequence[str] = FEED_ORDERING
+                            ) -> KeysetPage:
+    """
+    Returns the page of posts addressed by the ?after= or ?before= token.
+
+    Args:
+        request (HttpRequest): A basic HTTP request.
+        posts (QuerySet): List of posts to be paginated.
+        max_sample_size (int): Maximum number of posts per page.
+        ordering (tuple): Sort key of the pages, must end with a unique field.
+    """
+    paginator = KeysetPaginator(posts, max_sample_size, ordering)
+    before = request.GET.get('before')
+    if before:
+        return paginator.page_before(before)
+    return paginator.page_after(request.GET.get('after'))
+
+
+class CursorPage(Page):
+    """
+    A numbered page whose neighbouring pages are also addressed by the
+    tokens of KeysetPage, so the links leaving it select the pages by
+    the key.
+    """
+
+    @property
+    def next_cursor(self) -> Optional[str]:
+        if not self.has_next():
+            return None
+        return self.paginator.keyset.encode_cursor(self[len(self) - 1])
+
+    @property
+    def previous_cursor(self) -> Optional[str]:
+        if not self.has_previous():
+            return None
+        return self.paginator.keyset.encode_cursor(self[0])
+
+
+class CursorPaginator(Paginator):
+    """
+    A Paginator of CursorPage pages.
+
+    Args:
+        object_list (QuerySet): Objects to be paginated.
+        per_page (int): Maximum number of objects per page.
+        ordering (tuple): Sort key of the tokens, must end with a unique
+            field.
+    """
+
+    def __init__(self, object_list: QuerySet, per_page: int,
+                 ordering: Sequence[str] = FEED_ORDERING) -> None:
+        super().__init__(object_list.order_by(*ordering), per_page)
+        self.keyset = KeysetPaginator(object_list, per_page, ordering)
+
+    def _get_page(self, *args, **kwargs) -> CursorPage:
+        return CursorPage(*args, **kwargs)
+
 
 def split_into_pages(request: HttpRequest, posts: QuerySet,
                      max_sample_size: int) -> Page:
     """
     Splits the list of posts into pages and returns the desired page.
 
+    Pages are selected by the ?after= and ?before= tokens, the first page
+    by none, and a KeysetPage is returned: no page costs COUNT(*) or
+    OFFSET. A ?page= number, as in the links made before the tokens,
+    selects a numbered CursorPage, whose links to the next and previous
+    pages carry the tokens.
+
     Args:
         request (HttpRequest): A basic HTTP request.
         posts (QuerySet): List of posts to be paginated.
         max_sample_size (int): Maximum number of posts per page.
     """
-    paginator = Paginator(posts, max_sample_size)
+    if 'page' not in request.GET or (
+            'after' in request.GET or 'before' in request.GET):
+        return split_into_keyset_pages(request, posts, max_sample_size)
+
+    paginator = CursorPaginator(posts, max_sample_size)
     page_number = request.GET.get('page')
     return paginator.get_page(page_number)
+
+
+def get_page_position(page) -> str:
+    """
+    Returns the position of the selected page: the number of a numbered
+    page, validated by the paginator, or the canonical cursor of a keyset
+    page.
+
+    Args:
+        page: A Page or a KeysetPage.
+    """
+    if getattr(page, 'is_keyset', False):
+        return page.position
+    return f'page={page.number}'
+
+
+def get_requested_position(request: HttpRequest) -> str:
+    """
+    Returns the position of the page the request asks for, found without
+    reading the database. It equals the position of the selected page
+    unless the parameters are malformed or out of range.
+    """
+    if 'page' not in request.GET or (
+            'after' in request.GET or 'before' in request.GET):
+        before = request.GET.get('before')
+        if before:
+            return _position('before', before)
+        return _position('after', request.GET.get('after'))
+    return f'page={request.GET.get("page") or 1}'
@@ -0,0 +1,247 @@
+import re
+from typing import List, Optional, Tuple
+
+from django.db import connection, connections
+from django.db.models import QuerySet
+from django.http import HttpRequest
+
+from .models import Post
+from .paginator import (FEED_ORDERING, KeysetPage, KeysetPaginator,
+                        decode_key, encode_key)
+
+SEARCH_TABLE = 'posts_post_fts'
+# The index is an external content FTS5 table over posts_post kept in sync
+# by triggers, so bulk inserts and queryset updates are indexed as well.
+# Django drops the triggers when it rebuilds posts_post in a migration,
+# they are created again after every migrate, see restore_search_index().
+SEARCH_INDEX_SQL = (
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5(
+        text,
+        content='posts_post',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_insert
+    AFTER INSERT ON posts_post BEGIN
+        INSERT INTO {SEARCH_TABLE}(rowid, text) VALUES (new.id, new.text);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_delete
+    AFTER DELETE ON posts_post BEGIN
+        INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, text)
+        VALUES ('delete', old.id, old.text);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_update
+    AFTER UPDATE OF text ON posts_post BEGIN
+        INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, text)
+        VALUES ('delete', old.id, old.text);
+        INSERT INTO {SEARCH_TABLE}(rowid, text) VALUES (new.id, new.text);
+    END
+    """,
+)
+SEARCH_TRIGGERS = tuple(
+    f'{SEARCH_TABLE}_{event}' for event in ('insert', 'delete', 'update'))
+
+
+def is_search_index_supported(using: str = 'default') -> bool:
+    """Checks whether the database has the full-text index of posts."""
+    return connections[using].vendor == 'sqlite'
+
+
+def build_match_query(query: str) -> str:
+    """
+    Turns the words of the query into an FTS5 query that matches posts
+    containing all of them as whole words or word beginnings. Every word is
+    quoted, so the input cannot break the syntax of the query.
+    """
+    words = re.findall(r'\w+', query)
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def get_missing_search_objects(using: str = 'default') -> List[str]:
+    """Returns the names of the index table and triggers the database lacks."""
+    names = (SEARCH_TABLE, *SEARCH_TRIGGERS)
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            'SELECT name FROM sqlite_master WHERE name IN ({})'.format(
+                ', '.join(['%s'] * len(names))),
+            names,
+        )
+        existing = {name for name, in cursor.fetchall()}
+    return [name for name in names if name not in existing]
+
+
+def rebuild_search_index(using: str = 'default') -> None:
+    """
+    Creates the index and its triggers if they are missing and fills the
+    index with the current texts of all the posts.
+    """
+    with connections[using].cursor() as cursor:
+        for sql in SEARCH_INDEX_SQL:
+            cursor.execute(sql)
+        cursor.execute(
+            f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('rebuild')")
+        cursor.execute(
+            f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('optimize')")
+
+
+def restore_search_index(sender, using: str = 'default', verbosity: int = 1,
+                         **kwargs) -> None:
+    """
+    A post_migrate receiver creating the triggers of the index again when
+    a migration rebuilt posts_post without them. The posts changed while
+    the triggers were missing are not in the index, so it is rebuilt.
+
+    A database without the index table, migrated back before the index was
+    added, is left as it is.
+    """
+    if not is_search_index_supported(using):
+        return
+    missing = get_missing_search_objects(using)
+    if not missing or SEARCH_TABLE in missing:
+        return
+    rebuild_search_index(using)
+    if verbosity >= 1:
+        print('Восстановлены триггеры полнотекстового индекса: '
+              + ', '.join(missing))
+
+
+def filter_matching(queryset: QuerySet, query: str) -> QuerySet:
+    """
+    Leaves the posts whose text contains the words of the query. Uses the
+    full-text index when the database has it and LIKE otherwise.
+    """
+    words = re.findall(r'\w+', query)
+    if not words:
+        return queryset.none()
+    if not is_search_index_supported(queryset.db):
+        for word in words:
+            queryset = queryset.filter(text__icontains=word)
+        return queryset
+
+    # A RawSQL subquery given to __in is wrapped in parentheses twice, which
+    # SQLite reads as a single value, so the condition is added as is.
+    return queryset.extra(
+        where=[
+            f'{Post._meta.db_table}.id IN (SELECT rowid FROM {SEARCH_TABLE} '
+            f'WHERE {SEARCH_TABLE} MATCH %s)'
+        ],
+        params=[build_match_query(query)],
+    )
+
+
+class SearchPaginator:
+    """
+    Splits the posts matching a query into pages, the most relevant first.
+
+    The relevance is the bm25 rank of FTS5, lower is better. Pages are
+    selected by the (rank, id) pair of the last post, like the pages of
+    the feeds. The rank depends on the statistics of the whole index, so
+    pages may shift a little when posts are added between requests.
+
+    Args:
+        query (str): Words the posts should contain.
+        per_page (int): Maximum number of posts per page.
+    """
+
+    def __init__(self, query: str, per_page: int) -> None:
+        self.match = build_match_query(query)
+        self.per_page = per_page
+
+    def _fetch(self, key: Optional[Tuple[float, int]],
+               backwards: bool) -> List[Tuple[float, int]]:
+        """Returns ranks and ids of the matches following the key."""
+        sql = (f'SELECT rank, rowid FROM {SEARCH_TABLE} '
+               f'WHERE {SEARCH_TABLE} MATCH %s')
+        params = [self.match]
+        if key is not None:
+            sign = '<' if backwards else '>'
+            sql += f' AND (rank {sign} %s OR (rank = %s AND rowid {sign} %s))'
+            params += [key[0], key[0], key[1]]
+        direction = 'DESC' if backwards else 'ASC'
+        sql += f' ORDER BY rank {direction}, rowid {direction} LIMIT %s'
+        params.append(self.per_page + 1)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+    def _page(self, matches: List[Tuple[float, int]], has_next: bool,
+              has_previous: bool) -> KeysetPage:
+        """Loads the posts of the matches in the order of relevance."""
+        posts = Post.objects.select_related('author', 'group').in_bulk(
+            [post_id for _, post_id in matches])
+        return KeysetPage(
+            [posts[post_id] for _, post_id in matches if post_id in posts],
+            encode_key(matches[-1]) if has_next else None,
+            encode_key(matches[0]) if has_previous else None,
+        )
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> Optional[Tuple[float, int]]:
+        """Returns the (rank, id) key of the token or None if malformed."""
+        values = decode_key(cursor)
+        if values is None or len(values) != 2:
+            return None
+        try:
+            return float(values[0]), int(values[1])
+        except (ValueError, TypeError):
+            return None
+
+    def page_after(self, cursor: Optional[str] = None) -> KeysetPage:
+        """Returns the page following the cursor or the first page."""
+        if not self.match:
+            return KeysetPage([], None, None)
+        key = self.decode_cursor(cursor) if cursor else None
+        matches = self._fetch(key, backwards=False)
+        has_next = len(matches) > self.per_page
+        matches = matches[:self.per_page]
+        if not matches:
+            return KeysetPage([], None, None)
+        return self._page(matches, has_next, key is not None)
+
+    def page_before(self, cursor: str) -> KeysetPage:
+        """Returns the page preceding the cursor."""
+        key = self.decode_cursor(cursor)
+        if key is None or not self.match:
+            return self.page_after()
+        matches = self._fetch(key, backwards=True)
+        has_previous = len(matches) > self.per_page
+        matches = matches[:self.per_page][::-1]
+        if not matches:
+            return self.page_after()
+        return self._page(matches, True, has_previous)
+
+
+def split_into_search_pages(request: HttpRequest, query: str,
+                            max_sample_size: int) -> KeysetPage:
+    """
+    Returns the page of the posts matching the query addressed by the
+    ?after= or ?before= token.
+
+    Without the full-text index the matching posts are paginated in the
+    order of the feeds.
+
+    Args:
+        request (HttpRequest): A basic HTTP request.
+        query (str): Words the posts should contain.
+        max_sample_size (int): Maximum number of posts per page.
+    """
+    if is_search_index_supported():
+        paginator = SearchPaginator(query, max_sample_size)
+    else:
+        paginator = KeysetPaginator(
+            filter_matching(
+                Post.objects.select_related('author', 'group'), query),
+            max_sample_size,
+            FEED_ORDERING,
+        )
+    before = request.GET.get('before')
+    if before:
+        return paginator.page_before(before)
+    return paginator.page_after(request.GET.get('after'))
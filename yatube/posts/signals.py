@@ -0,0 +1,184 @@
+from typing import Optional
+
+from django.db.models import DEFERRED
+from django.db.models.signals import (post_delete, post_init, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+
+from . import feed_cache, follow_graph, object_cache, timelines
+from .counters import change_counters, change_user_stats
+from .models import (Comment, Follow, Group, Post, TimelineEntry, User,
+                     UserStats)
+
+
+@receiver(post_save, sender=User)
+def create_user_stats(sender, instance, created, raw=False, **kwargs):
+    """Creates the row of counters for a new user."""
+    if created and not raw:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def outdate_all_feeds(sender, instance, update_fields=None, **kwargs):
+    """
+    Outdates every feed, the names of users and groups are shown on all of
+    them. Saving only the time of the last login changes nothing visible.
+    """
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    feed_cache.bump_feed_versions(feed_cache.GLOBAL_SCOPE)
+
+
+@receiver(post_init, sender=Post)
+def remember_post_relations(sender, instance, **kwargs):
+    """
+    Remembers the author and group the post was loaded with. Relations
+    deferred by only() are not read, that would cost a query per post.
+    """
+    instance._initial_author_id = instance.__dict__.get('author_id', DEFERRED)
+    instance._initial_group_id = instance.__dict__.get('group_id', DEFERRED)
+
+
+def get_initial(instance: Post, attname: str):
+    """
+    Returns the remembered value of the relation. A relation that was
+    deferred when the post was loaded is considered unchanged.
+    """
+    value = getattr(instance, f'_initial_{attname}')
+    return getattr(instance, attname) if value is DEFERRED else value
+
+
+def count_saved_post(post: Post, old_author_id: Optional[int],
+                     old_group_id: Optional[int]) -> None:
+    """Moves the post between the counters of authors and groups."""
+    if post.author_id != old_author_id:
+        change_user_stats(old_author_id, posts_count=-1)
+        change_user_stats(post.author_id, posts_count=1)
+    if post.group_id != old_group_id:
+        change_counters(Group, old_group_id, posts_count=-1)
+        change_counters(Group, post.group_id, posts_count=1)
+
+
+def push_saved_post(post: Post, created: bool,
+                    old_author_id: Optional[int]) -> None:
+    """Pushes a new post, or a post with a new author, to follow feeds."""
+    if not created and post.author_id != old_author_id:
+        TimelineEntry.objects.filter(post=post).delete()
+        created = True
+    if created:
+        timelines.push_post(post)
+
+
+def outdate_post_feeds(post: Post, old_author_id: Optional[int],
+                       old_group_id: Optional[int]) -> None:
+    """Outdates the feeds the post is or was shown in."""
+    feed_cache.bump_feed_versions(
+        feed_cache.index_scope(),
+        feed_cache.post_scope(post.pk),
+        feed_cache.profile_scope(post.author_id),
+        feed_cache.profile_scope(old_author_id),
+        feed_cache.group_scope(post.group_id),
+        feed_cache.group_scope(old_group_id),
+    )
+
+
+@receiver(post_save, sender=Post)
+def update_saved_post(sender, instance, created, raw=False, **kwargs):
+    """
+    Updates the counters and the feeds of the saved post.
+
+    The author and group the post was loaded with are replaced by the saved
+    ones at once and passed to the updates explicitly, so the order of
+    the receivers does not matter.
+    """
+    old_author_id = None if created else get_initial(instance, 'author_id')
+    old_group_id = None if created else get_initial(instance, 'group_id')
+    remember_post_relations(sender, instance)
+    if not raw:
+        count_saved_post(instance, old_author_id, old_group_id)
+        push_saved_post(instance, created, old_author_id)
+    outdate_post_feeds(instance, old_author_id, old_group_id)
+
+
+@receiver(post_delete, sender=Post)
+def outdate_deleted_post_feeds(sender, instance, **kwargs):
+    """Outdates the feeds the deleted post was shown in."""
+    outdate_post_feeds(
+        instance,
+        get_initial(instance, 'author_id'),
+        get_initial(instance, 'group_id'),
+    )
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def forget_cached_object(sender, instance, **kwargs):
+    """Removes the saved or deleted object from the object cache."""
+    object_cache.forget_objects(sender, instance.pk)
+
+
+@receiver(pre_delete, sender=Group)
+def forget_group_posts(sender, instance, **kwargs):
+    """
+    Removes the posts of the group from the object cache, the deletion
+    clears their group with an UPDATE that sends no signals.
+    """
+    object_cache.forget_objects(
+        Post, *instance.posts.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    """Removes the post from the counters of its author and group."""
+    change_user_stats(instance.author_id, posts_count=-1)
+    change_counters(Group, instance.group_id, posts_count=-1)
+
+
+@receiver(post_save, sender=Comment)
+def count_saved_comment(sender, instance, created, raw=False, **kwargs):
+    """Increases the number of comments on the post."""
+    if created and not raw:
+        change_counters(Post, instance.post_id, comments_count=1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    """Decreases the number of comments on the post."""
+    change_counters(Post, instance.post_id, comments_count=-1)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def outdate_post_page(sender, instance, **kwargs):
+    """Outdates the page of the commented post."""
+    feed_cache.bump_feed_versions(feed_cache.post_scope(instance.post_id))
+
+
+@receiver(post_save, sender=Follow)
+def count_saved_follow(sender, instance, created, raw=False, **kwargs):
+    """Increases the subscription counters of both users."""
+    if created and not raw:
+        follow_graph.forget_following_ids(instance.user_id)
+        change_user_stats(instance.user_id, following_count=1)
+        change_user_stats(instance.author_id, followers_count=1)
+        timelines.push_author_posts(instance.user_id, instance.author_id)
+        feed_cache.bump_feed_versions(
+            feed_cache.follow_scope(instance.user_id))
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    """Decreases the subscription counters of both users."""
+    follow_graph.forget_following_ids(instance.user_id)
+    change_user_stats(instance.user_id, following_count=-1)
+    change_user_stats(instance.author_id, followers_count=-1)
+    timelines.remove_author_posts(instance.user_id, instance.author_id)
+    timelines.push_resumed_author_posts(instance.author_id)
+    feed_cache.bump_feed_versions(feed_cache.follow_scope(instance.user_id))
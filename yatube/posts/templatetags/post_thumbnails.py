@@ -0,0 +1,21 @@
+from django import template
+
+from .. import thumbnails
+from ..models import Post
+
+register = template.Library()
+
+
+@register.simple_tag
+def attach_thumbnails(posts) -> str:
+    """
+    Looks up the created thumbnails of the posts in one batch and stores
+    them in the thumbnail attribute of every post. Never creates thumbnails.
+
+    Args:
+        posts: A post or an iterable of posts, e.g. a page.
+    """
+    if isinstance(posts, Post):
+        posts = [posts]
+    thumbnails.attach_thumbnails(posts)
+    return ''
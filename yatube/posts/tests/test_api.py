@@ -0,0 +1,201 @@
+from http import HTTPStatus
+
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..api import API_PAGE_SIZE, COMMENT_FIELDS, POST_FIELDS
+from ..models import Comment, Follow, Group, Post, User
+
+
+class ApiTests(TestCase):
+    """Checking the read-only JSON API."""
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        """Creates authors, a group, posts and comments."""
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            text='Тестовый пост',
+            author=cls.author,
+            group=cls.group,
+        )
+        cls.comment = Comment.objects.create(
+            post=cls.post,
+            author=cls.reader,
+            text='Тестовый комментарий',
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self) -> None:
+        """Creates a guest and an authorized client."""
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(ApiTests.reader)
+
+    def get_endpoints(self) -> dict:
+        """Returns the addresses of the endpoints and their fields."""
+        return {
+            reverse('posts:api_index'): POST_FIELDS,
+            reverse(
+                'posts:api_group_list',
+                kwargs={'slug': ApiTests.group.slug},
+            ): POST_FIELDS,
+            reverse(
+                'posts:api_profile',
+                kwargs={'username': ApiTests.author.username},
+            ): POST_FIELDS,
+            reverse('posts:api_follow_index'): POST_FIELDS,
+            reverse(
+                'posts:api_post_comments',
+                kwargs={'post_id': ApiTests.post.id},
+            ): COMMENT_FIELDS,
+        }
+
+    def create_posts(self, count: int) -> None:
+        """Adds posts with comments to the group of the author."""
+        for i in range(count):
+            post = Post.objects.create(
+                text=f'Пост {i}',
+                author=ApiTests.author,
+                group=ApiTests.group,
+            )
+            Comment.objects.create(
+                post=ApiTests.post,
+                author=ApiTests.reader,
+                text=f'Комментарий к посту {post.id}',
+            )
+
+    def count_queries(self) -> dict:
+        """Returns the number of queries every endpoint makes."""
+        counts = {}
+        for url in self.get_endpoints():
+            with CaptureQueriesContext(connection) as queries:
+                response = self.authorized_client.get(url)
+            self.assertEqual(response.status_code, HTTPStatus.OK)
+            counts[url] = len(queries)
+        return counts
+
+    def test_endpoints_return_objects_with_all_fields(self) -> None:
+        """Every endpoint returns its objects with every field."""
+        for url, fields in self.get_endpoints().items():
+            with self.subTest(url=url):
+                response = self.authorized_client.get(url)
+                self.assertEqual(response['Content-Type'], 'application/json')
+                data = response.json()
+                self.assertEqual(len(data['results']), 1)
+                self.assertEqual(set(data['results'][0]), set(fields))
+                self.assertIsNone(data['next'])
+
+    def test_post_is_serialized(self) -> None:
+        """The post is returned with the values of its fields."""
+        response = self.guest_client.get(reverse('posts:api_index'))
+        self.assertEqual(response.json()['results'][0], {
+            'id': ApiTests.post.id,
+            'text': ApiTests.post.text,
+            'pub_date': ApiTests.post.pub_date.isoformat(),
+            'author': ApiTests.author.username,
+            'group': ApiTests.group.slug,
+            'image': None,
+            'comments_count': 1,
+        })
+
+    def test_serialization_is_compact(self) -> None:
+        """The JSON has no extra spaces and keeps Cyrillic unescaped."""
+        response = self.guest_client.get(
+            reverse('posts:api_index'), {'fields': 'id,text'})
+        self.assertEqual(
+            response.content.decode(),
+            f'{{"results":[{{"id":{ApiTests.post.id},'
+            f'"text":"Тестовый пост"}}],"next":null,"previous":null}}',
+        )
+
+    def test_fields_skip_columns_and_joins(self) -> None:
+        """Only the columns and joins of the requested fields are queried."""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.guest_client.get(
+                reverse('posts:api_index'), {'fields': 'id,text'})
+        self.assertEqual(
+            response.json()['results'],
+            [{'id': ApiTests.post.id, 'text': ApiTests.post.text}],
+        )
+        sql = queries.captured_queries[-1]['sql']
+        self.assertNotIn('JOIN', sql)
+        self.assertNotIn('"image"', sql)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.guest_client.get(
+                reverse('posts:api_index'), {'fields': 'id,author'})
+        sql = queries.captured_queries[-1]['sql']
+        self.assertIn('"auth_user"', sql)
+        self.assertNotIn('"posts_group"', sql)
+
+    def test_invalid_parameters_are_rejected(self) -> None:
+        """Unknown fields and wrong limits are answered with 400."""
+        cases = (
+            {'fields': 'id,password'},
+            {'limit': '0'},
+            {'limit': 'many'},
+        )
+        for params in cases:
+            with self.subTest(params=params):
+                response = self.guest_client.get(
+                    reverse('posts:api_index'), params)
+                self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+                self.assertIn('detail', response.json())
+
+    def test_missing_objects_and_anonymous_follow_feed(self) -> None:
+        """Missing objects give 404 and the follow feed needs a login."""
+        cases = {
+            reverse('posts:api_group_list', kwargs={'slug': 'nope'}):
+                HTTPStatus.NOT_FOUND,
+            reverse('posts:api_profile', kwargs={'username': 'nope'}):
+                HTTPStatus.NOT_FOUND,
+            reverse('posts:api_post_comments', kwargs={'post_id': 0}):
+                HTTPStatus.NOT_FOUND,
+            reverse('posts:api_follow_index'): HTTPStatus.UNAUTHORIZED,
+        }
+        for url, status in cases.items():
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertEqual(response.status_code, status)
+
+    def test_cursors_walk_through_all_objects(self) -> None:
+        """Following the next cursors returns every object once."""
+        self.create_posts(API_PAGE_SIZE + 5)
+        for url in self.get_endpoints():
+            with self.subTest(url=url):
+                ids = []
+                params = {'fields': 'id', 'limit': 7}
+                while True:
+                    data = self.authorized_client.get(url, params).json()
+                    ids.extend(obj['id'] for obj in data['results'])
+                    if data['next'] is None:
+                        break
+                    params['after'] = data['next']
+                self.assertEqual(len(ids), len(set(ids)))
+                self.assertEqual(len(ids), API_PAGE_SIZE + 6)
+
+    def test_comments_go_from_the_oldest(self) -> None:
+        """Comments are returned in the order they were written."""
+        self.create_posts(3)
+        data = self.guest_client.get(reverse(
+            'posts:api_post_comments',
+            kwargs={'post_id': ApiTests.post.id},
+        )).json()
+        ids = [comment['id'] for comment in data['results']]
+        self.assertEqual(ids, sorted(ids))
+
+    def test_number_of_queries_does_not_depend_on_data(self) -> None:
+        """Every endpoint makes as many queries for one object as for many."""
+        queries_for_one = self.count_queries()
+        self.create_posts(API_PAGE_SIZE * 3)
+        self.assertEqual(self.count_queries(), queries_for_one)
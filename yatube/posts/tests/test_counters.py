@@ -0,0 +1,196 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import Client, TestCase, TransactionTestCase
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post, User, UserStats
+
+
+class CountersTests(TestCase):
+    """Checking that the denormalized counters follow the source tables."""
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        """Creates users and groups for tests."""
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group1 = Group.objects.create(
+            title='Первая тестовая группа',
+            slug='test-slug1',
+            description='Тестовое описание',
+        )
+        cls.group2 = Group.objects.create(
+            title='Вторая тестовая группа',
+            slug='test-slug2',
+            description='Тестовое описание',
+        )
+
+    def setUp(self) -> None:
+        """Creates clients for tests."""
+        self.authorized_client = Client()
+        self.authorized_client.force_login(CountersTests.author)
+        self.reader_client = Client()
+        self.reader_client.force_login(CountersTests.reader)
+
+    def assertCounters(self, obj, **expected) -> None:
+        """Checks the counters of the object stored in the database."""
+        obj.refresh_from_db()
+        for field, value in expected.items():
+            with self.subTest(obj=obj, field=field):
+                self.assertEqual(getattr(obj, field), value)
+
+    def test_post_create_and_delete_change_counters(self) -> None:
+        """Creating and deleting posts changes author and group counters."""
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Новый пост', 'group': CountersTests.group1.id},
+        )
+        stats = CountersTests.author.stats
+        self.assertCounters(stats, posts_count=1)
+        self.assertCounters(CountersTests.group1, posts_count=1)
+
+        Post.objects.get(text='Новый пост').delete()
+        self.assertCounters(stats, posts_count=0)
+        self.assertCounters(CountersTests.group1, posts_count=0)
+
+    def test_post_edit_moves_post_between_groups(self) -> None:
+        """Changing the group of the post moves it between group counters."""
+        post = Post.objects.create(
+            text='Тестовый пост',
+            author=CountersTests.author,
+            group=CountersTests.group1,
+        )
+        self.authorized_client.post(
+            reverse('posts:post_edit', kwargs={'post_id': post.id}),
+            data={'text': 'Тестовый пост', 'group': CountersTests.group2.id},
+        )
+        self.assertCounters(CountersTests.group1, posts_count=0)
+        self.assertCounters(CountersTests.group2, posts_count=1)
+        self.assertCounters(CountersTests.author.stats, posts_count=1)
+
+    def test_comments_are_counted(self) -> None:
+        """Adding a comment increases the counter of the post."""
+        post = Post.objects.create(
+            text='Тестовый пост',
+            author=CountersTests.author,
+        )
+        self.reader_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': post.id}),
+            data={'text': 'Тестовый комментарий'},
+        )
+        self.assertCounters(post, comments_count=1)
+
+        Comment.objects.filter(post=post).delete()
+        self.assertCounters(post, comments_count=0)
+
+    def test_follow_and_unfollow_change_counters(self) -> None:
+        """Subscriptions change the counters of both users."""
+        follow_url = reverse(
+            'posts:profile_follow',
+            kwargs={'username': CountersTests.author.username},
+        )
+        self.reader_client.get(follow_url)
+        self.reader_client.get(follow_url)
+        self.assertCounters(CountersTests.author.stats, followers_count=1)
+        self.assertCounters(CountersTests.reader.stats, following_count=1)
+
+        self.reader_client.get(reverse(
+            'posts:profile_unfollow',
+            kwargs={'username': CountersTests.author.username},
+        ))
+        self.assertCounters(CountersTests.author.stats, followers_count=0)
+        self.assertCounters(CountersTests.reader.stats, following_count=0)
+
+    def test_rebuild_counters_command(self) -> None:
+        """The command recalculates counters of rows created in bulk."""
+        Post.objects.bulk_create([
+            Post(
+                text=f'Текстовый пост №{i}',
+                author=CountersTests.author,
+                group=CountersTests.group1,
+            ) for i in range(3)
+        ])
+        post = Post.objects.filter(author=CountersTests.author).first()
+        Comment.objects.bulk_create([
+            Comment(text='Комментарий', author=CountersTests.reader,
+                    post=post)
+        ])
+        Follow.objects.bulk_create([
+            Follow(user=CountersTests.reader, author=CountersTests.author)
+        ])
+        UserStats.objects.filter(user=CountersTests.reader).delete()
+
+        call_command('rebuild_counters', stdout=StringIO())
+
+        self.assertCounters(
+            CountersTests.author.stats,
+            posts_count=3,
+            followers_count=1,
+            following_count=0,
+        )
+        self.assertCounters(
+            UserStats.objects.get(user=CountersTests.reader),
+            posts_count=0,
+            followers_count=0,
+            following_count=1,
+        )
+        self.assertCounters(CountersTests.group1, posts_count=3)
+        self.assertCounters(post, comments_count=1)
+
+    def test_rebuild_counters_of_many_users(self) -> None:
+        """
+        Stats are created for more users than SQLite inserts with one
+        statement.
+        """
+        User.objects.bulk_create(
+            User(username=f'user-{i}') for i in range(600))
+
+        call_command('rebuild_counters', stdout=StringIO())
+
+        self.assertFalse(User.objects.filter(stats__isnull=True).exists())
+
+    def test_profile_reads_count_without_counting_posts(self) -> None:
+        """The profile page takes the number of posts from the counters."""
+        Post.objects.create(text='Тестовый пост', author=CountersTests.author)
+        UserStats.objects.filter(user=CountersTests.author).update(
+            posts_count=42)
+        response = self.authorized_client.get(reverse(
+            'posts:profile',
+            kwargs={'username': CountersTests.author.username},
+        ))
+        self.assertEqual(response.context['count'], 42)
+
+
+class UserDeletionTests(TransactionTestCase):
+    """Checking that the counters let the users be deleted."""
+
+    def test_user_with_posts_and_follows_is_deleted(self) -> None:
+        """
+        Deleting a user removes their counters and updates the counters of
+        the users they were connected with.
+        """
+        user = User.objects.create_user(username='leaving')
+        other = User.objects.create_user(username='staying')
+        group = Group.objects.create(title='Группа', slug='group')
+        post = Post.objects.create(text='Пост', author=user, group=group)
+        Comment.objects.create(post=post, author=other, text='Комментарий')
+        other_post = Post.objects.create(text='Пост', author=other)
+        Comment.objects.create(post=other_post, author=user, text='Ответ')
+        Follow.objects.create(user=user, author=other)
+        Follow.objects.create(user=other, author=user)
+
+        user.delete()
+
+        self.assertFalse(UserStats.objects.filter(user_id=user.id).exists())
+        stats = UserStats.objects.get(user=other)
+        self.assertEqual(
+            (stats.posts_count, stats.followers_count,
+             stats.following_count),
+            (1, 0, 0),
+        )
+        other_post.refresh_from_db()
+        group.refresh_from_db()
+        self.assertEqual(other_post.comments_count, 0)
+        self.assertEqual(group.posts_count, 0)
@@ -0,0 +1,185 @@
+import csv
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime, timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from ..exporting import EXPORTS, iter_rows
+from ..models import Comment, Follow, Group, Post, User
+
+
+class ExportContentTests(TestCase):
+    """Checking the streaming export of posts and comments."""
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        """Creates posts of two authors published on different days."""
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.other = User.objects.create_user(username='other')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.start = timezone.make_aware(datetime(2021, 1, 1))
+        cls.posts = []
+        for index in range(6):
+            post = Post.objects.create(
+                text=f'Пост {index}, с запятой',
+                author=cls.author if index % 2 else cls.other,
+                group=cls.group if index < 3 else None,
+            )
+            # pub_date is set on creation, so the dates are changed after.
+            Post.objects.filter(id=post.id).update(
+                pub_date=cls.start + timedelta(days=index // 2))
+            cls.posts.append(post)
+        Comment.objects.create(
+            post=cls.posts[0], author=cls.author, text='Комментарий')
+
+    def setUp(self) -> None:
+        """Creates a directory for the exported files."""
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def export(self, name: str, model: str = 'post', **options) -> list:
+        """Runs the command and returns the lines of the unpacked file."""
+        path = os.path.join(self.directory, name)
+        call_command('export_content', path, model=model,
+                     stdout=StringIO(), **options)
+        with gzip.open(path, 'rt', encoding='utf-8') as file:
+            return file.read().splitlines()
+
+    def test_posts_are_exported_in_stable_order(self) -> None:
+        """Posts are ordered by date and id and match the import records."""
+        lines = self.export('posts.jsonl', chunk_size=4)
+
+        records = [json.loads(line) for line in lines]
+        self.assertEqual(
+            [record['id'] for record in records],
+            [post.id for post in ExportContentTests.posts],
+        )
+        self.assertEqual(records[0], {
+            'id': ExportContentTests.posts[0].id,
+            'text': 'Пост 0, с запятой',
+            'author': 'other',
+            'group': 'test-slug',
+            'pub_date': ExportContentTests.start.isoformat(),
+        })
+
+    def test_failed_export_raises_its_error(self) -> None:
+        """A file that cannot be created fails with its own error."""
+        path = os.path.join(self.directory, 'posts.jsonl')
+        with mock.patch(
+                'posts.management.commands.export_content.open',
+                side_effect=PermissionError('Нет доступа'), create=True):
+            with self.assertRaisesMessage(PermissionError, 'Нет доступа'):
+                call_command('export_content', path, model='post',
+                             stdout=StringIO())
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_csv_export_has_header(self) -> None:
+        """CSV files start with the names of the columns."""
+        lines = self.export('comments.csv', model='comment')
+
+        rows = list(csv.reader(lines))
+        self.assertEqual(rows[0], list(EXPORTS['comment'].columns))
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[1][3], 'Комментарий')
+
+    def test_filters(self) -> None:
+        """Only the posts of the author, group and dates are exported."""
+        cases = {
+            'author': ({'author': 'auth'}, {1, 3, 5}),
+            'group': ({'group': 'test-slug'}, {0, 1, 2}),
+            'dates': ({'since': '2021-01-02', 'until': '2021-01-03'}, {2, 3}),
+        }
+        for name, (options, indexes) in cases.items():
+            with self.subTest(filter=name):
+                lines = self.export(f'{name}.jsonl', **options)
+                self.assertEqual(
+                    {json.loads(line)['id'] for line in lines},
+                    {ExportContentTests.posts[index].id for index in indexes},
+                )
+
+    def test_watermark_exports_only_new_rows(self) -> None:
+        """A second run with the watermark emits only the posts added since."""
+        watermark = os.path.join(self.directory, 'posts.watermark')
+        self.assertEqual(len(self.export('first.jsonl', watermark=watermark)),
+                         len(ExportContentTests.posts))
+
+        new_post = Post.objects.create(text='Новый пост', author=self.author)
+        lines = self.export('second.jsonl', watermark=watermark)
+
+        self.assertEqual([json.loads(line)['id'] for line in lines],
+                         [new_post.id])
+        self.assertEqual(self.export('third.jsonl', watermark=watermark), [])
+
+    def test_rows_are_read_in_chunks(self) -> None:
+        """Every chunk is a separate query limited to the chunk size."""
+        spec = EXPORTS['post']
+        with CaptureQueriesContext(connection) as queries:
+            rows = list(iter_rows(spec, Post.objects.all(), chunk_size=4))
+
+        self.assertEqual(len(rows), len(ExportContentTests.posts))
+        self.assertEqual(len(queries), 2)
+        for query in queries:
+            self.assertIn('LIMIT 4', query['sql'])
+
+    def test_admin_action_streams_selected_posts(self) -> None:
+        """The admin downloads the selected posts as a gzipped file."""
+        admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+        self.client.force_login(admin)
+        selected = ExportContentTests.posts[:2]
+
+        response = self.client.post(
+            reverse('admin:posts_post_changelist'),
+            {
+                'action': 'export_jsonl',
+                '_selected_action': [post.id for post in selected],
+            },
+        )
+
+        self.assertTrue(response.streaming)
+        self.assertIn('attachment', response['Content-Disposition'])
+        lines = gzip.decompress(
+            b''.join(response.streaming_content)).decode().splitlines()
+        self.assertEqual([json.loads(line)['id'] for line in lines],
+                         [post.id for post in selected])
+
+    def test_admin_actions_export_every_model(self) -> None:
+        """Comments, subscriptions and groups are exported by the admin."""
+        admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+        self.client.force_login(admin)
+        Follow.objects.create(
+            user=ExportContentTests.author, author=ExportContentTests.other)
+        models = (Comment, Follow, Group)
+        for model in models:
+            for action in ('export_jsonl', 'export_csv'):
+                with self.subTest(model=model.__name__, action=action):
+                    selected = list(model.objects.values_list(
+                        'id', flat=True))
+                    url = reverse(
+                        f'admin:posts_{model._meta.model_name}_changelist')
+                    self.assertContains(self.client.get(url), action)
+                    response = self.client.post(
+                        url, {'action': action, '_selected_action': selected})
+                    self.assertTrue(response.streaming)
+                    lines = gzip.decompress(b''.join(
+                        response.streaming_content)).decode().splitlines()
+                    if action == 'export_csv':
+                        lines = lines[1:]
+                    self.assertEqual(len(lines), len(selected))
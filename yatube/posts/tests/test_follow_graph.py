@@ -0,0 +1,140 @@
+from array import array
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import Client, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .. import follow_graph
+from ..models import Follow, User
+from ..timelines import rebuild_timeline
+
+
+class FollowGraphTests(TestCase):
+    """Checking the cached follow graph."""
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        """Creates two authors and a follower."""
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.other_author = User.objects.create_user(username='other')
+        cls.follower = User.objects.create_user(username='follower')
+
+    def setUp(self) -> None:
+        """Subscribes the follower to the author with an empty cache."""
+        cache.clear()
+        Follow.objects.create(
+            user=FollowGraphTests.follower,
+            author=FollowGraphTests.author,
+        )
+        self.follower_client = Client()
+        self.follower_client.force_login(FollowGraphTests.follower)
+
+    def test_graph_is_read_once(self) -> None:
+        """The followed authors are read from the database only once."""
+        follower_id = FollowGraphTests.follower.id
+        with self.assertNumQueries(1):
+            ids = follow_graph.get_following_ids(follower_id)
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                follow_graph.get_following_ids(follower_id), ids)
+            self.assertTrue(follow_graph.is_following(
+                follower_id, FollowGraphTests.author.id))
+            self.assertFalse(follow_graph.is_following(
+                follower_id, FollowGraphTests.other_author.id))
+        self.assertEqual(ids, {FollowGraphTests.author.id})
+
+    def test_graph_follows_subscriptions(self) -> None:
+        """Following and unfollowing through the views update the graph."""
+        follower_id = FollowGraphTests.follower.id
+        author_id = FollowGraphTests.author.id
+        other_id = FollowGraphTests.other_author.id
+        follow_graph.get_following_ids(follower_id)
+        steps = (
+            ('posts:profile_follow', 'other', {author_id, other_id}),
+            ('posts:profile_unfollow', 'auth', {other_id}),
+            ('posts:profile_unfollow', 'other', set()),
+        )
+        for name, username, expected in steps:
+            with self.subTest(name=name, username=username):
+                self.follower_client.get(
+                    reverse(name, kwargs={'username': username}))
+                self.assertEqual(
+                    follow_graph.get_following_ids(follower_id), expected)
+
+    def test_profile_shows_subscription_from_graph(self) -> None:
+        """The profile reads the subscription from the cached graph."""
+        follow_graph.get_following_ids(FollowGraphTests.follower.id)
+        for username, following in (('auth', True), ('other', False)):
+            with self.subTest(username=username):
+                response = self.follower_client.get(
+                    reverse('posts:profile', kwargs={'username': username}))
+                self.assertEqual(response.context['following'], following)
+
+    def test_stale_graph_does_not_skip_writes(self) -> None:
+        """
+        Following and unfollowing write to the database even when the
+        cached graph of another process is outdated.
+        """
+        follower = FollowGraphTests.follower
+        follower_id = follower.id
+        follow_graph.get_following_ids(follower_id)
+        Follow.objects.filter(user=follower).delete()
+        # An outdated graph, as the cache of another process may hold.
+        cache.set(follow_graph._key(follower_id), array(
+            follow_graph.ID_TYPECODE, [FollowGraphTests.other_author.id]))
+        self.follower_client.get(
+            reverse('posts:profile_follow', kwargs={'username': 'other'}))
+        self.follower_client.get(
+            reverse('posts:profile_unfollow', kwargs={'username': 'other'}))
+        self.follower_client.get(
+            reverse('posts:profile_follow', kwargs={'username': 'auth'}))
+        self.assertEqual(
+            list(Follow.objects.filter(user=follower).values_list(
+                'author_id', flat=True)),
+            [FollowGraphTests.author.id],
+        )
+
+    def test_follow_feed_reads_graph(self) -> None:
+        """The follow feed picks the authors from the cached graph."""
+        follow_graph.get_following_ids(FollowGraphTests.follower.id)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.follower_client.get(reverse('posts:follow_index'))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([
+            query['sql'] for query in queries.captured_queries
+            if 'posts_follow' in query['sql']
+        ])
+
+    def test_bulk_changes_are_picked_up_on_rebuild(self) -> None:
+        """Rebuilding the feed forgets the graph changed in bulk."""
+        follower_id = FollowGraphTests.follower.id
+        follow_graph.get_following_ids(follower_id)
+        Follow.objects.bulk_create([Follow(
+            user=FollowGraphTests.follower,
+            author=FollowGraphTests.other_author,
+        )])
+        self.assertNotIn(FollowGraphTests.other_author.id,
+                         follow_graph.get_following_ids(follower_id))
+        rebuild_timeline(follower_id)
+        self.assertIn(FollowGraphTests.other_author.id,
+                      follow_graph.get_following_ids(follower_id))
+
+
+class FollowGraphTransactionTests(TransactionTestCase):
+    """Checking the cached follow graph around transactions."""
+
+    def test_graph_is_forgotten_on_commit(self) -> None:
+        """A graph cached by a read before the commit is removed."""
+        cache.clear()
+        author = User.objects.create_user(username='auth')
+        follower = User.objects.create_user(username='follower')
+        with transaction.atomic():
+            Follow.objects.create(user=follower, author=author)
+            # A concurrent read caches the graph without the subscription.
+            cache.set(follow_graph._key(follower.id),
+                      array(follow_graph.ID_TYPECODE))
+        self.assertEqual(
+            follow_graph.get_following_ids(follower.id), {author.id})
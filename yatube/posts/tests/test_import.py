@@ -0,0 +1,195 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from ..importing import IdMap, Importer
+from ..models import (Comment, Follow, Group, ImportCheckpoint, Post,
+                      TimelineEntry, User)
+
+
+class ImportContentTests(TestCase):
+    """Checking the bulk import of posts, comments and subscriptions."""
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        """Creates the users and the group the records refer to."""
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+
+    def setUp(self) -> None:
+        """Creates a directory for the files to import."""
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def write_file(self, name: str, content: str) -> str:
+        """Writes the file to import and returns its path."""
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(content)
+        return path
+
+    def write_jsonl(self, name: str, records: list) -> str:
+        """Writes the records as JSON lines and returns the path."""
+        return self.write_file(name, ''.join(
+            json.dumps(record, ensure_ascii=False) + '\n'
+            for record in records
+        ))
+
+    def import_content(self, path: str, model: str, **options) -> str:
+        """Runs the command and returns its error output."""
+        stderr = StringIO()
+        call_command(
+            'import_content', path, model=model,
+            stdout=StringIO(), stderr=stderr, **options,
+        )
+        return stderr.getvalue()
+
+    def test_posts_are_imported_with_their_dates(self) -> None:
+        """Posts refer to authors and groups by name and keep the dates."""
+        path = self.write_jsonl('posts.jsonl', [
+            {
+                'text': 'Старый пост',
+                'author': 'auth',
+                'group': 'test-slug',
+                'pub_date': '2015-06-01T10:00:00+00:00',
+            },
+            {'text': 'Пост без группы', 'author': 'auth'},
+            {'text': 'Пост незнакомца', 'author': 'stranger'},
+            {'author': 'auth'},
+        ])
+        errors = self.import_content(path, 'post', batch_size=3)
+
+        self.assertEqual(Post.objects.count(), 2)
+        old_post = Post.objects.get(text='Старый пост')
+        self.assertEqual(old_post.group, ImportContentTests.group)
+        self.assertEqual(old_post.pub_date.year, 2015)
+        self.assertIsNone(Post.objects.get(text='Пост без группы').group)
+        self.assertIn('Запись 3', errors)
+        self.assertIn('Запись 4', errors)
+
+        ImportContentTests.author.stats.refresh_from_db()
+        ImportContentTests.group.refresh_from_db()
+        self.assertEqual(ImportContentTests.author.stats.posts_count, 2)
+        self.assertEqual(ImportContentTests.group.posts_count, 1)
+
+    def test_comments_are_imported_from_csv(self) -> None:
+        """Comments are read from CSV and counted on their posts."""
+        post = Post.objects.create(text='Пост', author=self.author)
+        path = self.write_file(
+            'comments.csv',
+            'post,author,text,created\n'
+            f'{post.id},reader,"Первый, с запятой",2020-01-01T00:00:00\n'
+            f'{post.id},reader,"Многострочный\nкомментарий",\n'
+            '0,reader,Комментарий к пропавшему посту,\n',
+        )
+        errors = self.import_content(path, 'comment')
+
+        self.assertEqual(
+            set(Comment.objects.values_list('text', flat=True)),
+            {'Первый, с запятой', 'Многострочный\nкомментарий'},
+        )
+        self.assertEqual(
+            Comment.objects.get(text__startswith='Первый').created.year, 2020)
+        self.assertIn('Запись 3', errors)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 2)
+
+    def test_follows_are_imported_with_feeds(self) -> None:
+        """Subscriptions skip duplicates and fill the follow feeds."""
+        post = Post.objects.create(text='Пост', author=self.author)
+        path = self.write_jsonl('follows.jsonl', [
+            {'user': 'reader', 'author': 'auth'},
+            {'user': 'reader', 'author': 'auth'},
+            {'user': 'auth', 'author': 'auth'},
+        ])
+        errors = self.import_content(path, 'follow')
+
+        self.assertEqual(Follow.objects.count(), 1)
+        self.assertIn('Запись 3', errors)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=ImportContentTests.reader, post=post).exists())
+        ImportContentTests.reader.stats.refresh_from_db()
+        self.assertEqual(ImportContentTests.reader.stats.following_count, 1)
+
+    def test_failed_import_is_resumed(self) -> None:
+        """A rerun continues after the last committed batch."""
+        path = self.write_jsonl('posts.jsonl', [
+            {'text': f'Пост {i}', 'author': 'auth'} for i in range(7)
+        ])
+        import_batch = Importer.import_batch
+        calls = []
+
+        def failing_import_batch(importer, records, on_error):
+            calls.append(len(records))
+            if len(calls) == 2:
+                raise RuntimeError('Соединение потеряно')
+            return import_batch(importer, records, on_error)
+
+        with mock.patch.object(Importer, 'import_batch',
+                               failing_import_batch):
+            with self.assertRaises(RuntimeError):
+                self.import_content(path, 'post', batch_size=3)
+        self.assertEqual(Post.objects.count(), 3)
+        self.assertTrue(ImportCheckpoint.objects.filter(name=path).exists())
+
+        self.import_content(path, 'post', batch_size=3)
+
+        self.assertEqual(
+            sorted(Post.objects.values_list('text', flat=True)),
+            [f'Пост {i}' for i in range(7)],
+        )
+        self.assertFalse(ImportCheckpoint.objects.exists())
+
+    def test_resumed_import_rebuilds_feeds_of_first_run(self) -> None:
+        """
+        The feeds of the followers of the authors imported before
+        the failure are rebuilt when the import is resumed.
+        """
+        Follow.objects.create(
+            user=ImportContentTests.reader, author=ImportContentTests.author)
+        path = self.write_jsonl('posts.jsonl', [
+            {'text': f'Пост {i}', 'author': 'auth' if i < 3 else 'reader'}
+            for i in range(6)
+        ])
+        import_batch = Importer.import_batch
+
+        def failing_import_batch(importer, records, on_error):
+            if records[0]['author'] == 'reader':
+                raise RuntimeError('Соединение потеряно')
+            return import_batch(importer, records, on_error)
+
+        with mock.patch.object(Importer, 'import_batch',
+                               failing_import_batch):
+            with self.assertRaises(RuntimeError):
+                self.import_content(path, 'post', batch_size=3)
+        self.import_content(path, 'post', batch_size=3)
+
+        self.assertEqual(
+            TimelineEntry.objects.filter(
+                user=ImportContentTests.reader).count(),
+            3,
+        )
+
+    def test_id_map_forgets_least_recently_used_keys(self) -> None:
+        """The map keeps at most max_size keys, the recently used ones."""
+        users = IdMap(User.objects.all(), 'username', max_size=1)
+        users.load(['auth'])
+        users.load(['reader'])
+        self.assertEqual(list(users.ids), ['reader'])
+        with self.assertNumQueries(0):
+            self.assertEqual(users['reader'], ImportContentTests.reader.id)
+        with self.assertNumQueries(1):
+            users.load(['auth', 'reader'])
+        self.assertEqual(users['auth'], ImportContentTests.author.id)
@@ -0,0 +1,162 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.test import Client, TestCase, TransactionTestCase
+from django.urls import reverse
+
+from core.metrics import OBJECT_CACHE_REQUESTS
+
+from .. import object_cache
+from ..models import Comment, Group, Post, User
+
+
+class ObjectCacheTests(TestCase):
+    """Checking the object cache of the feed pages."""
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        """Creates an author, a group and their posts."""
+        super().setUpClass()
+        cls.author = User.objects.create_user(
+            username='auth', first_name='Лев', last_name='Толстой')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.posts = [
+            Post.objects.create(
+                text=f'Пост №{index}',
+                author=cls.author,
+                group=cls.group if index % 2 else None,
+            )
+            for index in range(3)
+        ]
+
+    def setUp(self) -> None:
+        """Starts every test with an empty cache."""
+        cache.clear()
+
+    def get_keys(self) -> list:
+        """Returns the posts of the author read by the first phase."""
+        return list(object_cache.select_post_keys(
+            Post.objects.filter(author=ObjectCacheTests.author)))
+
+    def test_posts_are_read_from_cache(self) -> None:
+        """A warm cache hydrates the posts without queries."""
+        keys = self.get_keys()
+        with self.assertNumQueries(1):
+            cold = object_cache.hydrate_posts(keys)
+        with self.assertNumQueries(0):
+            warm = object_cache.hydrate_posts(keys)
+            authors = [post.author.get_full_name() for post in warm]
+            groups = [post.group and post.group.slug for post in warm]
+        self.assertEqual(warm, cold)
+        self.assertEqual([post.id for post in warm],
+                         [post.id for post in keys])
+        self.assertEqual(authors, ['Лев Толстой'] * 3)
+        self.assertEqual(groups, [
+            post.group and post.group.slug
+            for post in Post.objects.filter(author=ObjectCacheTests.author)
+        ])
+
+    def test_changes_remove_objects_from_cache(self) -> None:
+        """Saved and counted objects are read from the database again."""
+        keys = self.get_keys()
+        post = ObjectCacheTests.posts[0]
+        changes = {
+            'post': lambda: Post.objects.filter(pk=post.pk).first().save(),
+            'author': lambda: ObjectCacheTests.author.save(),
+            'group': lambda: ObjectCacheTests.group.save(),
+            'comment': lambda: Comment.objects.create(
+                post=post, author=ObjectCacheTests.author, text='Текст'),
+        }
+        for name, change in changes.items():
+            with self.subTest(change=name):
+                object_cache.hydrate_posts(keys)
+                change()
+                with self.assertNumQueries(1):
+                    object_cache.hydrate_posts(keys)
+
+    def test_renamed_author_is_shown(self) -> None:
+        """A renamed author is shown with the new name."""
+        keys = self.get_keys()
+        object_cache.hydrate_posts(keys)
+        author = User.objects.get(pk=ObjectCacheTests.author.pk)
+        author.first_name = 'Алексей'
+        author.save()
+        post = object_cache.hydrate_posts(keys)[0]
+        self.assertEqual(post.author.get_full_name(), 'Алексей Толстой')
+
+    def test_deleted_group_is_forgotten_by_posts(self) -> None:
+        """The posts of a deleted group are read without the group."""
+        object_cache.hydrate_posts(self.get_keys())
+        Group.objects.filter(pk=ObjectCacheTests.group.pk).delete()
+        keys = self.get_keys()
+        with self.assertNumQueries(1):
+            posts = object_cache.hydrate_posts(keys)
+        self.assertEqual([post.group for post in posts], [None] * 3)
+
+    def test_deleted_posts_are_left_out(self) -> None:
+        """Posts deleted after the first phase are not hydrated."""
+        keys = self.get_keys()
+        Post.objects.filter(pk=keys[0].pk).delete()
+        self.assertEqual(
+            [post.id for post in object_cache.hydrate_posts(keys)],
+            [post.id for post in keys[1:]],
+        )
+
+    def test_hit_ratio_is_counted(self) -> None:
+        """The hits and misses of every model are counted."""
+        def samples() -> dict:
+            """Returns the samples of the counter."""
+            return dict(OBJECT_CACHE_REQUESTS._samples)
+
+        keys = self.get_keys()
+        before = samples()
+        object_cache.hydrate_posts(keys)
+        object_cache.hydrate_posts(keys)
+        after = samples()
+        expected = {
+            ('posts.post', 'miss'): 3,
+            ('posts.post', 'hit'): 3,
+            ('auth.user', 'miss'): 1,
+            ('auth.user', 'hit'): 1,
+            ('posts.group', 'miss'): 1,
+            ('posts.group', 'hit'): 1,
+        }
+        for labels, count in expected.items():
+            with self.subTest(labels=labels):
+                self.assertEqual(
+                    after.get(labels, 0) - before.get(labels, 0), count)
+
+    def test_cached_fragment_reads_no_posts(self) -> None:
+        """A page whose fragment is cached does not hydrate its posts."""
+        url = reverse('posts:group_list', kwargs={'slug': 'test-slug'})
+        client = Client()
+        client.get(url)
+        cache.delete_many([
+            object_cache._key(Post, post.pk)
+            for post in ObjectCacheTests.posts
+        ], version=object_cache.OBJECT_CACHE_VERSION)
+        response = client.get(url)
+        self.assertContains(response, 'Пост №1')
+        self.assertIsNone(response.context['page_obj'].object_list._hydrated)
+
+
+class ObjectCacheTransactionTests(TransactionTestCase):
+    """Checking the object cache around transactions."""
+
+    def test_objects_are_forgotten_on_commit(self) -> None:
+        """An object cached by a read before the commit is removed."""
+        cache.clear()
+        author = User.objects.create_user(username='auth')
+        post = Post.objects.create(text='Старый текст', author=author)
+        key = object_cache._key(Post, post.pk)
+        with transaction.atomic():
+            post.text = 'Новый текст'
+            post.save()
+            # A concurrent read caches the row without the change.
+            cache.set(key, Post.objects.get(pk=post.pk),
+                      version=object_cache.OBJECT_CACHE_VERSION)
+        self.assertIsNone(
+            cache.get(key, version=object_cache.OBJECT_CACHE_VERSION))
@@ -0,0 +1,194 @@
+import shutil
+import tempfile
+from http import HTTPStatus
+from typing import Dict, List, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.benchmarks import get_view_names
+
+from ..models import Comment, Follow, Group, Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+# Number of posts and comments of every author in the small and the large
+# dataset. The large one fills more than one page of every feed.
+SMALL_DATASET = 2
+LARGE_DATASET = 25
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class QueryBudgetTests(TestCase):
+    """
+    Checking the number of queries of every view.
+
+    Every view is requested with a small and a large dataset, the number of
+    queries must be the same for both and must not exceed the budget of
+    the view. A query repeated for every post or comment of the page, N+1,
+    makes the numbers differ.
+    """
+
+    # Methods and names of the views, their arguments, parameters or posted
+    # data and the maximal number of queries. None stands for the id of
+    # the commented post or of its group. The requests are made by an admin
+    # who wrote the post and follows the authors. With the empty cache
+    # the feed pages read the keys of the posts and then the posts missing
+    # from the object cache. The subscription to the other author is
+    # removed before it is added again, so both requests change the data
+    # every time.
+    BUDGETS: Dict[Tuple[str, str], Tuple[dict, dict, int]] = {
+        ('get', 'posts:index'): ({}, {}, 6),
+        ('get', 'posts:group_list'): ({'slug': 'test-slug'}, {}, 8),
+        ('get', 'posts:profile'): ({'username': 'auth'}, {}, 9),
+        ('get', 'posts:post_detail'): ({'post_id': None}, {}, 5),
+        ('get', 'posts:post_comments'): ({'post_id': None}, {}, 2),
+        ('get', 'posts:follow_index'): ({}, {}, 9),
+        ('get', 'posts:search'): ({}, {'q': 'кот'}, 5),
+        ('get', 'posts:post_create'): ({}, {}, 3),
+        ('post', 'posts:post_create'): ({}, {'text': 'Новый пост'}, 8),
+        ('get', 'posts:post_edit'): ({'post_id': None}, {}, 4),
+        ('post', 'posts:post_edit'): (
+            {'post_id': None}, {'text': 'Пост про кота', 'group': None}, 8),
+        ('post', 'posts:add_comment'): (
+            {'post_id': None}, {'text': 'Комментарий'}, 7),
+        ('get', 'posts:profile_unfollow'): ({'username': 'other'}, {}, 9),
+        ('get', 'posts:profile_follow'): ({'username': 'other'}, {}, 13),
+        ('get', 'posts:api_index'): ({}, {}, 1),
+        ('get', 'posts:api_post_comments'): ({'post_id': None}, {}, 2),
+        ('get', 'posts:api_group_list'): ({'slug': 'test-slug'}, {}, 2),
+        ('get', 'posts:api_profile'): ({'username': 'auth'}, {}, 2),
+        ('get', 'posts:api_follow_index'): ({}, {}, 6),
+        ('get', 'users:signup'): ({}, {}, 2),
+        ('get', 'users:login'): ({}, {}, 2),
+        ('get', 'about:author'): ({}, {}, 2),
+        ('get', 'about:tech'): ({}, {}, 2),
+        ('get', 'admin:posts_post_changelist'): ({}, {}, 7),
+    }
+    # Views that are not measured and the reasons.
+    SKIPPED_VIEWS = {
+        'users:logout': 'ends the session of the client',
+    }
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        """Creates the authors, their reader and the commented post."""
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.other_author = User.objects.create_user(username='other')
+        cls.reader = User.objects.create_superuser(
+            'reader', 'reader@example.com', 'password')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        Follow.objects.create(user=cls.reader, author=cls.other_author)
+        cls.post = Post.objects.create(
+            text='Пост про кота', author=cls.reader, group=cls.group)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self) -> None:
+        """Creates a client of the reader."""
+        self.client = Client()
+        self.client.force_login(QueryBudgetTests.reader)
+        self.seeded = 0
+
+    def seed(self, size: int) -> None:
+        """
+        Adds posts and comments until every author has the size of them.
+        Every post has an image and every other one has a group.
+        """
+        for index in range(self.seeded, size):
+            for author in (QueryBudgetTests.author,
+                           QueryBudgetTests.other_author):
+                Post.objects.create(
+                    text=f'Пост про кота №{index}',
+                    author=author,
+                    group=QueryBudgetTests.group if index % 2 else None,
+                    image=SimpleUploadedFile(
+                        f'small-{index}.gif', SMALL_GIF, 'image/gif'),
+                )
+                commenter = User.objects.create_user(
+                    username=f'commenter-{author.username}-{index}')
+                Comment.objects.create(
+                    post=QueryBudgetTests.post,
+                    author=commenter,
+                    text=f'Комментарий №{index}',
+                )
+        self.seeded = size
+
+    def get_queries(self, view: Tuple[str, str]) -> List[str]:
+        """Requests the view with an empty cache and returns its queries."""
+        method, name = view
+        kwargs, params, _ = self.BUDGETS[view]
+        ids = {
+            'post_id': QueryBudgetTests.post.id,
+            'group': QueryBudgetTests.group.id,
+        }
+        kwargs, params = (
+            {key: ids[key] if value is None else value
+             for key, value in values.items()}
+            for values in (kwargs, params)
+        )
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(
+                reverse(name, kwargs=kwargs), params)
+        self.assertIn(
+            response.status_code, (HTTPStatus.OK, HTTPStatus.FOUND), view)
+        if response.status_code == HTTPStatus.FOUND:
+            self.assertNotIn(settings.LOGIN_URL, response.url, view)
+        return [query['sql'] for query in queries.captured_queries]
+
+    def test_every_view_has_budget(self) -> None:
+        """Every named URL of the site has a budget or is skipped."""
+        budgeted = {name for _, name in self.BUDGETS}
+        self.assertEqual(
+            set(get_view_names()) - budgeted - set(self.SKIPPED_VIEWS),
+            set(),
+        )
+
+    def test_views_stay_within_query_budgets(self) -> None:
+        """The number of queries depends on neither the data nor the page."""
+        counts = {}
+        self.seed(SMALL_DATASET)
+        for view in self.BUDGETS:
+            counts[view] = len(self.get_queries(view))
+
+        self.seed(LARGE_DATASET)
+        for view, (_, _, budget) in self.BUDGETS.items():
+            with self.subTest(view=view):
+                queries = self.get_queries(view)
+                listing = '\n'.join(
+                    f'{number}. {sql}'
+                    for number, sql in enumerate(queries, 1)
+                )
+                self.assertEqual(
+                    len(queries), counts[view],
+                    f'{view} issues {counts[view]} queries with the small '
+                    f'dataset and {len(queries)} with the large one:\n'
+                    f'{listing}',
+                )
+                self.assertLessEqual(
+                    len(queries), budget,
+                    f'{view} exceeds the budget of {budget} queries:\n'
+                    f'{listing}',
+                )
@@ -0,0 +1,131 @@
+import re
+from typing import List
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post, User
+from ..paginator import COMMENT_ORDERING, KeysetPaginator
+
+APP_TABLE_PREFIX = 'posts_'
+FULL_SCAN = re.compile(r'\bSCAN (?:TABLE )?(\w+)(?: AS \w+)?$')
+TEMP_SORT = 'USE TEMP B-TREE FOR ORDER BY'
+
+
+class QueryPlansTests(TestCase):
+    """
+    Checking that the queries of the views are served by indexes.
+
+    Every SELECT issued by a view is explained with EXPLAIN QUERY PLAN, the
+    check fails if a table of the app is scanned without an index or the
+    rows are sorted in a temporary b-tree. No query is exempt: the pages
+    hydrated by primary keys are read without ordering.
+    """
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        """Creates posts, comments and subscriptions."""
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.post = Post.objects.create(
+            text='Тестовый пост',
+            author=cls.author,
+            group=cls.group,
+        )
+        Post.objects.bulk_create([
+            Post(text=f'Пост {i}', author=cls.author, group=cls.group)
+            for i in range(15)
+        ])
+        cls.comment = Comment.objects.create(
+            text='Тестовый комментарий',
+            author=cls.reader,
+            post=cls.post,
+        )
+
+    def setUp(self) -> None:
+        """
+        Creates a client of the subscribed user with an empty cache, so
+        the queries of the pages are not skipped.
+        """
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(QueryPlansTests.reader)
+
+    def explain(self, sql: str) -> List[str]:
+        """
+        Returns the steps of the query plan of a captured query, the
+        parameters of which are already substituted into the SQL.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return [row[-1] for row in cursor.fetchall()]
+
+    def get_plan_problems(self, address: str, params: dict) -> List[str]:
+        """Requests the page and returns the regressed steps of its plans."""
+        with CaptureQueriesContext(connection) as queries:
+            self.authorized_client.get(address, params)
+
+        problems = []
+        for query in queries.captured_queries:
+            sql = query['sql']
+            if not sql.lstrip().upper().startswith('SELECT'):
+                continue
+            if APP_TABLE_PREFIX not in sql:
+                continue
+            for step in self.explain(sql):
+                full_scan = FULL_SCAN.search(step)
+                if full_scan and full_scan.group(1).startswith(
+                        APP_TABLE_PREFIX):
+                    problems.append(f'{step}: {sql}')
+                if TEMP_SORT in step:
+                    problems.append(f'{step}: {sql}')
+        return problems
+
+    def test_views_do_not_scan_app_tables(self) -> None:
+        """The feed and post pages use indexes for every query."""
+        post_cursor = KeysetPaginator(Post.objects.all(), 1).encode_cursor(
+            QueryPlansTests.post)
+        comment_cursor = KeysetPaginator(
+            Comment.objects.all(), 1, COMMENT_ORDERING
+        ).encode_cursor(QueryPlansTests.comment)
+        views = (
+            (reverse('posts:index'), {}),
+            (reverse('posts:index'), {'page': 2}),
+            (reverse('posts:index'), {'after': ''}),
+            (reverse('posts:index'), {'after': post_cursor}),
+            (
+                reverse('posts:group_list',
+                        kwargs={'slug': QueryPlansTests.group.slug}),
+                {'page': 2},
+            ),
+            (
+                reverse('posts:profile',
+                        kwargs={'username': QueryPlansTests.author.username}),
+                {'page': 2},
+            ),
+            (
+                reverse('posts:post_detail',
+                        kwargs={'post_id': QueryPlansTests.post.id}),
+                {},
+            ),
+            (
+                reverse('posts:post_comments',
+                        kwargs={'post_id': QueryPlansTests.post.id}),
+                {'after': comment_cursor},
+            ),
+            (reverse('posts:follow_index'), {'page': 2}),
+        )
+        for address, params in views:
+            with self.subTest(address=address, params=params):
+                problems = self.get_plan_problems(address, params)
+                self.assertEqual(problems, [], '\n'.join(problems))
@@ -0,0 +1,158 @@
+from io import StringIO
+
+from django.contrib.admin.sites import site
+from django.core.management import call_command
+from django.core.management.sql import emit_post_migrate_signal
+from django.db import connection
+from django.test import Client, RequestFactory, TestCase
+from django.urls import reverse
+
+from ..models import Post, User
+from ..search import SEARCH_TABLE, get_missing_search_objects
+
+
+class SearchTests(TestCase):
+    """Checking the full-text search of posts."""
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        """Creates posts with different texts."""
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.cat_post = Post.objects.create(
+            text='Кот спит на диване',
+            author=cls.author,
+        )
+        cls.dog_post = Post.objects.create(
+            text='Собака гуляет во дворе',
+            author=cls.author,
+        )
+        cls.cats_post = Post.objects.create(
+            text='Кот и ещё один кот, кот повсюду',
+            author=cls.author,
+        )
+
+    def setUp(self) -> None:
+        """Creates a guest client."""
+        self.guest_client = Client()
+
+    def search(self, query: str, **params) -> list:
+        """Returns the posts of the search page for the query."""
+        response = self.guest_client.get(
+            reverse('posts:search'), {'q': query, **params})
+        return list(response.context['page_obj'])
+
+    def test_search_finds_posts_with_all_words(self) -> None:
+        """Only the posts containing every word of the query are found."""
+        cases = {
+            'кот': {SearchTests.cat_post, SearchTests.cats_post},
+            'КОТ диван': {SearchTests.cat_post},
+            'собак': {SearchTests.dog_post},
+            'кот собака': set(),
+            '"кот*" ^(': {SearchTests.cat_post, SearchTests.cats_post},
+        }
+        for query, expected in cases.items():
+            with self.subTest(query=query):
+                self.assertEqual(set(self.search(query)), expected)
+
+    def test_search_orders_posts_by_relevance(self) -> None:
+        """The post mentioning the word more often goes first."""
+        self.assertEqual(
+            self.search('кот'),
+            [SearchTests.cats_post, SearchTests.cat_post],
+        )
+
+    def test_search_page_without_query(self) -> None:
+        """The page without a query shows only the form."""
+        response = self.guest_client.get(reverse('posts:search'))
+        self.assertTemplateUsed(response, 'posts/search.html')
+        self.assertIsNone(response.context['page_obj'])
+
+    def test_index_follows_changes_of_posts(self) -> None:
+        """Created, edited and deleted posts are reindexed by triggers."""
+        post = Post.objects.create(text='Попугай поёт', author=self.author)
+        self.assertEqual(self.search('попугай'), [post])
+
+        Post.objects.filter(id=post.id).update(text='Хомяк молчит')
+        self.assertEqual(self.search('попугай'), [])
+        self.assertEqual(self.search('хомяк'), [post])
+
+        post.delete()
+        self.assertEqual(self.search('хомяк'), [])
+
+    def test_search_pages_are_selected_by_cursor(self) -> None:
+        """Following the cursors walks through every match exactly once."""
+        Post.objects.bulk_create(
+            Post(text=f'Кот номер {i}', author=self.author)
+            for i in range(15)
+        )
+        expected = set(Post.objects.filter(text__contains='Кот'))
+
+        found = []
+        pages = []
+        params = {}
+        while True:
+            response = self.guest_client.get(
+                reverse('posts:search'), {'q': 'кот', **params})
+            page_obj = response.context['page_obj']
+            pages.append(page_obj)
+            found.extend(page_obj)
+            if not page_obj.has_next():
+                break
+            params = {'after': page_obj.next_cursor}
+
+        self.assertEqual(len(found), len(expected))
+        self.assertEqual(set(found), expected)
+        self.assertEqual(len(pages), 2)
+
+        previous = self.search('кот', before=pages[1].previous_cursor)
+        self.assertEqual(previous, list(pages[0]))
+
+    def test_admin_search_uses_index(self) -> None:
+        """The admin finds posts through the full-text index."""
+        request = RequestFactory().get('/admin/posts/post/')
+        model_admin = site._registry[Post]
+        queryset, use_distinct = model_admin.get_search_results(
+            request, Post.objects.all(), 'кот')
+        self.assertEqual(
+            set(queryset),
+            {SearchTests.cat_post, SearchTests.cats_post},
+        )
+        self.assertFalse(use_distinct)
+        self.assertIn(SEARCH_TABLE, str(queryset.query))
+
+    def test_command_rebuilds_index(self) -> None:
+        """The command restores the emptied index and its triggers."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) "
+                f"VALUES ('delete-all')"
+            )
+            cursor.execute(f'DROP TRIGGER {SEARCH_TABLE}_insert')
+        self.assertEqual(self.search('диван'), [])
+
+        call_command('reindex_posts', stdout=StringIO())
+
+        self.assertEqual(self.search('диван'), [SearchTests.cat_post])
+        post = Post.objects.create(text='Новый диван', author=self.author)
+        self.assertIn(post, self.search('диван'))
+
+    def test_migrate_restores_dropped_triggers(self) -> None:
+        """
+        The triggers dropped by a rebuild of the posts table are found and
+        created again after the migrations, with the changes they missed.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TRIGGER {SEARCH_TABLE}_update')
+        self.assertEqual(get_missing_search_objects(),
+                         [f'{SEARCH_TABLE}_update'])
+        Post.objects.filter(id=SearchTests.dog_post.id).update(
+            text='Собака спит на диване')
+
+        emit_post_migrate_signal(verbosity=0, interactive=False, db='default')
+
+        self.assertEqual(get_missing_search_objects(), [])
+        self.assertIn(SearchTests.dog_post, self.search('собака диван'))
+        Post.objects.filter(id=SearchTests.dog_post.id).update(
+            text='Собака гуляет во дворе')
+        self.assertEqual(self.search('собака диван'), [])
@@ -0,0 +1,96 @@
+import shutil
+import tempfile
+from io import StringIO
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.db.models import F
+from django.test import TestCase, override_settings
+
+from ..models import Comment, Follow, Group, Post, TimelineEntry, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class SeedBenchmarkDataTests(TestCase):
+    """Checking the generator of the benchmark dataset."""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def seed(self, prefix: str, seed: int = 1) -> None:
+        """Generates a small dataset with the prefix of the names."""
+        call_command(
+            'seed_benchmark_data', users=30, groups=3, posts=200,
+            comments=300, follows=5, images=2, prefix=prefix, seed=seed,
+            batch_size=64, stdout=StringIO(),
+        )
+
+    def describe(self, prefix: str) -> list:
+        """Returns the posts of the dataset without the prefix and ids."""
+        return [
+            (
+                text,
+                author.removeprefix(prefix),
+                group and group.removeprefix(prefix),
+                pub_date,
+                comments_count,
+            )
+            for text, author, group, pub_date, comments_count
+            in Post.objects.filter(
+                author__username__startswith=f'{prefix}-'
+            ).order_by('id').values_list(
+                'text', 'author__username', 'group__slug', 'pub_date',
+                'comments_count',
+            )
+        ]
+
+    def test_dataset_is_complete(self) -> None:
+        """Every model is filled and the derived data is rebuilt."""
+        self.seed('a')
+
+        self.assertEqual(User.objects.count(), 30)
+        self.assertEqual(Group.objects.count(), 3)
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertEqual(Comment.objects.count(), 300)
+        self.assertEqual(Post.objects.exclude(image='').count(), 2)
+        self.assertFalse(Follow.objects.filter(
+            user_id=F('author_id')).exists())
+        self.assertTrue(TimelineEntry.objects.exists())
+        self.assertEqual(
+            sum(Post.objects.values_list('comments_count', flat=True)), 300)
+        self.assertTrue(User.objects.first().check_password('benchmark'))
+
+    def test_authors_follow_power_law(self) -> None:
+        """A few authors write most of the posts."""
+        self.seed('a')
+
+        counts = sorted(
+            User.objects.values_list('stats__posts_count', flat=True),
+            reverse=True,
+        )
+        self.assertGreater(sum(counts[:3]), sum(counts[-10:]))
+        self.assertGreater(counts[0], 200 / 30 * 2)
+
+    def test_same_seed_gives_same_data(self) -> None:
+        """Two runs with the same seed create the same posts."""
+        self.seed('a')
+        self.seed('b')
+        self.seed('c', seed=2)
+
+        self.assertEqual(self.describe('a'), self.describe('b'))
+        self.assertNotEqual(self.describe('a'), self.describe('c'))
+
+    def test_more_images_than_posts_are_refused(self) -> None:
+        """More images than posts are refused before anything is written."""
+        with self.assertRaises(CommandError):
+            call_command(
+                'seed_benchmark_data', users=3, posts=2, images=3,
+                prefix='refused', stdout=StringIO(),
+            )
+        self.assertFalse(User.objects.exists())
+        self.assertEqual(list(Path(TEMP_MEDIA_ROOT).rglob('refused-*')), [])
@@ -0,0 +1,186 @@
+import shutil
+import tempfile
+from http import HTTPStatus
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Post, User
+from ..thumbnails import (POST_THUMBNAIL_GEOMETRY, POST_THUMBNAIL_OPTIONS,
+                          generate_thumbnails, get_ready_thumbnail,
+                          submit_thumbnails)
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailsTests(TestCase):
+    """Checking the creation of thumbnails outside of page rendering."""
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self) -> None:
+        """Creates a post with an image that has no thumbnails."""
+        cache.clear()
+        self.guest_client = Client()
+        self.post = Post.objects.create(
+            text='Тестовый пост',
+            author=ThumbnailsTests.author,
+            image=SimpleUploadedFile(
+                name='small.gif',
+                content=SMALL_GIF,
+                content_type='image/gif',
+            ),
+        )
+
+    def get_ready_thumbnail(self):
+        """Returns the created thumbnail of the post image or None."""
+        return get_ready_thumbnail(
+            self.post.image.name,
+            POST_THUMBNAIL_GEOMETRY,
+            **POST_THUMBNAIL_OPTIONS,
+        )
+
+    def get_post_page(self):
+        """Requests the page of the post."""
+        return self.guest_client.get(reverse(
+            'posts:post_detail', kwargs={'post_id': self.post.id}))
+
+    def test_page_shows_original_image_while_thumbnail_is_pending(self):
+        """Rendering the page does not create the thumbnail."""
+        response = self.get_post_page()
+        self.assertContains(response, self.post.image.url)
+        self.assertIsNone(self.get_ready_thumbnail())
+
+    def test_page_shows_created_thumbnail(self):
+        """The created thumbnail is shown instead of the original image."""
+        generate_thumbnails(self.post.image.name)
+        thumbnail = self.get_ready_thumbnail()
+        self.assertIsNotNone(thumbnail)
+
+        response = self.get_post_page()
+        self.assertContains(response, thumbnail.url)
+        self.assertNotContains(response, self.post.image.url)
+
+    def test_cached_pages_show_created_thumbnail(self):
+        """Pages cached while the thumbnail was pending are outdated."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+            reverse('posts:profile', kwargs={'username': 'auth'}),
+        )
+        for url in urls:
+            self.guest_client.get(url)
+        generate_thumbnails(self.post.image.name)
+        thumbnail = self.get_ready_thumbnail()
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertContains(self.guest_client.get(url), thumbnail.url)
+
+    @override_settings(THUMBNAIL_WORKERS=0)
+    def test_thumbnails_are_created_at_once_without_workers(self):
+        """Without workers the thumbnails are created on submit."""
+        submit_thumbnails(self.post.image.name)
+        self.assertIsNotNone(self.get_ready_thumbnail())
+
+    def test_command_creates_missing_thumbnails(self):
+        """The command creates thumbnails of existing images."""
+        call_command('generate_thumbnails', stdout=StringIO())
+        self.assertIsNotNone(self.get_ready_thumbnail())
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailLookupsTests(TestCase):
+    """Checking that the thumbnails of a page are looked up in one batch."""
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.guest_client = Client()
+
+    def create_posts(self, count: int) -> None:
+        """Creates posts with images, half of them with thumbnails."""
+        for i in range(count):
+            post = Post.objects.create(
+                text=f'Пост {i}',
+                author=ThumbnailLookupsTests.author,
+                image=SimpleUploadedFile(
+                    name=f'small{i}.gif',
+                    content=SMALL_GIF,
+                    content_type='image/gif',
+                ),
+            )
+            if i % 2:
+                generate_thumbnails(post.image.name)
+
+    def count_lookups(self) -> tuple:
+        """
+        Renders the index page and returns the numbers of cache reads and
+        database queries made. A multi-get counts as one read even if the
+        cache backend implements it with single gets.
+        """
+        cache.clear()
+        default_cache = caches['default']
+        reads = []
+
+        def get(*args, **kwargs):
+            if not reads or reads[-1] != 'get_many':
+                reads.append('get')
+            return type(default_cache).get(default_cache, *args, **kwargs)
+
+        def get_many(*args, **kwargs):
+            reads.append('get_many')
+            values = type(default_cache).get_many(
+                default_cache, *args, **kwargs)
+            reads.append('done')
+            return values
+
+        with mock.patch.object(default_cache, 'get', get), \
+                mock.patch.object(default_cache, 'get_many', get_many), \
+                CaptureQueriesContext(connection) as queries:
+            response = self.guest_client.get(reverse('posts:index'))
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        return reads.count('get') + reads.count('get_many'), len(queries)
+
+    def test_lookups_do_not_depend_on_page_size(self) -> None:
+        """A page with ten images is rendered with as many lookups as one."""
+        self.create_posts(1)
+        lookups_for_one_post = self.count_lookups()
+
+        self.create_posts(9)
+        lookups_for_ten_posts = self.count_lookups()
+
+        self.assertEqual(lookups_for_one_post, lookups_for_ten_posts)
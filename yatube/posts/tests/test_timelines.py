@@ -0,0 +1,147 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Follow, Post, TimelineEntry, User
+
+
+class TimelinesTests(TestCase):
+    """Checking the materialized follow feeds."""
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        """Creates an author and a follower."""
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.follower = User.objects.create_user(username='follower')
+
+    def setUp(self) -> None:
+        """Subscribes the follower to the author."""
+        Follow.objects.create(
+            user=TimelinesTests.follower,
+            author=TimelinesTests.author,
+        )
+        self.follower_client = Client()
+        self.follower_client.force_login(TimelinesTests.follower)
+
+    def get_feed_ids(self) -> list:
+        """Returns ids of the posts on the first page of the follow feed."""
+        response = self.follower_client.get(reverse('posts:follow_index'))
+        return [post.id for post in response.context['page_obj']]
+
+    def test_new_post_is_pushed_to_followers(self) -> None:
+        """A created post gets into the feed of the follower."""
+        post = Post.objects.create(
+            text='Тестовый пост',
+            author=TimelinesTests.author,
+        )
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=TimelinesTests.follower, post=post).exists())
+        self.assertEqual(self.get_feed_ids(), [post.id])
+
+    def test_edited_post_is_shown_with_new_text(self) -> None:
+        """An edit of the post is visible in the feed."""
+        post = Post.objects.create(
+            text='Тестовый пост',
+            author=TimelinesTests.author,
+        )
+        post.text = 'Изменённый пост'
+        post.save()
+        response = self.follower_client.get(reverse('posts:follow_index'))
+        self.assertContains(response, 'Изменённый пост')
+
+    def test_unfollow_removes_author_posts(self) -> None:
+        """After unsubscribing the feed has no entries of the author."""
+        Post.objects.create(text='Тестовый пост', author=TimelinesTests.author)
+        self.follower_client.get(reverse(
+            'posts:profile_unfollow',
+            kwargs={'username': TimelinesTests.author.username},
+        ))
+        self.assertFalse(TimelineEntry.objects.filter(
+            user=TimelinesTests.follower).exists())
+        self.assertEqual(self.get_feed_ids(), [])
+
+    @override_settings(FOLLOW_TIMELINE_DEPTH=2)
+    def test_feed_is_trimmed_to_depth(self) -> None:
+        """Only the newest posts are kept in the feed."""
+        posts = [
+            Post.objects.create(text=f'Пост {i}', author=TimelinesTests.author)
+            for i in range(3)
+        ]
+        entries = TimelineEntry.objects.filter(user=TimelinesTests.follower)
+        self.assertEqual(
+            set(entries.values_list('post_id', flat=True)),
+            {posts[1].id, posts[2].id},
+        )
+
+    @override_settings(FOLLOW_TIMELINE_DEPTH=2)
+    def test_feeds_of_all_followers_are_trimmed_at_once(self) -> None:
+        """A pushed post trims the feeds of the followers with one query."""
+        for index in range(3):
+            follower = User.objects.create_user(username=f'reader{index}')
+            Follow.objects.create(user=follower, author=TimelinesTests.author)
+        for index in range(2):
+            Post.objects.create(
+                text=f'Пост {index}', author=TimelinesTests.author)
+        with CaptureQueriesContext(connection) as queries:
+            post = Post.objects.create(
+                text='Новый пост', author=TimelinesTests.author)
+        deletes = [
+            query['sql'] for query in queries.captured_queries
+            if query['sql'].lstrip().startswith('DELETE')
+        ]
+        self.assertEqual(len(deletes), 1)
+        for user_id in Follow.objects.values_list('user_id', flat=True):
+            with self.subTest(user_id=user_id):
+                entries = TimelineEntry.objects.filter(user_id=user_id)
+                self.assertEqual(entries.count(), 2)
+                self.assertTrue(entries.filter(post=post).exists())
+
+    @override_settings(FOLLOW_FANOUT_MAX_FOLLOWERS=1)
+    def test_author_dropping_below_fanout_limit_is_pushed(self) -> None:
+        """
+        Posts published while the author had too many followers get into
+        the feeds once the author drops to the limit.
+        """
+        reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=reader, author=TimelinesTests.author)
+        post = Post.objects.create(
+            text='Тестовый пост', author=TimelinesTests.author)
+        self.assertFalse(TimelineEntry.objects.exists())
+        Follow.objects.filter(user=reader).delete()
+        self.assertEqual(
+            list(TimelineEntry.objects.values_list('user_id', 'post_id')),
+            [(TimelinesTests.follower.id, post.id)],
+        )
+        self.assertEqual(self.get_feed_ids(), [post.id])
+
+    @override_settings(FOLLOW_FANOUT_MAX_FOLLOWERS=0)
+    def test_popular_author_posts_are_merged_on_read(self) -> None:
+        """Posts of an author with many followers are read, not pushed."""
+        post = Post.objects.create(
+            text='Тестовый пост',
+            author=TimelinesTests.author,
+        )
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(self.get_feed_ids(), [post.id])
+
+    def test_backfill_command_builds_feeds(self) -> None:
+        """The command builds feeds for posts created in bulk."""
+        Post.objects.bulk_create([
+            Post(text=f'Пост {i}', author=TimelinesTests.author)
+            for i in range(3)
+        ])
+        self.assertFalse(TimelineEntry.objects.exists())
+
+        call_command('backfill_timelines', stdout=StringIO())
+
+        self.assertEqual(
+            TimelineEntry.objects.filter(
+                user=TimelinesTests.follower).count(),
+            3,
+        )
+        self.assertEqual(len(self.get_feed_ids()), 3)
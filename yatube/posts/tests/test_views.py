@@ -6,12 +6,16 @@ from django import forms
 from django.conf import settings
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
 from django.http import HttpResponse
-from django.test import Client, TestCase, override_settings
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
+from .. import feed_cache
 from ..models import Comment, Group, Post, User
-from ..views import MAX_SAMPLE_SIZE
+from ..views import COMMENTS_PAGE_SIZE, MAX_SAMPLE_SIZE
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
@@ -248,6 +252,90 @@ class PostPaginatorTests(TestCase):
                         posts_count
                     )
 
+    def test_keyset_pages_cover_all_posts_in_order(self) -> None:
+        """Following the ?after= tokens walks through every post once."""
+        expected_ids = list(
+            Post.objects.order_by('-pub_date', '-id').values_list(
+                'id', flat=True)
+        )
+        for reverse_name in (
+                PostPaginatorTests.reverse_names_of_views_for_testing):
+            with self.subTest(reverse_name=reverse_name):
+                received_ids = []
+                params = {'after': ''}
+                while True:
+                    response = self.guest_client.get(reverse_name, params)
+                    page_obj = response.context['page_obj']
+                    self.assertLessEqual(len(page_obj), MAX_SAMPLE_SIZE)
+                    received_ids.extend(post.id for post in page_obj)
+                    if not page_obj.has_next():
+                        break
+                    params = {'after': page_obj.next_cursor}
+                self.assertEqual(received_ids, expected_ids)
+
+    def test_keyset_before_token_returns_previous_page(self) -> None:
+        """The ?before= token of the second page leads to the first one."""
+        reverse_name = reverse('posts:index')
+        first_page = self.guest_client.get(
+            reverse_name, {'after': ''}).context['page_obj']
+        second_page = self.guest_client.get(
+            reverse_name, {'after': first_page.next_cursor}
+        ).context['page_obj']
+        self.assertTrue(second_page.has_previous())
+
+        response = self.guest_client.get(
+            reverse_name, {'before': second_page.previous_cursor})
+        self.assertEqual(
+            [post.id for post in response.context['page_obj']],
+            [post.id for post in first_page],
+        )
+
+    def test_keyset_pages_do_not_count_or_offset(self) -> None:
+        """Keyset pages are selected without COUNT and OFFSET."""
+        first_page = self.guest_client.get(
+            reverse('posts:index'), {'after': ''}).context['page_obj']
+        with CaptureQueriesContext(connection) as queries:
+            self.guest_client.get(
+                reverse('posts:index'), {'after': first_page.next_cursor})
+        for query in queries.captured_queries:
+            with self.subTest(sql=query['sql']):
+                self.assertNotIn('COUNT(', query['sql'].upper())
+                self.assertNotIn('OFFSET', query['sql'].upper())
+
+    def test_feed_links_select_pages_by_key(self) -> None:
+        """
+        The first pages of the feeds and the links leaving them, numbered
+        pages included, select the pages without COUNT and OFFSET.
+        """
+        for reverse_name in (
+                PostPaginatorTests.reverse_names_of_views_for_testing):
+            with self.subTest(reverse_name=reverse_name):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.guest_client.get(reverse_name)
+                for query in queries.captured_queries:
+                    self.assertNotIn('COUNT(', query['sql'].upper())
+                    self.assertNotIn('OFFSET', query['sql'].upper())
+                page_obj = response.context['page_obj']
+                self.assertTrue(page_obj.is_keyset)
+                self.assertContains(
+                    response, f'href="?after={page_obj.next_cursor}"')
+
+                response = self.guest_client.get(reverse_name, {'page': 1})
+                self.assertEqual(
+                    response.context['page_obj'].next_cursor,
+                    page_obj.next_cursor,
+                )
+                self.assertContains(
+                    response, f'href="?after={page_obj.next_cursor}"')
+
+    def test_malformed_keyset_token_returns_first_page(self) -> None:
+        """A malformed token is treated as a request for the first page."""
+        response = self.guest_client.get(
+            reverse('posts:index'), {'after': 'not-a-token'})
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(len(response.context['page_obj']), MAX_SAMPLE_SIZE)
+        self.assertFalse(response.context['page_obj'].has_previous())
+
 
 class ViewAfterNewPostTests(TestCase):
     """Additional view check when creating a post."""
@@ -328,6 +416,50 @@ class PostCommentsTests(TestCase):
         )
         self.assertContains(response, PostCommentsTests.comment)
 
+    def test_comments_are_loaded_in_chunks(self) -> None:
+        """
+        The post page shows the first chunk of comments, the rest are loaded
+        chunk by chunk in the order they were written.
+        """
+        post = Post.objects.create(text='Популярный пост', author=self.author)
+        Comment.objects.bulk_create([
+            Comment(text=f'Комментарий №{i}.', author=self.author, post=post)
+            for i in range(COMMENTS_PAGE_SIZE + 5)
+        ])
+        response = self.guest_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.id}))
+        first_chunk = response.context['comments']
+        self.assertEqual(
+            [comment.text for comment in first_chunk],
+            [f'Комментарий №{i}.' for i in range(COMMENTS_PAGE_SIZE)],
+        )
+        self.assertContains(response, 'data-load-comments')
+
+        address = reverse('posts:post_comments', kwargs={'post_id': post.id})
+        params = {'after': first_chunk.next_cursor}
+        response = self.guest_client.get(address, params)
+        self.assertTemplateNotUsed(response, 'base.html')
+        self.assertEqual(
+            [comment.text for comment in response.context['comments']],
+            [
+                f'Комментарий №{i}.'
+                for i in range(COMMENTS_PAGE_SIZE, COMMENTS_PAGE_SIZE + 5)
+            ],
+        )
+        self.assertNotContains(response, 'data-load-comments')
+
+        response = self.guest_client.get(address, {**params, 'format': 'json'})
+        data = response.json()
+        self.assertIsNone(data['next'])
+        self.assertIn(f'Комментарий №{COMMENTS_PAGE_SIZE}.', data['html'])
+        self.assertNotIn('Комментарий №0.', data['html'])
+
+    def test_missing_post_has_no_comments(self) -> None:
+        """The comments of a missing post are not found."""
+        response = self.guest_client.get(
+            reverse('posts:post_comments', kwargs={'post_id': 0}))
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
 
 class CachePagesTests(TestCase):
     """Checking the correctness of the cache."""
@@ -341,10 +473,10 @@ class CachePagesTests(TestCase):
     def setUp(self) -> None:
         cache.clear()
 
-    def test_index_new_post_not_in_cache(self) -> None:
+    def test_index_new_post_invalidates_cache(self) -> None:
         """
         When creating a post after a request to the index page, the post is
-        not displayed on the index page.
+        displayed on the index page at once.
         """
         CachePagesTests.guest_client.get(reverse('posts:index'))
 
@@ -355,13 +487,124 @@ class CachePagesTests(TestCase):
         new_response = CachePagesTests.guest_client.get(
             reverse('posts:index')
         )
-        self.assertNotContains(new_response, new_post)
+        self.assertContains(new_response, new_post)
 
-        cache.clear()
-        response_with_new_cache = CachePagesTests.guest_client.get(
-            reverse('posts:index')
+    def test_feed_pages_are_cached(self) -> None:
+        """
+        A change made without model signals is not displayed until the feed
+        version changes.
+        """
+        post = Post.objects.create(
+            text='Старый текст',
+            author=CachePagesTests.author,
+        )
+        pages = (
+            reverse('posts:index'),
+            reverse('posts:profile',
+                    kwargs={'username': CachePagesTests.author.username}),
         )
-        self.assertContains(response_with_new_cache, new_post)
+        for page in pages:
+            CachePagesTests.guest_client.get(page)
+
+        Post.objects.filter(id=post.id).update(text='Новый текст')
+        for page in pages:
+            with self.subTest(page=page):
+                response = CachePagesTests.guest_client.get(page)
+                self.assertContains(response, 'Старый текст')
+
+        post.refresh_from_db()
+        post.save()
+        for page in pages:
+            with self.subTest(page=page):
+                response = CachePagesTests.guest_client.get(page)
+                self.assertContains(response, 'Новый текст')
+
+    def test_cached_index_page_does_not_query_database(self) -> None:
+        """A repeated request to the index page is served from the cache."""
+        post = Post.objects.create(
+            text='Тестовый пост',
+            author=CachePagesTests.author,
+        )
+        CachePagesTests.guest_client.get(reverse('posts:index'))
+
+        with self.assertNumQueries(0):
+            response = CachePagesTests.guest_client.get(
+                reverse('posts:index'))
+        self.assertContains(response, post)
+
+    def test_fragments_are_cached_under_selected_page(self) -> None:
+        """
+        Malformed and out of range page parameters show the page they
+        select without caching another copy of it.
+        """
+        Post.objects.create(
+            text='Тестовый пост', author=CachePagesTests.author)
+        requested_positions = {
+            'page=abc': {'page': 'abc'},
+            'page=999': {'page': 999},
+            'after=broken': {'after': 'broken'},
+        }
+        for position, params in requested_positions.items():
+            with self.subTest(position=position):
+                response = CachePagesTests.guest_client.get(
+                    reverse('posts:index'), params)
+                self.assertContains(response, 'Тестовый пост')
+                self.assertIsNone(cache.get(feed_cache.get_fragment_key(
+                    'index', position, feed_cache.index_scope())))
+        for position in ('page=1', 'after='):
+            with self.subTest(position=position):
+                self.assertIsNotNone(cache.get(feed_cache.get_fragment_key(
+                    'index', position, feed_cache.index_scope())))
+
+    def test_user_change_invalidates_feeds(self) -> None:
+        """Renaming an author outdates the cached feeds."""
+        Post.objects.create(
+            text='Тестовый пост',
+            author=CachePagesTests.author,
+        )
+        CachePagesTests.guest_client.get(reverse('posts:index'))
+
+        CachePagesTests.author.first_name = 'Новое'
+        CachePagesTests.author.last_name = 'Имя'
+        CachePagesTests.author.save()
+
+        response = CachePagesTests.guest_client.get(reverse('posts:index'))
+        self.assertContains(response, 'Новое Имя')
+
+
+class CacheTransactionTests(TransactionTestCase):
+    """Checking the cached pages around transactions."""
+
+    def setUp(self) -> None:
+        """Creates a post of the author with an empty cache."""
+        cache.clear()
+        self.author = User.objects.create_user(username='auth')
+        Post.objects.create(text='Старый пост', author=self.author)
+
+    def get_fragment_key(self) -> str:
+        """Returns the key of the first index page for the current version."""
+        return feed_cache.get_fragment_key(
+            'index', 'after=', feed_cache.index_scope())
+
+    def test_page_read_before_commit_is_not_served(self) -> None:
+        """A page cached before the commit of a new post is not served."""
+        self.client.get(reverse('posts:index'))
+        old_page = cache.get(self.get_fragment_key())
+        with transaction.atomic():
+            Post.objects.create(text='Новый пост', author=self.author)
+            # A concurrent read sees the new version but not the new post.
+            cache.set(self.get_fragment_key(), old_page)
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Новый пост')
+
+    def test_validators_read_before_commit_are_outdated(self) -> None:
+        """The ETag of a page read before the commit is not answered 304."""
+        with transaction.atomic():
+            Post.objects.create(text='Новый пост', author=self.author)
+            etag = self.client.get(reverse('posts:index'))['ETag']
+        response = self.client.get(
+            reverse('posts:index'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
 
 
 class FollowPagesTests(TestCase):
@@ -416,3 +659,94 @@ class FollowPagesTests(TestCase):
         )
         response = self.authorized_client.get(reverse('posts:follow_index'))
         self.assertNotContains(response, FollowPagesTests.post)
+
+
+class ConditionalGetTests(TestCase):
+    """Checking the validators of the feed and post pages."""
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            text='Тестовый пост',
+            author=cls.author,
+            group=cls.group,
+        )
+        cls.pages = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': cls.group.slug}),
+            reverse('posts:profile',
+                    kwargs={'username': cls.author.username}),
+            reverse('posts:post_detail', kwargs={'post_id': cls.post.id}),
+            reverse('posts:follow_index'),
+        )
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(ConditionalGetTests.reader)
+
+    def test_repeated_request_is_not_modified(self) -> None:
+        """A request with the current ETag gets 304 Not Modified."""
+        for page in ConditionalGetTests.pages:
+            with self.subTest(page=page):
+                response = self.authorized_client.get(page)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                self.assertTrue(response.has_header('Last-Modified'))
+
+                response = self.authorized_client.get(
+                    page, HTTP_IF_NONE_MATCH=response['ETag'])
+                self.assertEqual(response.status_code,
+                                 HTTPStatus.NOT_MODIFIED)
+
+    def test_changes_outdate_validators(self) -> None:
+        """New posts and comments change the ETag of the pages."""
+        etags = {
+            page: self.authorized_client.get(page)['ETag']
+            for page in ConditionalGetTests.pages
+        }
+        self.authorized_client.get(reverse(
+            'posts:profile_follow',
+            kwargs={'username': ConditionalGetTests.author.username},
+        ))
+        Post.objects.create(
+            text='Новый пост',
+            author=ConditionalGetTests.author,
+            group=ConditionalGetTests.group,
+        )
+        Comment.objects.create(
+            text='Новый комментарий',
+            author=ConditionalGetTests.reader,
+            post=ConditionalGetTests.post,
+        )
+        for page, etag in etags.items():
+            with self.subTest(page=page):
+                response = self.authorized_client.get(
+                    page, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                self.assertNotEqual(response['ETag'], etag)
+
+    def test_validators_depend_on_user(self) -> None:
+        """Personalized pages have different ETags for different users."""
+        page = reverse(
+            'posts:profile',
+            kwargs={'username': ConditionalGetTests.author.username},
+        )
+        etag = self.authorized_client.get(page)['ETag']
+
+        response = Client().get(page, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_missing_page_has_no_validators(self) -> None:
+        """A missing group page is answered with 404 without an ETag."""
+        response = self.authorized_client.get(reverse(
+            'posts:group_list', kwargs={'slug': 'missing'}))
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+        self.assertFalse(response.has_header('ETag'))
@@ -0,0 +1,206 @@
+import logging
+import threading
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Dict, Iterable, Optional
+
+from django.conf import settings
+from django.db import (DEFAULT_DB_ALIAS, close_old_connections, connection,
+                       transaction)
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE
+from sorl.thumbnail.kvstores.cached_db_kvstore import (
+    KVStore as CachedDBKVStore)
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from . import feed_cache
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+# Sizes of the post images used by the templates.
+POST_THUMBNAIL_GEOMETRY = '960x339'
+POST_THUMBNAIL_OPTIONS = {'crop': 'center', 'upscale': True}
+THUMBNAIL_SIZES = (
+    (POST_THUMBNAIL_GEOMETRY, POST_THUMBNAIL_OPTIONS),
+)
+
+_executor = None
+_executor_lock = threading.Lock()
+_pending = set()
+
+
+def _get_executor() -> Optional[Executor]:
+    """Returns the pool of thumbnail workers or None if it is disabled."""
+    global _executor
+    if not settings.THUMBNAIL_WORKERS:
+        return None
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails',
+            )
+    return _executor
+
+
+def get_thumbnail_name(image_name: str, geometry: str, **options) -> str:
+    """
+    Returns the name of the thumbnail sorl-thumbnail creates for the image,
+    without reading the image or the key-value store.
+    """
+    backend = default.backend
+    source = ImageFile(image_name)
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    return backend._get_thumbnail_filename(source, geometry, options)
+
+
+def get_ready_thumbnail(image_name: str, geometry: str,
+                        **options) -> Optional[ImageFile]:
+    """Returns the thumbnail if it has already been created or None."""
+    thumbnail = ImageFile(
+        get_thumbnail_name(image_name, geometry, **options),
+        default.storage,
+    )
+    return default.kvstore.get(thumbnail)
+
+
+def get_ready_thumbnails(
+        image_names: Iterable[str]) -> Dict[str, Optional[ImageFile]]:
+    """
+    Returns the created post thumbnails of the images, None for pending ones.
+
+    With the cached_db key-value store of sorl-thumbnail all the thumbnails
+    are looked up with one multi-get from the cache and at most one query
+    for the cache misses, which are then cached the way sorl caches them.
+    """
+    image_names = set(image_names)
+    if not isinstance(default.kvstore, CachedDBKVStore):
+        return {
+            image_name: get_ready_thumbnail(
+                image_name,
+                POST_THUMBNAIL_GEOMETRY,
+                **POST_THUMBNAIL_OPTIONS,
+            )
+            for image_name in image_names
+        }
+
+    keys = {
+        image_name: add_prefix(ImageFile(
+            get_thumbnail_name(
+                image_name,
+                POST_THUMBNAIL_GEOMETRY,
+                **POST_THUMBNAIL_OPTIONS,
+            ),
+            default.storage,
+        ).key)
+        for image_name in image_names
+    }
+    kv_cache = default.kvstore.cache
+    values = kv_cache.get_many(list(keys.values())) if keys else {}
+
+    missing_keys = [key for key in keys.values() if key not in values]
+    if missing_keys:
+        stored = dict(KVStoreModel.objects.filter(
+            key__in=missing_keys).values_list('key', 'value'))
+        missing = {key: stored.get(key, EMPTY_VALUE) for key in missing_keys}
+        kv_cache.set_many(missing, sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+        values.update(missing)
+
+    return {
+        image_name: (
+            None if values[key] == EMPTY_VALUE or not values[key]
+            else deserialize_image_file(values[key])
+        )
+        for image_name, key in keys.items()
+    }
+
+
+def attach_thumbnails(posts: Iterable[Post]) -> None:
+    """
+    Sets the thumbnail attribute of the posts to their created thumbnails,
+    looking all of them up at once.
+    """
+    posts = [post for post in posts if post.image]
+    thumbnails = get_ready_thumbnails(post.image.name for post in posts)
+    for post in posts:
+        post.thumbnail = thumbnails[post.image.name]
+
+
+def outdate_image_feeds(image_name: str) -> None:
+    """
+    Outdates the feeds showing the posts of the image, their cached
+    fragments show the original image while the thumbnail is pending.
+
+    The posts are read from the default database, a replica may not have
+    the post whose thumbnail was queued on commit yet.
+    """
+    posts = Post.objects.using(DEFAULT_DB_ALIAS).filter(
+        image=image_name).values_list('id', 'author_id', 'group_id')
+    scopes = [feed_cache.index_scope()]
+    for post_id, author_id, group_id in posts:
+        scopes += [
+            feed_cache.post_scope(post_id),
+            feed_cache.profile_scope(author_id),
+            feed_cache.group_scope(group_id),
+        ]
+    feed_cache.bump_feed_versions(*scopes)
+
+
+def generate_thumbnails(image_name: str) -> None:
+    """
+    Creates the thumbnails of every size for the image and outdates
+    the feeds showing it.
+    """
+    try:
+        for geometry, options in THUMBNAIL_SIZES:
+            get_thumbnail(image_name, geometry, **options)
+        outdate_image_feeds(image_name)
+    except Exception:
+        logger.exception('Failed to create thumbnails of %s', image_name)
+
+
+def _generate_in_worker(image_name: str) -> None:
+    """Creates the thumbnails in a worker thread."""
+    close_old_connections()
+    try:
+        generate_thumbnails(image_name)
+    finally:
+        with _executor_lock:
+            _pending.discard(image_name)
+        connection.close()
+
+
+def submit_thumbnails(image_name: str) -> None:
+    """
+    Queues the creation of the thumbnails of the image. Without workers
+    the thumbnails are created at once.
+    """
+    executor = _get_executor()
+    if executor is None:
+        generate_thumbnails(image_name)
+        return
+    with _executor_lock:
+        if image_name in _pending:
+            return
+        _pending.add(image_name)
+    executor.submit(_generate_in_worker, image_name)
+
+
+def enqueue_thumbnails(image_name: str) -> None:
+    """
+    Queues the creation of the thumbnails of the image after the current
+    transaction is committed.
+    """
+    if image_name:
+        transaction.on_commit(lambda: submit_thumbnails(image_name))
@@ -0,0 +1,200 @@
+import heapq
+from itertools import islice
+from typing import Iterable, List
+
+from django.conf import settings
+from django.db import connections, router
+from django.db.models import QuerySet
+
+from . import follow_graph
+from .models import Follow, Post, TimelineEntry, User, UserStats
+
+# Feeds are trimmed in chunks of users to stay below the limit of SQLite
+# on the number of query parameters.
+TRIM_CHUNK_SIZE = 500
+# Removes the entries beyond the depth from the feeds of several users at
+# once, numbering the entries of every feed from the newest.
+TRIM_TIMELINES_SQL = """
+    DELETE FROM {table} WHERE id IN (
+        SELECT id FROM (
+            SELECT id, ROW_NUMBER() OVER (
+                PARTITION BY user_id ORDER BY pub_date DESC, post_id DESC
+            ) AS position
+            FROM {table}
+            WHERE user_id IN ({user_ids})
+        ) ranked
+        WHERE position > %s
+    )
+"""
+# Entries created by one INSERT when the posts of an author are pushed to
+# the feeds of all the followers.
+PUSH_BATCH_SIZE = 10000
+
+
+def get_timeline_depth() -> int:
+    """Returns the number of posts kept in a follow feed."""
+    return settings.FOLLOW_TIMELINE_DEPTH
+
+
+def get_fanout_limit() -> int:
+    """Returns the number of followers above which posts are not pushed."""
+    return settings.FOLLOW_FANOUT_MAX_FOLLOWERS
+
+
+def is_pushed_author(author_id: int) -> bool:
+    """Checks whether the posts of the author are pushed to follow feeds."""
+    return not UserStats.objects.filter(
+        user_id=author_id,
+        followers_count__gt=get_fanout_limit(),
+    ).exists()
+
+
+def trim_timelines(user_ids: Iterable[int]) -> None:
+    """
+    Removes the entries beyond the depth from the feeds of the users, with
+    one DELETE for a chunk of users.
+    """
+    user_ids = list(user_ids)
+    connection = connections[router.db_for_write(TimelineEntry)]
+    table = connection.ops.quote_name(TimelineEntry._meta.db_table)
+    with connection.cursor() as cursor:
+        for start in range(0, len(user_ids), TRIM_CHUNK_SIZE):
+            chunk = user_ids[start:start + TRIM_CHUNK_SIZE]
+            cursor.execute(
+                TRIM_TIMELINES_SQL.format(
+                    table=table, user_ids=', '.join(['%s'] * len(chunk))),
+                [*chunk, get_timeline_depth()],
+            )
+
+
+def push_post(post: Post) -> None:
+    """
+    Adds the post to the feeds of the followers of its author.
+
+    Posts of authors with more than FOLLOW_FANOUT_MAX_FOLLOWERS followers
+    are skipped, such posts are merged into the feeds on read.
+    """
+    if not is_pushed_author(post.author_id):
+        return
+    follower_ids = list(
+        Follow.objects.filter(author_id=post.author_id).values_list(
+            'user_id', flat=True)
+    )
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+            for user_id in follower_ids
+        ],
+        ignore_conflicts=True,
+    )
+    trim_timelines(follower_ids)
+
+
+def remove_author_posts(user_id: int, author_id: int) -> None:
+    """Removes the posts of the author from the feed of the user."""
+    TimelineEntry.objects.filter(
+        user_id=user_id,
+        post__author_id=author_id,
+    ).delete()
+
+
+def push_author_posts(user_id: int, author_id: int) -> None:
+    """Adds the newest posts of the author to the feed of the user."""
+    if not is_pushed_author(author_id):
+        return
+    posts = Post.objects.filter(author_id=author_id).order_by(
+        '-pub_date', '-id').values_list('id', 'pub_date')
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+            for post_id, pub_date in posts[:get_timeline_depth()]
+        ],
+        ignore_conflicts=True,
+    )
+    trim_timelines([user_id])
+
+
+def push_resumed_author_posts(author_id: int) -> None:
+    """
+    Adds the newest posts of the author to the feeds of all the followers
+    when the author has just dropped to FOLLOW_FANOUT_MAX_FOLLOWERS
+    followers. The posts published with more followers were merged into
+    the feeds on read, and the followers subscribed then got no entries.
+    """
+    if not UserStats.objects.filter(
+            user_id=author_id, followers_count=get_fanout_limit()).exists():
+        return
+    posts = list(Post.objects.filter(author_id=author_id).order_by(
+        '-pub_date', '-id').values_list('id', 'pub_date')[
+            :get_timeline_depth()])
+    follower_ids = list(Follow.objects.filter(
+        author_id=author_id).values_list('user_id', flat=True))
+    entries = (
+        TimelineEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+        for user_id in follower_ids
+        for post_id, pub_date in posts
+    )
+    while True:
+        batch = list(islice(entries, PUSH_BATCH_SIZE))
+        if not batch:
+            break
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+    trim_timelines(follower_ids)
+
+
+def rebuild_timeline(user_id: int) -> None:
+    """
+    Builds the feed of the user from scratch. The subscriptions of the user
+    may have been changed in bulk, so the cached ones are forgotten too.
+    """
+    follow_graph.forget_following_ids(user_id)
+    TimelineEntry.objects.filter(user_id=user_id).delete()
+    author_ids = Follow.objects.filter(user_id=user_id).exclude(
+        author__stats__followers_count__gt=get_fanout_limit()
+    ).values('author_id')
+    posts = Post.objects.filter(author_id__in=author_ids).order_by(
+        '-pub_date', '-id').values_list('id', 'pub_date')
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+            for post_id, pub_date in posts[:get_timeline_depth()]
+        ],
+    )
+
+
+def get_follow_feed_ids(user: User) -> List[int]:
+    """
+    Returns ids of the newest posts of the authors the user is subscribed
+    to, at most FOLLOW_TIMELINE_DEPTH of them.
+
+    Pushed posts are taken from the materialized feed. The newest posts of
+    every author with too many followers are read separately and merged in,
+    the authors are picked from the cached follow graph.
+    """
+    depth = get_timeline_depth()
+    feeds = [
+        TimelineEntry.objects.filter(user=user).order_by(
+            '-pub_date', '-post_id').values_list('pub_date', 'post_id')[:depth]
+    ]
+    following_ids = follow_graph.get_following_ids(user.id)
+    merged_author_ids = UserStats.objects.filter(
+        user_id__in=sorted(following_ids),
+        followers_count__gt=get_fanout_limit(),
+    ).values_list('user_id', flat=True) if following_ids else []
+    for author_id in merged_author_ids:
+        feeds.append(
+            Post.objects.filter(author_id=author_id).order_by(
+                '-pub_date', '-id').values_list('pub_date', 'id')[:depth]
+        )
+
+    post_ids = dict.fromkeys(
+        post_id for _, post_id in heapq.merge(*feeds, reverse=True)
+    )
+    return list(islice(post_ids, depth))
+
+
+def get_follow_feed(user: User) -> QuerySet:
+    """Returns the posts of the authors the user is subscribed to."""
+    return Post.objects.select_related('author', 'group').filter(
+        id__in=get_follow_feed_ids(user)
+    )
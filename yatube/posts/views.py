@@ -1,30 +1,67 @@
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.http import HttpRequest, HttpResponse
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpRequest, HttpResponse, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
-
-from . import forms
+from django.template.loader import render_to_string
+from django.utils.http import urlencode
+from django.utils.safestring import mark_safe
+
+from . import feed_cache, feeds, follow_graph, forms, object_cache
+from .conditional import (follow_scopes, group_scopes, index_scopes,
+                          page_condition, post_scopes, profile_scopes)
+from .counters import get_user_stats
 from .models import (MAX_NUMBER_CHARS_IN_POST_PRESENTATION, Follow, Group,
                      Post, User)
-from .paginator import split_into_pages
+from .paginator import (COMMENT_ORDERING, get_page_position,
+                        get_requested_position, split_into_keyset_pages,
+                        split_into_pages)
+from .search import split_into_search_pages
+from .thumbnails import enqueue_thumbnails
 
 MAX_SAMPLE_SIZE = 10
+COMMENTS_PAGE_SIZE = 20
 
 
+@page_condition(index_scopes)
 def index(request: HttpRequest) -> HttpResponse:
-    """Renders the main page of the site."""
-    template = 'posts/index.html'
+    """
+    Renders the main page of the site.
 
-    post_list = Post.objects.select_related('author', 'group')
-    page_obj = split_into_pages(request, post_list, MAX_SAMPLE_SIZE)
+    The page of the feed is rendered together with its pagination and cached
+    for the current version of the feed, so a cache hit does not query the
+    database.
+    """
+    template = 'posts/index.html'
 
     title = 'Это главная страница проекта Yatube'
     context = {
         'title': title,
-        'page_obj': page_obj,
     }
+
+    feed = cache.get(feed_cache.get_fragment_key(
+        'index', get_requested_position(request), feed_cache.index_scope()))
+    if feed is None:
+        post_list = object_cache.select_post_keys(feeds.get_index_posts())
+        page_obj = object_cache.hydrate_page(
+            split_into_pages(request, post_list, MAX_SAMPLE_SIZE))
+        feed = render_to_string(
+            'posts/includes/index_feed.html',
+            {'page_obj': page_obj},
+        )
+        # The page is cached under its own position, so malformed or out of
+        # range parameters do not fill the cache with copies of it.
+        fragment_key = feed_cache.get_fragment_key(
+            'index', get_page_position(page_obj), feed_cache.index_scope())
+        cache.set(fragment_key, feed, settings.FEED_CACHE_TIMEOUT)
+        context['page_obj'] = page_obj
+
+    context['feed'] = mark_safe(feed)
     return render(request, template, context)
 
 
+@page_condition(group_scopes)
 def group_posts(request: HttpRequest, slug: str) -> HttpResponse:
     """
     Renders posts from a specific community, if there is no group with
@@ -36,17 +73,21 @@ def group_posts(request: HttpRequest, slug: str) -> HttpResponse:
     """
     template = 'posts/group_list.html'
 
-    group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.select_related('author', 'group')
-    page_obj = split_into_pages(request, post_list, MAX_SAMPLE_SIZE)
+    group = get_object_or_404(Group.objects.cache(), slug=slug)
+    post_list = object_cache.select_post_keys(feeds.get_group_posts(group))
+    page_obj = object_cache.hydrate_page(
+        split_into_pages(request, post_list, MAX_SAMPLE_SIZE))
 
     context = {
         'group': group,
         'page_obj': page_obj,
+        **feed_cache.get_feed_cache_context(
+            page_obj, feed_cache.group_scope(group.id)),
     }
     return render(request, template, context)
 
 
+@page_condition(profile_scopes)
 def profile(request: HttpRequest, username: str) -> HttpResponse:
     """
     Renders the user's posts by the specified name, if there is no user with
@@ -58,13 +99,17 @@ def profile(request: HttpRequest, username: str) -> HttpResponse:
     """
     template = 'posts/profile.html'
 
-    author = get_object_or_404(User, username=username)
-    post_list = author.posts.select_related('author', 'group')
-    page_obj = split_into_pages(request, post_list, MAX_SAMPLE_SIZE)
+    author = get_object_or_404(
+        User.objects.select_related('stats'),
+        username=username,
+    )
+    post_list = object_cache.select_post_keys(feeds.get_profile_posts(author))
+    page_obj = object_cache.hydrate_page(
+        split_into_pages(request, post_list, MAX_SAMPLE_SIZE))
 
     following = (
         request.user.is_authenticated
-        and Follow.objects.filter(user=request.user, author=author).exists()
+        and follow_graph.is_following(request.user.id, author.id)
     )
 
     is_author = (
@@ -74,14 +119,17 @@ def profile(request: HttpRequest, username: str) -> HttpResponse:
 
     context = {
         'author': author,
-        'count': post_list.count(),
+        'count': get_user_stats(author).posts_count,
         'following': following,
         'is_author': is_author,
         'page_obj': page_obj,
+        **feed_cache.get_feed_cache_context(
+            page_obj, feed_cache.profile_scope(author.id)),
     }
     return render(request, template, context)
 
 
+@page_condition(post_scopes)
 def post_detail(request: HttpRequest, post_id: int) -> HttpResponse:
     """
     Renders detailed information about the specified post, if there is no
@@ -93,14 +141,22 @@ def post_detail(request: HttpRequest, post_id: int) -> HttpResponse:
     """
     template = 'posts/post_detail.html'
 
-    post = get_object_or_404(Post, id=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'),
+        id=post_id,
+    )
     text_in_title = post.text[:MAX_NUMBER_CHARS_IN_POST_PRESENTATION]
-    count = post.author.posts.count()
+    count = get_user_stats(post.author).posts_count
 
-    is_author = (request.user.id == post.author.id)
+    is_author = (request.user.id == post.author_id)
 
     comment_form = forms.CommentForm()
-    comments = post.comments.select_related('author')
+    comments = split_into_keyset_pages(
+        request,
+        feeds.get_post_comments(post),
+        COMMENTS_PAGE_SIZE,
+        COMMENT_ORDERING,
+    )
 
     context = {
         'post': post,
@@ -113,6 +169,61 @@ def post_detail(request: HttpRequest, post_id: int) -> HttpResponse:
     return render(request, template, context)
 
 
+def post_comments(request: HttpRequest, post_id: int) -> HttpResponse:
+    """
+    Renders the chunk of comments of the post following the ?after= cursor,
+    the "load more" button of the post page requests it.
+
+    Returns the HTML of the chunk or, with ?format=json, a JSON object with
+    the HTML and the cursor of the next chunk.
+
+    Args:
+        request (HttpRequest): A basic HTTP request.
+        post_id (int): Pk to search in the post table.
+    """
+    template = 'posts/includes/comment_list.html'
+
+    post = get_object_or_404(Post.objects.only('id'), id=post_id)
+    comments = split_into_keyset_pages(
+        request,
+        feeds.get_post_comments(post),
+        COMMENTS_PAGE_SIZE,
+        COMMENT_ORDERING,
+    )
+
+    context = {
+        'post': post,
+        'comments': comments,
+    }
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'html': render_to_string(template, context, request),
+            'next': comments.next_cursor,
+        })
+    return render(request, template, context)
+
+
+def search(request: HttpRequest) -> HttpResponse:
+    """
+    Renders the posts containing the words of the ?q= query, the most
+    relevant first.
+    """
+    template = 'posts/search.html'
+
+    query = request.GET.get('q', '').strip()
+    page_obj = None
+    if query:
+        page_obj = split_into_search_pages(request, query, MAX_SAMPLE_SIZE)
+
+    context = {
+        'title': 'Поиск по записям',
+        'query': query,
+        'page_obj': page_obj,
+        'page_params': urlencode({'q': query}) + '&',
+    }
+    return render(request, template, context)
+
+
 @login_required
 def post_create(request: HttpRequest) -> HttpResponse:
     """
@@ -125,7 +236,9 @@ def post_create(request: HttpRequest) -> HttpResponse:
     if form.is_valid():
         post = form.save(commit=False)
         post.author = request.user
-        post.save()
+        with transaction.atomic():
+            post.save()
+            enqueue_thumbnails(post.image.name)
         return redirect('posts:profile', username=request.user.username)
 
     context = {
@@ -149,7 +262,7 @@ def post_edit(request: HttpRequest, post_id: int) -> HttpResponse:
 
     post = get_object_or_404(Post, id=post_id)
 
-    if request.user.id != post.author.id:
+    if request.user.id != post.author_id:
         return redirect('posts:post_detail', post_id=post_id)
 
     form = forms.PostForm(
@@ -159,7 +272,10 @@ def post_edit(request: HttpRequest, post_id: int) -> HttpResponse:
     )
 
     if form.is_valid():
-        form.save()
+        with transaction.atomic():
+            post = form.save()
+            if 'image' in form.changed_data:
+                enqueue_thumbnails(post.image.name)
         return redirect('posts:post_detail', post_id=post_id)
 
     context = {
@@ -185,11 +301,13 @@ def add_comment(request: HttpRequest, post_id: int) -> HttpResponse:
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        with transaction.atomic():
+            comment.save()
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
+@page_condition(follow_scopes)
 def follow_index(request: HttpRequest) -> HttpResponse:
     """
     Renders a page with the posts of the authors to which the user is
@@ -197,14 +315,19 @@ def follow_index(request: HttpRequest) -> HttpResponse:
     """
     template = 'posts/follow.html'
 
-    subscriptions = [follow.author for follow in request.user.follower.all()]
-    posts = Post.objects.filter(author__in=subscriptions)
-
-    page_obj = split_into_pages(request, posts, MAX_SAMPLE_SIZE)
+    posts = object_cache.select_post_keys(
+        feeds.get_follow_posts(request.user))
+    page_obj = object_cache.hydrate_page(
+        split_into_pages(request, posts, MAX_SAMPLE_SIZE))
 
     context = {
         'title': 'Избранные авторы',
         'page_obj': page_obj,
+        **feed_cache.get_feed_cache_context(
+            page_obj,
+            feed_cache.index_scope(),
+            feed_cache.follow_scope(request.user.id),
+        ),
     }
     return render(request, template, context)
 
@@ -227,7 +350,5 @@ def profile_unfollow(request: HttpRequest, username: str) -> HttpResponse:
     """Unsubscribes the user from the author by the specified username."""
     author = get_object_or_404(User, username=username)
 
-    subscriptions = Follow.objects.filter(user=request.user, author=author)
-    if subscriptions.exists():
-        subscriptions.delete()
+    Follow.objects.filter(user=request.user, author=author).delete()
     return redirect('posts:profile', username=username)
@@ -31,6 +31,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -45,7 +47,7 @@ ROOT_URLCONF = 'yatube.urls'
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.metrics.TimedDjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -61,15 +63,59 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'yatube.wsgi.application'
+ASGI_APPLICATION = 'yatube.asgi.application'
 
 
+# The SQLite backend of core.backends.sqlite3 enables the WAL mode and
+# the pragmas of DEFAULT_PRAGMAS, 'pragmas' of OPTIONS overrides them.
+# Connections are kept open between requests for CONN_MAX_AGE seconds, run
+# the maintain_database command periodically to checkpoint the WAL.
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'core.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'CONN_MAX_AGE': 600,
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+        },
     }
 }
 
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+
+# Aliases of DATABASES that are read replicas of the default database, see
+# core.routers. A local SQLite replica is copied from the default database
+# by the sync_replicas command:
+#
+# DATABASES['replica'] = {
+#     'ENGINE': 'core.backends.sqlite3',
+#     'NAME': os.path.join(BASE_DIR, 'db.replica.sqlite3'),
+#     'CONN_MAX_AGE': 600,
+#     'TEST': {'MIRROR': 'default'},
+# }
+# DATABASE_REPLICAS = ['replica']
+DATABASE_REPLICAS = []
+# Views whose GET requests read from the replicas.
+REPLICA_VIEWS = [
+    'posts:index',
+    'posts:group_list',
+    'posts:profile',
+    'posts:post_detail',
+    'posts:post_comments',
+    'posts:follow_index',
+    'posts:api_index',
+    'posts:api_group_list',
+    'posts:api_profile',
+    'posts:api_post_comments',
+    'posts:api_follow_index',
+]
+# A replica copied longer ago than this number of seconds is not read.
+REPLICA_MAX_LAG = 30
+# Seconds a client reads from the default database after a write.
+REPLICA_STICKINESS = 60
+# Seconds the lag of a replica is remembered by a process.
+REPLICA_LAG_CHECK_INTERVAL = 1
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -116,8 +162,56 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
+# Number of the newest posts kept in the materialized follow feed of a user.
+FOLLOW_TIMELINE_DEPTH = 500
+# Posts of authors with more followers are not pushed to the follow feeds
+# but merged into them when the feed is read.
+FOLLOW_FANOUT_MAX_FOLLOWERS = 1000
+# The cached ids of the authors a user follows are removed when a
+# subscription changes, the timeout only bounds a missed change.
+FOLLOW_GRAPH_TIMEOUT = 60 * 60 * 24
+
+# Cached feed fragments are outdated by the signals of the models, so they
+# may be kept for a long time.
+FEED_CACHE_TIMEOUT = 60 * 60
+# Posts, users and groups of the feed pages are removed from the object
+# cache by the signals of the models, the timeout bounds the changes made
+# by bulk updates, see posts.object_cache.
+OBJECT_CACHE_TIMEOUT = 60 * 60
+# Results of the querysets marked with cache() are outdated by the writes
+# to their tables, see core.query_cache.
+QUERY_CACHE_TIMEOUT = 60 * 60
+
+# Number of threads creating thumbnails of uploaded images, 0 creates them
+# right after the upload in the request.
+THUMBNAIL_WORKERS = 2
+
+# Number of threads running the views under ASGI, see core.asgi.
+ASGI_WORKER_THREADS = 20
+
+# The feed versions, the object cache, the follow graph and the table
+# versions of core.query_cache are invalidated by the writes, so every
+# process serving the site must share the cache: a change made by one
+# worker has to outdate what the others cached. The local memory cache
+# serves a single process, e.g. the development server or core.asgi with
+# its thread pool, and querysets are not cached with it, see
+# core.query_cache. Deployments running several processes configure
+# memcached or redis here.
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.metrics.InstrumentedCache',
+        'WRAPPED_BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
+
+# Token a scraper sends as "Authorization: Bearer <token>" to read
+# the metrics at /metrics, see core.metrics. Empty turns the token off.
+METRICS_TOKEN = ''
+# Addresses allowed to read the metrics without the token. They are only
+# trusted for requests that did not pass a reverse proxy: behind a proxy
+# every request comes from its address, such requests need the token.
+METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
+# Sends the time spent on SQL, templates and the cache of every request in
+# the Server-Timing header. The header tells every client how the pages
+# are built, so it is only sent while debugging.
+SERVER_TIMING = DEBUG